@@ -0,0 +1,5 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Benchmarks for tonuino_cards_manager."""
@@ -0,0 +1,134 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""
+Measure the peak memory of scanning synthetic music libraries of growing size, and of syncing
+all their cards with a detailed table of contents, with and without streaming.
+
+Run with `python -m benchmarks.memory --cards 10 40 160`. The memory is measured with
+tracemalloc, so only allocations of Python objects count, not those of SQLite. In streaming
+mode, the tracks of only one card are in memory, and the table of contents is written from the
+stored entries one card at a time. What remains grows with what is written: the manifest of the
+SD card, and the pages of the PDF, which reportlab keeps until the document is finished.
+"""
+
+import argparse
+import contextlib
+import functools
+import json
+import tempfile
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+import yaml
+
+from benchmarks.pipeline import generate_library
+from tonuino_cards_manager import api
+from tonuino_cards_manager._catalog import Catalog
+from tonuino_cards_manager._config import get_config
+from tonuino_cards_manager._metadata import MetadataCache
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument(
+    "--cards",
+    type=int,
+    nargs="+",
+    default=[10, 40, 160],
+    help="Numbers of cards to generate, one library for each",
+)
+parser.add_argument("--tracks", type=int, default=100, help="Number of tracks per card")
+parser.add_argument("--frames", type=int, default=2, help="Number of MP3 frames per track")
+parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+parser.add_argument(
+    "--workdir", help="Directory for the synthetic libraries. Default: a temporary directory"
+)
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    """Run a function and return the peak of the memory allocated meanwhile, in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure_library(basedir: Path, cards: int, tracks: int, frames: int) -> dict[str, int]:
+    """
+    Generate a library in `basedir`, and measure the peak memory of scanning it, and of syncing
+    all its cards with and without streaming. The sources of the cards are glob patterns
+    resolved with the catalog, and a detailed table of contents is written as PDF and CSV.
+    """
+    library = get_config(str(generate_library(basedir, cards, tracks, frames))).sourcebasedir
+    config_file = basedir / "streaming.yaml"
+    sources = {no: {"source": {"glob": f"Artist {no:02d}/**"}} for no in range(1, cards + 1)}
+    with open(config_file, "w", encoding="UTF-8") as yamlfile:
+        yaml.safe_dump(
+            {
+                "sourcebasedir": library,
+                "tableofcontents_detailed": True,
+                "tableofcontents_formats": ["pdf", "csv"],
+                "cards": sources,
+            },
+            yamlfile,
+        )
+
+    cache, catalog = MetadataCache(), Catalog()
+    results = {
+        "scan": peak_memory(lambda: catalog.scan(library, cache)),
+        "rescan": peak_memory(lambda: catalog.scan(library, cache)),
+    }
+    for phase, streaming in (("sync", False), ("sync_streaming", True)):
+        sync = functools.partial(
+            api.sync,
+            str(config_file),
+            basedir / phase,
+            api.SyncOptions(streaming=streaming),
+            cache,
+            catalog,
+        )
+        results[phase] = peak_memory(sync)
+    return results
+
+
+def run_memory_benchmarks(basedir: Path, sizes: list[int], tracks: int, frames: int) -> dict:
+    """Measure the peak memory for libraries of the given numbers of cards."""
+    # Warm up, so memory allocated once per process, e.g. by imports, is not counted
+    measure_library(basedir / "warmup", min(sizes), tracks, frames)
+    results: dict[str, dict[int, int]] = {}
+    for cards in sizes:
+        peaks = measure_library(basedir / str(cards), cards, tracks, frames)
+        for phase, peak in peaks.items():
+            results.setdefault(phase, {})[cards * tracks] = peak
+    return {
+        "parameters": {"tracks": tracks, "frames": frames},
+        "results": results,
+    }
+
+
+def main() -> None:
+    """Main function."""
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        if args.workdir:
+            basedir = Path(args.workdir)
+            basedir.mkdir(parents=True, exist_ok=True)
+        else:
+            basedir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        report = run_memory_benchmarks(basedir, args.cards, args.tracks, args.frames)
+
+    for phase, peaks in report["results"].items():
+        for files, peak in peaks.items():
+            print(f"{phase:<16} {files:>8} files {peak / 1024:>10.0f} KiB")
+
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as jsonfile:
+            json.dump(report, jsonfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""
+Benchmark the phases of the card processing pipeline on a synthetic music library.
+
+Run with `python -m benchmarks.pipeline --output results.json`, and compare against the results
+of an older release with `--compare old.json`.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from pathlib import Path
+
+import yaml
+from mutagen.easyid3 import EasyID3
+
+from tonuino_cards_manager import __version__, api
+from tonuino_cards_manager._config import get_config
+from tonuino_cards_manager._destinations import Destinations
+from tonuino_cards_manager._helpers import get_audio_length
+from tonuino_cards_manager._metadata import MetadataCache
+from tonuino_cards_manager._qrcode import generate_qr_codes
+from tonuino_cards_manager._stats import RunStats
+from tonuino_cards_manager._toc import TocEntry, TocTrack, write_tables_of_contents
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, joint stereo, no padding. Such a frame is 417 bytes
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x64"
+MP3_FRAME_SIZE = 417
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--cards", type=int, default=99, help="Number of cards to generate")
+parser.add_argument("--tracks", type=int, default=255, help="Number of tracks per card")
+parser.add_argument("--frames", type=int, default=10, help="Number of MP3 frames per track")
+parser.add_argument(
+    "--repeat", type=int, default=1, help="Run each phase this often, keeping the fastest run"
+)
+parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+parser.add_argument(
+    "--workdir", help="Directory for the synthetic library. Default: a temporary directory"
+)
+
+
+def write_mp3(path: Path, frames: int, tags: dict[str, str] | None = None) -> None:
+    """Write a small, valid MP3 file of silent frames, optionally with ID3 tags."""
+    frame = MP3_FRAME_HEADER + b"\x00" * (MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+    path.write_bytes(frame * frames)
+    if tags:
+        meta = EasyID3()
+        meta.update(tags)
+        meta.save(path)
+
+
+def generate_library(basedir: Path, cards: int, tracks: int, frames: int) -> Path:
+    """
+    Generate a synthetic music library with one directory per card, and a config file for it.
+    Every second card has ID3 tags, the others do not. Return the path of the config file.
+    """
+    library = basedir / "library"
+    cardsconfig = {}
+    for cardno in range(1, cards + 1):
+        carddir = library / f"Artist {cardno:02d}" / f"Album {cardno:02d}"
+        carddir.mkdir(parents=True, exist_ok=True)
+        for trackno in range(1, tracks + 1):
+            tags = (
+                {"artist": f"Artist {cardno:02d}", "title": f"Song {trackno:03d}"}
+                if cardno % 2
+                else None
+            )
+            write_mp3(carddir / f"{trackno:03d} Song {trackno:03d}.mp3", frames, tags)
+        cardsconfig[cardno] = {"source": str(carddir.relative_to(library)), "mode": "album"}
+
+    config_file = basedir / "benchmark.yaml"
+    with open(config_file, "w", encoding="UTF-8") as yamlfile:
+        yaml.safe_dump({"sourcebasedir": str(library), "cards": cardsconfig}, yamlfile)
+    return config_file
+
+
+def timed(
+    func: Callable[[], object], repeat: int, setup: Callable[[], object] | None = None
+) -> float:
+    """Run a function `repeat` times and return the fastest duration in seconds."""
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def run_benchmarks(basedir: Path, cards: int, tracks: int, frames: int, repeat: int) -> dict:
+    """Generate a library in `basedir` and time all pipeline phases on it."""
+    config_file = generate_library(basedir, cards, tracks, frames)
+    destination = basedir / "sdcard"
+    results: dict[str, float] = {}
+
+    results["config"] = timed(lambda: get_config(str(config_file)), repeat)
+    config = get_config(str(config_file))
+
+    def parse_all_sources() -> None:
+        for card in config.cards.values():
+            card.sourcefiles = []
+            card.parse_sources(config.sourcebasedir)
+
+    results["parse_sources"] = timed(parse_all_sources, repeat)
+    sourcefiles = {cardno: card.sourcefiles for cardno, card in config.cards.items()}
+
+    results["get_audio_length"] = timed(
+        lambda: [get_audio_length(f) for files in sourcefiles.values() for f in files], repeat
+    )
+
+    # Copy the cards the way a sync does, with the metadata cached beforehand
+    cache = MetadataCache()
+    api.prepare_cards(config, cache, RunStats())
+
+    def copy_all(verify: str = "none") -> None:
+        destinations = Destinations([destination], verify)
+        stats = RunStats()
+        for cardno, card in config.cards.items():
+            api.copy_card(card, config, destinations, cache, stats.add_card(cardno), None)
+        destinations.close()
+
+    def clean() -> None:
+        shutil.rmtree(destination, ignore_errors=True)
+
+    results["copy_cards"] = timed(copy_all, repeat, setup=clean)
+    for verify in ("fast", "full"):
+        results[f"copy_cards_verify_{verify}"] = timed(
+            lambda verify=verify: copy_all(verify), repeat, setup=clean
+        )
+
+    qrdata = [f"1337b34702{cardno:02x}0200;Card no. {cardno}" for cardno in config.cards]
+    with contextlib.redirect_stdout(io.StringIO()):
+        results["generate_qr_codes"] = timed(
+            lambda: generate_qr_codes(qrdata, config.maxcardsperqrcode), repeat
+        )
+
+    entries = [
+        TocEntry(
+            no=cardno,
+            description=f"Card no. {cardno}",
+            files=len(files),
+            duration=len(files),
+            tracks=[TocTrack(file=f.name, duration=1) for f in files],
+        )
+        for cardno, files in sourcefiles.items()
+    ]
+    results["table_of_contents"] = timed(
+        lambda: write_tables_of_contents(entries, config_file, ["pdf"]), repeat
+    )
+    results["table_of_contents_detailed"] = timed(
+        lambda: write_tables_of_contents(entries, config_file, ["pdf"], detailed=True), repeat
+    )
+
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now(tz=timezone.utc).isoformat(timespec="seconds"),
+        "parameters": {"cards": cards, "tracks": tracks, "frames": frames, "repeat": repeat},
+        "results": results,
+    }
+
+
+def compare_results(old: dict, new: dict) -> list[str]:
+    """Compare two benchmark results and return one line per phase."""
+    lines = [f"{'Phase':<28} {'old [s]':>10} {'new [s]':>10} {'change':>8}"]
+    for phase, duration in new["results"].items():
+        if (old_duration := old["results"].get(phase)) is None:
+            lines.append(f"{phase:<28} {'-':>10} {duration:>10.3f} {'-':>8}")
+            continue
+        change = (duration - old_duration) / old_duration * 100 if old_duration else 0.0
+        lines.append(f"{phase:<28} {old_duration:>10.3f} {duration:>10.3f} {change:>+7.1f}%")
+    return lines
+
+
+def main() -> None:
+    """Main function."""
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        if args.workdir:
+            basedir = Path(args.workdir)
+            basedir.mkdir(parents=True, exist_ok=True)
+        else:
+            basedir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        report = run_benchmarks(basedir, args.cards, args.tracks, args.frames, args.repeat)
+
+    for phase, duration in report["results"].items():
+        print(f"{phase:<28} {duration:>10.3f} s")
+
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as jsonfile:
+            json.dump(report, jsonfile, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="UTF-8") as jsonfile:
+            print()
+            print("\n".join(compare_results(json.load(jsonfile), report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,19 @@ from pathlib import Path
 
 import pytest
 
+from tonuino_cards_manager import api
 from tonuino_cards_manager._config import Config, get_config
 
 
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch) -> Path:
+    """Fixture keeping the persistent caches of each test in its temporary directory."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    for shared in ("_shared_cache", "_shared_catalog", "_config_cache"):
+        monkeypatch.setattr(api, shared, None)
+    return tmp_path / "cache" / "tonuino-cards-manager"
+
+
 @pytest.fixture
 def temp_dir(tmp_path):
     """Fixture for creating a temporary directory for testing."""
@@ -0,0 +1,108 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for api.py."""
+
+import io
+from pathlib import Path
+
+import pytest
+import yaml
+
+from tonuino_cards_manager import api
+from tonuino_cards_manager._catalog import Catalog
+from tonuino_cards_manager._metadata import MetadataCache
+
+
+@pytest.fixture(autouse=True)
+def catalog(monkeypatch) -> Catalog:
+    """Fixture replacing the shared catalog by one in memory."""
+    memory_catalog = Catalog()
+    monkeypatch.setattr(api, "_shared_catalog", memory_catalog)
+    return memory_catalog
+
+
+def write_config(temp_dir: Path, test_audio_dir: Path, **options: object) -> Path:
+    """Write a config file with two cards from the test audio files."""
+    path = temp_dir / "box.yaml"
+    data = {
+        "sourcebasedir": str(test_audio_dir),
+        "tableofcontents_formats": ["csv"],
+        "cards": {1: {"source": "."}, 2: {"source": "subdir_audio", "mode": "album"}},
+        **options,
+    }
+    path.write_text(yaml.safe_dump(data), encoding="UTF-8")
+    return path
+
+
+def test_sync(temp_dir, test_audio_dir) -> None:
+    """Test syncing twice in the same process, re-using the cached metadata."""
+    config_file = write_config(temp_dir, test_audio_dir)
+    cache = MetadataCache()
+    qrcodes = io.StringIO()
+
+    report = api.sync(config_file, temp_dir / "sd", api.SyncOptions(qrcodes=qrcodes), cache)
+
+    assert report.ok
+    assert report.destinations == [temp_dir / "sd"]
+    assert [entry.files for entry in report.toc] == [3, 1]
+    assert report.qrdata[1].startswith("1337B34702020200")
+    assert "QR code for cards batch 1" in qrcodes.getvalue()
+    assert len(list((temp_dir / "sd" / "01").iterdir())) == 3
+    assert (temp_dir / "TOC_box.csv").is_file()
+    assert report.stats.cache_misses == 4
+
+    report = api.sync(config_file, temp_dir / "sd", cache=cache)
+    assert report.ok
+    assert report.stats.cache_misses == 0
+    assert api.verify(config_file, temp_dir / "sd", cache=cache) == []
+
+
+def test_sync_errors(temp_dir, test_audio_dir) -> None:
+    """Test that errors are raised or reported instead of exiting."""
+    with pytest.raises(api.ConfigError):
+        api.sync(write_config(temp_dir, test_audio_dir, filenametype="wrong"), temp_dir / "sd")
+
+    # A destination that fails does not stop the others
+    (temp_dir / "notadir").write_text("file")
+    config = api.get_config(str(write_config(temp_dir, test_audio_dir)))
+    report = api.sync(config, [temp_dir / "sd", temp_dir / "notadir"], cache=MetadataCache())
+    assert not report.ok
+    assert list(report.failed) == [temp_dir / "notadir"]
+    assert len(list((temp_dir / "sd" / "02").iterdir())) == 1
+
+
+def test_scan(temp_dir, test_audio_dir, catalog) -> None:  # pylint: disable=redefined-outer-name
+    """Test syncing from a scanned library."""
+    cache = MetadataCache()
+    result = api.scan(test_audio_dir, cache)
+    assert result.added == 6
+    assert catalog.files_in_directory(test_audio_dir / "subdir_audio") == [
+        test_audio_dir / "subdir_audio" / "A different file.mp3"
+    ]
+
+    report = api.sync(write_config(temp_dir, test_audio_dir), temp_dir / "sd", cache=cache)
+    assert report.ok
+    assert [entry.files for entry in report.toc] == [3, 1]
+    assert report.stats.cache_misses == 0
+
+
+def test_sync_streaming(temp_dir, test_audio_dir) -> None:
+    """Test that streaming writes the same files, QR codes and table of contents."""
+    config_file = write_config(temp_dir, test_audio_dir)
+    report = api.sync(config_file, temp_dir / "sd", cache=MetadataCache())
+    toc = (temp_dir / "TOC_box.csv").read_text(encoding="UTF-8")
+
+    qrcodes = io.StringIO()
+    options = api.SyncOptions(streaming=True, qrcodes=qrcodes)
+    streamed = api.sync(config_file, temp_dir / "streamed", options, MetadataCache())
+    assert streamed.ok
+    assert streamed.qrdata == report.qrdata
+    assert [(entry.files, entry.tracks) for entry in streamed.toc] == [(3, []), (1, [])]
+    assert "QR code for cards batch 1" in qrcodes.getvalue()
+    assert (temp_dir / "TOC_box.csv").read_text(encoding="UTF-8") == toc
+    assert sorted(
+        p.relative_to(temp_dir / "streamed") for p in (temp_dir / "streamed").rglob("*.mp3")
+    ) == sorted(p.relative_to(temp_dir / "sd") for p in (temp_dir / "sd").rglob("*.mp3"))
+    assert api.verify(config_file, temp_dir / "streamed") == []
@@ -0,0 +1,52 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Smoke tests for the benchmark suite, so it does not break silently."""
+
+from benchmarks.memory import run_memory_benchmarks
+from benchmarks.pipeline import compare_results, generate_library, run_benchmarks
+from tonuino_cards_manager._config import get_config
+from tonuino_cards_manager._helpers import get_audio_length
+
+
+def test_generate_library(temp_dir) -> None:
+    """Test that the synthetic library is valid for the tool."""
+    config_file = generate_library(temp_dir, cards=2, tracks=3, frames=10)
+    config = get_config(str(config_file))
+
+    assert len(config.cards) == 2
+    config.cards[1].parse_sources(config.sourcebasedir)
+    assert len(config.cards[1].sourcefiles) == 3
+    assert get_audio_length(config.cards[1].sourcefiles[0]) == 0  # 10 frames are 0.26 seconds
+
+
+def test_run_benchmarks(temp_dir) -> None:
+    """Test a tiny benchmark run and the comparison of results."""
+    report = run_benchmarks(temp_dir, cards=2, tracks=2, frames=2, repeat=1)
+
+    assert set(report["results"]) >= {
+        "config",
+        "parse_sources",
+        "get_audio_length",
+        "copy_cards",
+        "generate_qr_codes",
+        "table_of_contents",
+    }
+    assert (temp_dir / "sdcard" / "01" / "001-Artist_01-Song_001.mp3").exists()
+    assert (temp_dir / "sdcard" / "02" / "002-002_Song_002.mp3").exists()
+
+    lines = compare_results(report, report)
+    assert len(lines) == len(report["results"]) + 1
+    assert "+0.0%" in lines[1]
+
+
+def test_run_memory_benchmarks(temp_dir) -> None:
+    """Test that rescanning does not grow with the library, and streaming needs less memory."""
+    report = run_memory_benchmarks(temp_dir, [2, 8], tracks=10, frames=2)
+
+    assert set(report["results"]) == {"scan", "rescan", "sync", "sync_streaming"}
+    assert report["results"]["rescan"][80] < 1.5 * report["results"]["rescan"][20]
+    assert report["results"]["sync_streaming"][80] < report["results"]["sync"][80]
+    assert len(list((temp_dir / "8" / "sync_streaming" / "08").iterdir())) == 10
+    assert (temp_dir / "8" / "TOC_streaming.pdf").is_file()
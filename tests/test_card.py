@@ -10,6 +10,7 @@ import pytest
 
 from tonuino_cards_manager._card import Card
 from tonuino_cards_manager._config import get_config
+from tonuino_cards_manager._stats import CardStats
 
 
 def load_error_cards(test_config_dir, case: str):
@@ -169,6 +170,38 @@ def test_process_card(temp_dir, test_audio_dir, cards_ok, config) -> None:
     assert (temp_dir / "03" / "003-03_Tester_-_Test_Sound_03_-_without_ID3.mp3").exists()
 
 
+def test_process_card_stats(temp_dir, test_audio_dir, cards_ok, config) -> None:
+    """Test that process_card records statistics."""
+    stats = CardStats(no=3)
+    tracks = cards_ok[3].process_card(temp_dir, test_audio_dir, config.filenametype, stats=stats)
+
+    assert stats.files == len(tracks) == 3
+    assert stats.bytes_copied == sum(f.stat().st_size for f in cards_ok[3].sourcefiles)
+    assert set(stats.phases) == {"clean", "scan", "metadata", "copy"}
+
+
+def test_plan_tracks(temp_dir, test_audio_dir, cards_ok, config) -> None:
+    """Test that the planned tracks match the ones written by process_card."""
+    cards_ok[3].parse_sources(str(test_audio_dir))
+    planned = cards_ok[3].plan_tracks(config.filenametype)
+
+    assert not (temp_dir / "03").exists()
+    assert planned == cards_ok[3].process_card(temp_dir, test_audio_dir, config.filenametype)
+
+
+def test_process_card_strip_tags(temp_dir, test_audio_dir, cards_ok, config) -> None:
+    """Test that the bytes saved by stripping tags are recorded."""
+    stats = CardStats(no=3)
+    cards_ok[3].process_card(
+        temp_dir, test_audio_dir, config.filenametype, stats=stats, strip_tags=True
+    )
+
+    copied = sum(f.stat().st_size for f in (temp_dir / "03").iterdir())
+    assert stats.bytes_copied == copied
+    assert stats.bytes_saved == sum(f.stat().st_size for f in cards_ok[3].sourcefiles) - copied
+    assert stats.bytes_saved > 0
+
+
 def test_process_card_no_files_at_all(test_config_dir, test_audio_dir, caplog) -> None:
     """Test the process_card method."""
     with caplog.at_level(logging.WARNING):
@@ -0,0 +1,107 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _catalog.py."""
+
+import shutil
+from pathlib import Path
+
+from mutagen.easyid3 import EasyID3
+
+from tonuino_cards_manager import _catalog
+from tonuino_cards_manager._card import Card
+from tonuino_cards_manager._catalog import Catalog
+from tonuino_cards_manager._helpers import get_files_in_directory
+from tonuino_cards_manager._metadata import MetadataCache
+
+
+def test_scan(temp_dir, test_audio_dir) -> None:
+    """Test scanning a library incrementally."""
+    library = temp_dir / "library"
+    shutil.copytree(test_audio_dir, library)
+    catalog = Catalog(temp_dir / "catalog.sqlite")
+    cache = MetadataCache()
+
+    result = catalog.scan(library, cache)
+    assert (result.added, result.updated, result.removed, result.unchanged) == (6, 0, 0, 0)
+    # The metadata cache has been filled as well
+    assert cache.misses == 6
+
+    # Nothing to read if nothing changed
+    assert catalog.scan(library, cache).unchanged == 6
+
+    # Changed, removed and added files
+    (library / "01. Tester - Test Sound 01.mp3").write_bytes(b"changed")
+    (library / "subdir_audio" / "A different file.mp3").unlink()
+    shutil.copy(test_audio_dir / "02. Tester - Test Sound 02.mp3", library / "ogg" / "new.mp3")
+    result = catalog.scan(library, cache)
+    assert (result.added, result.updated, result.removed, result.unchanged) == (1, 1, 1, 4)
+
+    # The catalog persists
+    catalog.close()
+    assert Catalog(temp_dir / "catalog.sqlite").scan(library).unchanged == 6
+
+
+def test_files_in_directory(temp_dir, test_audio_dir) -> None:
+    """Test that directories are only taken from the catalog while they are unchanged."""
+    library = temp_dir / "library"
+    shutil.copytree(test_audio_dir, library)
+    catalog = Catalog()
+    assert catalog.files_in_directory(library) is None
+
+    catalog.scan(library)
+    assert catalog.files_in_directory(library) == get_files_in_directory(library, audio_only=True)
+    assert catalog.files_in_directory(library / "emptyfolder") == []
+
+    card = Card(source=["library", "library/subdir_audio"])
+    card.parse_sources(str(temp_dir), catalog)
+    assert len(card.sourcefiles) == 4
+
+    # A new file changes the directory, which is listed again then
+    shutil.copy(test_audio_dir / "02. Tester - Test Sound 02.mp3", library / "new.mp3")
+    assert catalog.files_in_directory(library) is None
+    card.parse_sources(str(temp_dir), catalog)
+    assert len(card.sourcefiles) == 5
+
+
+def test_find(temp_dir, test_audio_dir) -> None:
+    """Test finding files and albums by their tags."""
+    library = temp_dir / "library"
+    shutil.copytree(test_audio_dir, library)
+    for name, album in (("01. Tester - Test Sound 01.mp3", "B-Sides"), ("new.mp3", "Album")):
+        path = library / name
+        if not path.exists():
+            shutil.copy(library / "02. Tester - Test Sound 02.mp3", path)
+        tags = EasyID3(path)
+        tags["album"] = album
+        tags.save()
+    catalog = Catalog()
+    catalog.scan(library)
+
+    assert catalog.albums("tester") == ["Album", "B-Sides"]
+    assert catalog.albums("Nobody") == []
+    assert [track.title for track in catalog.find(artist="TESTER", album="b-sides")] == [
+        "Test Sound 01"
+    ]
+    assert len(catalog.find(artist="Tester")) == 4
+    assert len(catalog.find()) == 7
+
+
+def test_iter_below_in_batches(temp_dir, test_audio_dir, monkeypatch) -> None:
+    """Test that the catalog can be used while the rows below a directory are iterated."""
+    library = temp_dir / "library"
+    shutil.copytree(test_audio_dir, library)
+    catalog = Catalog()
+    catalog.scan(library)
+    monkeypatch.setattr(_catalog, "BATCH_SIZE", 2)
+
+    paths = []
+    for (path,) in catalog._iter_below("files", library, "path"):  # noqa: SLF001
+        # Would wait for the lock forever if it were held while iterating
+        assert catalog.files_in_directory(Path(path).parent) is not None
+        paths.append(Path(path))
+    # All files are yielded once, across the batches
+    assert len(paths) == len(set(paths)) == 6
+    assert paths == sorted(paths, key=str)
+    assert catalog.glob(library, "**") == sorted(paths)
@@ -5,15 +5,22 @@
 """Tests for _config.py."""
 
 import logging
+import shutil
 
 import pytest
+import yaml
 
+from tonuino_cards_manager import _config
 from tonuino_cards_manager._config import (
+    YAML_LOADER,
     Config,
+    ConfigCache,
     _load_config_dict,
     _read_config_file,
     get_config,
+    load_parsed_config,
 )
+from tonuino_cards_manager._helpers import ConfigError
 
 
 def test_default_config_initialization() -> None:
@@ -90,7 +97,7 @@ def test_import_config_none_value(test_config_dir, caplog) -> None:
 
 def test_import_cards_not_numeric(test_config_dir, caplog) -> None:
     """Test the _import_cards method with non-numeric card keys."""
-    with caplog.at_level(logging.CRITICAL), pytest.raises(SystemExit):
+    with caplog.at_level(logging.CRITICAL), pytest.raises(ConfigError):
         get_config(str(test_config_dir / "error_not_numeric.yaml"))
 
     assert "Card identifiers must be numeric. Found 'two' instead" in caplog.text
@@ -98,7 +105,7 @@ def test_import_cards_not_numeric(test_config_dir, caplog) -> None:
 
 def test_import_cards_non_consecutive(test_config_dir, caplog) -> None:
     """Test the _import_cards method with non-consecutive card keys."""
-    with caplog.at_level(logging.CRITICAL), pytest.raises(SystemExit):
+    with caplog.at_level(logging.CRITICAL), pytest.raises(ConfigError):
         get_config(str(test_config_dir / "error_non_consecutive.yaml"))
 
     assert "The 2 cards don't seem to be numbered consecutively" in caplog.text
@@ -110,3 +117,91 @@ def test_import_cards_too_many(test_config_dir, caplog) -> None:
         get_config(str(test_config_dir / "error_too_many_cards.yaml"))
 
     assert "You have defined more than 99 cards (103)." in caplog.text
+
+
+def test_config_cache(test_config_dir, temp_dir) -> None:
+    """Test that configs are only parsed again if their file changes."""
+    config_file = temp_dir / "box.yaml"
+    shutil.copy(test_config_dir / "ok_4cards.yaml", config_file)
+    cache = ConfigCache()
+
+    config = cache.get(config_file)
+    config.cards.clear()
+    # Changing a returned config does not affect the cache
+    assert len(cache.get(config_file).cards) == 4
+
+    shutil.copy(test_config_dir / "ok_1card.yaml", config_file)
+    assert len(cache.get(config_file).cards) == 1
+
+
+def test_yaml_loader() -> None:
+    """Test that the loader of libyaml is used if PyYAML has been built with it."""
+    assert (YAML_LOADER is yaml.CSafeLoader) == yaml.__with_libyaml__
+
+
+def test_parsed_config_store(test_config_dir, temp_dir, monkeypatch) -> None:
+    """Test that parsed configs are reused until the file or the version of the tool changes."""
+    config_file = temp_dir / "box.yaml"
+    shutil.copy(test_config_dir / "ok_4cards.yaml", config_file)
+    store = temp_dir / "configs"
+    parsed = load_parsed_config(config_file, store)
+    assert len(list(store.iterdir())) == 1
+
+    def fail(_data: dict) -> None:
+        raise AssertionError
+
+    with monkeypatch.context() as patch:
+        patch.setattr(_config, "_load_config_dict", fail)
+        assert load_parsed_config(config_file, store) == parsed
+        assert ConfigCache(store).get(config_file) == parsed
+
+    monkeypatch.setattr(_config, "__version__", "0.0.0")
+    assert load_parsed_config(config_file, store) == parsed
+    shutil.copy(test_config_dir / "ok_1card.yaml", config_file)
+    assert len(load_parsed_config(config_file, store).cards) == 1
+    # Only the entry of the current version of the file is kept
+    assert len(list(store.iterdir())) == 1
+
+    # Damaged files are parsed again and replaced
+    for file in store.iterdir():
+        file.write_text("{", encoding="UTF-8")
+    assert len(load_parsed_config(config_file, store).cards) == 1
+    with monkeypatch.context() as patch:
+        patch.setattr(_config, "_load_config_dict", fail)
+        assert len(load_parsed_config(config_file, store).cards) == 1
+
+    # Entries of other config files are not removed
+    other_file = temp_dir / "other.yaml"
+    shutil.copy(test_config_dir / "ok_4cards.yaml", other_file)
+    load_parsed_config(other_file, store)
+    load_parsed_config(config_file, store)
+    assert len(list(store.iterdir())) == 2
+
+    # Configs stored by versions using another format are removed
+    (store / f"{'0' * 64}.json").write_text("{}", encoding="UTF-8")
+    monkeypatch.setattr(_config, "PARSED_CONFIG_VERSION", 0)
+    load_parsed_config(config_file, store)
+    monkeypatch.undo()
+    shutil.copy(test_config_dir / "ok_4cards.yaml", config_file)
+    load_parsed_config(config_file, store)
+    assert [file.name.startswith("v2-") for file in store.iterdir()] == [True]
+
+
+def test_parsed_config_store_warnings(test_config_dir, temp_dir, monkeypatch, caplog) -> None:
+    """Test that the warnings of the validation are logged again if a parsed config is reused."""
+    config_file = temp_dir / "box.yaml"
+    shutil.copy(test_config_dir / "error_too_many_cards.yaml", config_file)
+    store = temp_dir / "configs"
+    warning = "You have defined more than 99 cards (103)."
+    with caplog.at_level(logging.WARNING):
+        load_parsed_config(config_file, store)
+    assert caplog.text.count(warning) == 1
+
+    def fail(_data: dict) -> None:
+        raise AssertionError
+
+    monkeypatch.setattr(_config, "_load_config_dict", fail)
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        assert len(load_parsed_config(config_file, store).cards) == 103
+    assert caplog.text.count(warning) == 1
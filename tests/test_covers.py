@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _covers.py."""
+
+import base64
+import json
+import shutil
+from pathlib import Path
+
+from mutagen.flac import Picture
+from mutagen.id3 import APIC, ID3
+from mutagen.oggopus import OggOpus
+
+from benchmarks.pipeline import write_mp3
+from tonuino_cards_manager._card import Card
+from tonuino_cards_manager._config import Config
+from tonuino_cards_manager._covers import COVERS_INDEX, embedded_picture, extract_covers
+
+JPEG = b"\xff\xd8\xff\xe0 front cover"
+PNG = b"\x89PNG back cover"
+
+
+def mp3_with_pictures(path: Path) -> Path:
+    """Write an MP3 file with a back cover and a front cover."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_mp3(path, 5)
+    id3 = ID3()
+    id3.add(APIC(encoding=3, mime="image/png", type=4, desc="back", data=PNG))
+    id3.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="front", data=JPEG))
+    id3.save(path)
+    return path
+
+
+def test_embedded_picture(temp_dir, test_audio_dir) -> None:
+    """Test reading embedded pictures from MP3 and Opus files."""
+    assert embedded_picture(mp3_with_pictures(temp_dir / "a.mp3")) == (JPEG, ".jpg")
+    assert embedded_picture(test_audio_dir / "01. Tester - Test Sound 01.mp3") is None
+
+    opus = temp_dir / "a.opus"
+    shutil.copy(test_audio_dir / "ogg" / "04. Tester - Opus Sound.opus", opus)
+    picture = Picture()
+    picture.type, picture.mime, picture.data = 3, "image/png", PNG
+    audio = OggOpus(opus)
+    audio["metadata_block_picture"] = [base64.b64encode(picture.write()).decode("ascii")]
+    audio.save()
+    assert embedded_picture(opus) == (PNG, ".png")
+
+
+def test_extract_covers(temp_dir, test_audio_dir) -> None:
+    """Test extracting and deduplicating the covers of all cards."""
+    library = temp_dir / "library"
+    mp3_with_pictures(library / "album1" / "01.mp3")
+    mp3_with_pictures(library / "album2" / "01.mp3")
+    (library / "album3").mkdir()
+    shutil.copy(test_audio_dir / "01. Tester - Test Sound 01.mp3", library / "album3")
+    (library / "album3" / "folder.jpg").write_bytes(b"folder image")
+    (library / "album4").mkdir()
+    shutil.copy(test_audio_dir / "01. Tester - Test Sound 01.mp3", library / "album4")
+
+    config = Config(
+        sourcebasedir=str(library),
+        cards={no: Card(no=no, source=[f"album{no}"]) for no in range(1, 5)},
+    )
+    covers = extract_covers(config, temp_dir / "covers")
+
+    assert set(covers) == {1, 2, 3}
+    assert covers[1] == covers[2]
+    assert covers[1].read_bytes() == JPEG
+    assert covers[3].read_bytes() == b"folder image"
+    assert len(list((temp_dir / "covers").glob("cover-*"))) == 2
+    index = json.loads((temp_dir / "covers" / COVERS_INDEX).read_text())
+    assert index == {str(no): path.name for no, path in covers.items()}
@@ -0,0 +1,70 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _destinations.py."""
+
+import io
+import logging
+
+import pytest
+
+from tonuino_cards_manager._destinations import Destinations
+from tonuino_cards_manager._progress import Progress
+
+
+def test_copy_to_multiple_destinations(temp_dir, test_audio_dir, monkeypatch) -> None:
+    """Test that a file is copied to all destinations, reading it in chunks once."""
+    monkeypatch.setattr("tonuino_cards_manager._destinations.COPY_CHUNK_SIZE", 1000)
+    source = test_audio_dir / "01. Tester - Test Sound 01.mp3"
+    destinations = Destinations([temp_dir / "a", temp_dir / "b"])
+    for dest in destinations.all:
+        dest.path.mkdir()
+
+    read: list[int] = []
+    destinations.copy(source, source.relative_to(test_audio_dir), advance=read.append)
+    destinations.close()
+
+    assert sum(read) == source.stat().st_size
+    for dest in destinations.all:
+        assert (dest.path / source.name).read_bytes() == source.read_bytes()
+        assert dest.bytes_written == source.stat().st_size
+
+
+def test_failing_destination_is_isolated(temp_dir, test_audio_dir, cards_ok, caplog) -> None:
+    """Test that a failing destination does not abort the others."""
+    # A file instead of a directory cannot be written to
+    (temp_dir / "broken").touch()
+    destinations = Destinations([temp_dir / "good", temp_dir / "broken"])
+
+    with caplog.at_level(logging.ERROR):
+        tracks = cards_ok[3].process_card(destinations, test_audio_dir, "mp3tags")
+    destinations.close()
+
+    assert [dest.path.name for dest in destinations.failed] == ["broken"]
+    assert f"Writing to {temp_dir / 'broken'} failed" in caplog.text
+    assert sorted(f.name for f in (temp_dir / "good" / "03").iterdir()) == [
+        track.file for track in tracks
+    ]
+
+
+def test_all_destinations_failing(temp_dir, test_audio_dir, cards_ok) -> None:
+    """Test that an error is raised if no destination is left."""
+    for name in ("a", "b"):
+        (temp_dir / name).touch()
+    destinations = Destinations([temp_dir / "a", temp_dir / "b"])
+
+    with pytest.raises(OSError):
+        cards_ok[3].process_card(destinations, test_audio_dir, "mp3tags")
+    destinations.close()
+
+
+def test_progress_per_destination(temp_dir) -> None:
+    """Test that the progress of each destination is shown."""
+    destinations = Destinations([temp_dir / "a", temp_dir / "b"])
+    destinations.all[0].bytes_written = 1024 * 1024
+    destinations.all[1].error = OSError("broken")
+    progress = Progress(100, stream=io.StringIO(), destinations=destinations.all)
+    destinations.close()
+
+    assert progress.status().endswith(" | a: 1.0 MB | b: failed")
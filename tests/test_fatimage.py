@@ -0,0 +1,151 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _fatimage.py."""
+
+import struct
+from pathlib import Path
+
+import pytest
+
+from tonuino_cards_manager._fatimage import (
+    PARTITION_START,
+    SECTOR_SIZE,
+    _shortname,
+    build_fat32_image,
+    parse_size,
+)
+
+
+class FatReader:
+    """Minimal FAT32 reader to verify images."""
+
+    def __init__(self, image: Path) -> None:
+        """Read the image and parse the partition table and boot sector."""
+        self.data = image.read_bytes()
+        assert self.data[510:512] == b"\x55\xaa"
+        ptype, self.start = struct.unpack_from("<4xB3xI", self.data, 446)
+        assert ptype == 0x0C
+        self.part = self.start * SECTOR_SIZE
+        boot = self.data[self.part : self.part + SECTOR_SIZE]
+        assert boot[510:512] == b"\x55\xaa"
+        (bps, self.spc, reserved, fats) = struct.unpack_from("<HBHB", boot, 11)
+        self.fat_sectors, _, _, self.root = struct.unpack_from("<IHHI", boot, 36)
+        self.label = boot[71:82]
+        assert bps == SECTOR_SIZE
+        self.fat_offset = self.part + reserved * SECTOR_SIZE
+        self.data_offset = self.fat_offset + fats * self.fat_sectors * SECTOR_SIZE
+        # Both FATs are identical
+        fat_bytes = self.fat_sectors * SECTOR_SIZE
+        assert (
+            self.data[self.fat_offset : self.fat_offset + fat_bytes]
+            == self.data[self.fat_offset + fat_bytes : self.fat_offset + 2 * fat_bytes]
+        )
+
+    def chain(self, cluster: int, size: int | None = None) -> bytes:
+        """Read the content of a cluster chain."""
+        content = b""
+        cluster_bytes = self.spc * SECTOR_SIZE
+        while cluster < 0x0FFFFFF8:
+            offset = self.data_offset + (cluster - 2) * cluster_bytes
+            content += self.data[offset : offset + cluster_bytes]
+            (cluster,) = struct.unpack_from("<I", self.data, self.fat_offset + cluster * 4)
+        return content if size is None else content[:size]
+
+    def listdir(self, cluster: int) -> dict[str, tuple[bool, int, int]]:
+        """List a directory: name -> (is_dir, cluster, size)."""
+        content = self.chain(cluster)
+        entries = {}
+        lfn = ""
+        for offset in range(0, len(content), 32):
+            entry = content[offset : offset + 32]
+            if entry[0] == 0:
+                break
+            attr = entry[11]
+            if attr == 0x0F:
+                part = entry[1:11] + entry[14:26] + entry[28:32]
+                lfn = part.decode("utf-16-le").split("\x00")[0] + lfn
+                continue
+            if attr & 0x08 or entry[0:1] == b".":
+                lfn = ""
+                continue
+            name = lfn or entry[0:8].decode().strip() + (
+                "." + entry[8:11].decode().strip() if entry[8:11].strip() else ""
+            )
+            hi, lo, size = struct.unpack_from("<H4xHI", entry, 20)
+            entries[name] = (bool(attr & 0x10), hi << 16 | lo, size)
+            lfn = ""
+        return entries
+
+    def files(self, cluster: int | None = None, prefix: str = "") -> dict[str, bytes]:
+        """Read all files recursively: path -> content."""
+        result = {}
+        for name, (is_dir, child, size) in self.listdir(cluster or self.root).items():
+            if is_dir:
+                result.update(self.files(child, f"{prefix}{name}/"))
+            else:
+                result[prefix + name] = self.chain(child, size) if size else b""
+        return result
+
+
+def test_parse_size() -> None:
+    """Test parsing sizes."""
+    assert parse_size("512") == 512
+    assert parse_size("64M") == 64 * 1024**2
+    assert parse_size("8g") == 8 * 1024**3
+    assert parse_size("2GiB") == 2 * 1024**3
+    with pytest.raises(ValueError, match="Invalid size"):
+        parse_size("much")
+
+
+def test_shortname() -> None:
+    """Test creating 8.3 short names."""
+    taken: set[bytes] = set()
+    assert _shortname("01", is_dir=True, taken=taken) == (b"01         ", False)
+    assert _shortname("mp3", is_dir=True, taken=taken) == (b"MP3        ", True)
+    assert _shortname("001.mp3", is_dir=False, taken=taken) == (b"001     MP3", True)
+    assert _shortname("001 - Test.mp3", is_dir=False, taken=taken) == (b"001-TE~1MP3", True)
+    assert _shortname("001 - Tester.mp3", is_dir=False, taken=taken) == (b"001-TE~2MP3", True)
+
+
+def test_build_fat32_image(tmp_path: Path) -> None:
+    """Test that an image contains the directory tree with all file contents."""
+    source = tmp_path / "sdcard"
+    expected = {
+        "01/001.mp3": b"a" * 5000,
+        "01/002 - A song with a very long name, longer than 26 chars.mp3": b"b" * 10,
+        "01/003.mp3": b"",
+        "02/001.opus": bytes(range(256)) * 100,
+        "mp3/0001.mp3": b"advert",
+    }
+    for name, content in expected.items():
+        (source / name).parent.mkdir(parents=True, exist_ok=True)
+        (source / name).write_bytes(content)
+
+    image = tmp_path / "sdcard.img"
+    build_fat32_image(source, image)
+
+    reader = FatReader(image)
+    assert reader.start == PARTITION_START
+    assert reader.label == b"TONUINO    "
+    assert reader.files() == expected
+    # Directories are sorted by name
+    assert list(reader.listdir(reader.root)) == ["01", "02", "mp3"]
+
+    # Building the same content twice results in the same image
+    build_fat32_image(source, tmp_path / "again.img")
+    assert (tmp_path / "again.img").read_bytes() == image.read_bytes()
+
+
+def test_build_fat32_image_size(tmp_path: Path) -> None:
+    """Test images of a given size, and content that does not fit."""
+    (tmp_path / "sdcard" / "01").mkdir(parents=True)
+    (tmp_path / "sdcard" / "01" / "001.mp3").write_bytes(b"x" * 1000)
+
+    build_fat32_image(tmp_path / "sdcard", tmp_path / "sdcard.img", size=64 * 1024**2)
+    assert (tmp_path / "sdcard.img").stat().st_size == 64 * 1024**2
+    assert FatReader(tmp_path / "sdcard.img").files() == {"01/001.mp3": b"x" * 1000}
+
+    with pytest.raises(ValueError, match="does not fit"):
+        build_fat32_image(tmp_path / "sdcard", tmp_path / "small.img", size=2 * 1024**2)
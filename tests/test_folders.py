@@ -0,0 +1,116 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _folders.py."""
+
+import logging
+from pathlib import Path
+
+from tonuino_cards_manager import _card, _folders
+from tonuino_cards_manager._card import MAX_FILES, Card
+from tonuino_cards_manager._config import _load_config_dict
+from tonuino_cards_manager._folders import (
+    MAX_FOLDERS,
+    allocate_folders,
+    folders_path,
+    load_folders,
+    plan_folders,
+)
+
+
+def files(count: int) -> list[Path]:
+    """Create a list of file paths, which do not have to exist for the allocation."""
+    return [Path(f"{idx:04d}.mp3") for idx in range(count)]
+
+
+def config_with_files(counts: dict[int, int]):
+    """Create a config whose cards have the given number of parsed files."""
+    config = _load_config_dict({"cards": {cardno: {"source": "."} for cardno in counts}})
+    for cardno, count in counts.items():
+        config.cards[cardno].no = cardno
+        config.cards[cardno].sourcefiles = files(count)
+    return config
+
+
+def test_allocate_folders() -> None:
+    """Test that large cards get the lowest free folders, and small cards only their own."""
+    config = config_with_files({1: 10, 2: 2 * MAX_FILES + 1, 3: MAX_FILES})
+    assert allocate_folders(config) == {1: [1], 2: [2, 4, 5], 3: [3]}
+    assert config.cards[2].folders == [2, 4, 5]
+    assert [len(f) for _, f in config.cards[2].folder_files()] == [MAX_FILES, MAX_FILES, 1]
+    assert config.cards[3].folder_files() == [(3, config.cards[3].sourcefiles)]
+
+
+def test_allocation_is_stable() -> None:
+    """Test that additional folders are kept, even if a card before them gets more files."""
+    config = config_with_files({1: 2 * MAX_FILES, 2: 10})
+    previous = allocate_folders(config)
+    assert previous == {1: [1, 3], 2: [2]}
+
+    config = config_with_files({1: 2 * MAX_FILES, 2: MAX_FILES + 1})
+    assert allocate_folders(config, previous) == {1: [1, 3], 2: [2, 4]}
+
+    # A new card takes the folder of its number, so the additional folder has to move
+    config = config_with_files({1: 2 * MAX_FILES, 2: 10, 3: 10})
+    assert allocate_folders(config, previous) == {1: [1, 4], 2: [2], 3: [3]}
+
+    # Folders are given up if a card needs less of them
+    config = config_with_files({1: 10, 2: 10})
+    assert allocate_folders(config, previous) == {1: [1], 2: [2]}
+
+
+def test_no_free_folders(caplog) -> None:
+    """Test that the last folder keeps all remaining files if no folders are free."""
+    config = config_with_files(dict.fromkeys(range(2, MAX_FOLDERS + 1), 1) | {1: 300})
+    with caplog.at_level(logging.ERROR):
+        assert allocate_folders(config)[1] == [1]
+    assert "only 1 are free" in caplog.text
+    assert [len(f) for _, f in config.cards[1].folder_files()] == [300]
+
+
+def test_store_folders(temp_dir) -> None:
+    """Test that the allocation is only stored if cards use additional folders."""
+    config_file = temp_dir / "config.yaml"
+    plan_folders(config_with_files({1: 10}), config_file)
+    assert not folders_path(config_file).exists()
+
+    plan_folders(config_with_files({1: MAX_FILES + 1}), config_file)
+    assert load_folders(config_file) == {1: [1, 2]}
+
+    # Stored as well once no card uses additional folders anymore
+    plan_folders(config_with_files({1: 1}), config_file)
+    assert load_folders(config_file) == {1: [1]}
+
+
+def test_folder_bytecodes() -> None:
+    """Test that song numbers are translated to the folders that hold them."""
+    card = Card(no=1, mode="album-from-to", extra1=250, extra2=260, folders=[1, 7, 8])
+    card.sourcefiles = files(3 * MAX_FILES)
+    assert card.folder_bytecodes("1337B347", 2) == [
+        (1, card.create_card_bytecode("1337B347", 2, 1, "album-from-to", 250, 255)),
+        (2, card.create_card_bytecode("1337B347", 2, 7, "album-from-to", 1, 5)),
+    ]
+
+    card.mode, card.extra1, card.extra2 = "single", MAX_FILES + 3, 0
+    assert card.folder_bytecodes("1337B347", 2) == [
+        (2, card.create_card_bytecode("1337B347", 2, 7, "single", 3, 0)),
+    ]
+
+    card.mode, card.extra1 = "album", 0
+    assert [part for part, _ in card.folder_bytecodes("1337B347", 2)] == [1, 2, 3]
+
+
+def test_process_card_folders(temp_dir, test_audio_dir, monkeypatch) -> None:
+    """Test that the files of a card are copied to its folders, numbered from 1 in each."""
+    monkeypatch.setattr(_card, "MAX_FILES", 2)
+    monkeypatch.setattr(_folders, "MAX_FILES", 2)
+    config = _load_config_dict({"cards": {1: {"source": "."}, 2: {"source": "subdir_audio"}}})
+    for cardno, card in config.cards.items():
+        card.no = cardno
+        card.parse_sources(str(test_audio_dir))
+    assert allocate_folders(config)[1] == [1, 3]
+
+    tracks = config.cards[1].process_card(temp_dir, str(test_audio_dir), "tracknumber")
+    assert [track.file for track in tracks] == ["01/001.mp3", "01/002.mp3", "03/001.mp3"]
+    assert sorted(f.name for f in (temp_dir / "03").iterdir()) == ["001.mp3"]
@@ -4,19 +4,32 @@
 
 """Tests for _helper.py."""
 
+import hashlib
+import itertools
 import logging
+import os
+from collections.abc import Iterator
 
 import pytest
 
+from tonuino_cards_manager import _helpers
 from tonuino_cards_manager._helpers import (
+    ConfigError,
+    _copy_file,
     _sanitize_filename,
-    copy_to_sdcard,
+    _toc_tables,
+    atomic_write,
     decimal_to_hex,
     get_audio_length,
+    get_audio_tags,
+    get_destination_filename,
     get_directories_in_directory,
     get_files_in_directory,
+    probe_audio_file,
+    process_pool,
     proper_dirname,
     table_of_contents,
+    verify_copy,
 )
 
 
@@ -42,49 +55,120 @@ def test_sanitize_filename() -> None:
         assert _sanitize_filename(filename) == expected
 
 
-def test_copy_to_sdcard_with_tags(temp_dir, test_audio_dir, config) -> None:
-    """Test copying an MP3 file with ID3 tags to the destination directory."""
+def test_get_destination_filename_with_tags(test_audio_dir, config) -> None:
+    """Test the names of MP3 files with ID3 tags on the SD card."""
     mp3file_1 = test_audio_dir / "01. Tester - Test Sound 01.mp3"
     mp3file_2 = test_audio_dir / "02. Tester - Test Sound 02.mp3"
 
-    copy_to_sdcard(0, mp3file_1, temp_dir, config.filenametype)
-    copy_to_sdcard(1, mp3file_2, temp_dir, config.filenametype)
+    assert get_destination_filename(0, mp3file_1, config.filenametype) == (
+        "001-Tester-Test_Sound_01.mp3"
+    )
+    assert get_destination_filename(1, mp3file_2, config.filenametype) == (
+        "002-Tester-Test_Sound_02.mp3"
+    )
 
-    # Verify that the files were copied to the expected destination
-    assert (temp_dir / "001-Tester-Test_Sound_01.mp3").exists()
-    assert (temp_dir / "002-Tester-Test_Sound_02.mp3").exists()
 
-
-def test_copy_to_sdcard_without_tags(temp_dir, test_audio_dir, config) -> None:
-    """Test copying an MP3 file without ID3 tags to the destination directory."""
+def test_get_destination_filename_without_tags(test_audio_dir, config) -> None:
+    """Test the name of an MP3 file without ID3 tags on the SD card."""
     mp3file = test_audio_dir / "03. Tester - Test Sound 03 - without ID3.mp3"
 
-    copy_to_sdcard(2, mp3file, temp_dir, config.filenametype)
-
-    # Verify that the file was copied to the expected destination
-    assert (temp_dir / "003-03_Tester_-_Test_Sound_03_-_without_ID3.mp3").exists()
+    assert get_destination_filename(2, mp3file, config.filenametype) == (
+        "003-03_Tester_-_Test_Sound_03_-_without_ID3.mp3"
+    )
 
 
-def test_copy_to_sdcard_track_number_only(temp_dir, test_audio_dir) -> None:
-    """Test copying an MP3 file with configuration "tracknumber"."""
+def test_get_destination_filename_track_number_only(test_audio_dir) -> None:
+    """Test the name of an MP3 file with configuration "tracknumber"."""
     mp3file = test_audio_dir / "03. Tester - Test Sound 03 - without ID3.mp3"
 
-    copy_to_sdcard(3, mp3file, temp_dir, "tracknumber")
+    assert get_destination_filename(3, mp3file, "tracknumber") == "004.mp3"
 
-    # Verify that the file was copied to the expected destination
-    assert (temp_dir / "004.mp3").exists()
 
-
-def test_copy_to_sdcard_wrong_filenametype(temp_dir, test_audio_dir, caplog) -> None:
-    """Test copying an MP3 file with wrong configuration of filenametype."""
+def test_get_destination_filename_wrong_filenametype(test_audio_dir, caplog) -> None:
+    """Test the name of an MP3 file with wrong configuration of filenametype."""
     mp3file = test_audio_dir / "03. Tester - Test Sound 03 - without ID3.mp3"
-    with caplog.at_level(logging.CRITICAL), pytest.raises(SystemExit):
-        copy_to_sdcard(3, mp3file, temp_dir, "thisiswrong")
+    with caplog.at_level(logging.CRITICAL), pytest.raises(ConfigError):
+        get_destination_filename(3, mp3file, "thisiswrong")
 
     # Verify error
     assert "You did specify a wrong filenametype" in caplog.text
 
 
+def test_get_destination_filename_with_known_tags(test_audio_dir) -> None:
+    """Test that passed tags are used instead of reading the file."""
+    mp3file = test_audio_dir / "03. Tester - Test Sound 03 - without ID3.mp3"
+
+    tags = {"artist": "Cached", "title": "Title"}
+    assert get_destination_filename(4, mp3file, "mp3tags", tags) == "005-Cached-Title.mp3"
+    # Incomplete tags fall back to the file name
+    assert (
+        get_destination_filename(4, mp3file, "mp3tags", {"title": "Title"})
+        == "005-03_Tester_-_Test_Sound_03_-_without_ID3.mp3"
+    )
+
+
+def test_get_audio_tags(test_audio_dir) -> None:
+    """Test reading tags of files with and without ID3 tags."""
+    assert get_audio_tags(test_audio_dir / "01. Tester - Test Sound 01.mp3") == {
+        "artist": "Tester",
+        "title": "Test Sound 01",
+    }
+    assert get_audio_tags(test_audio_dir / "03. Tester - Test Sound 03 - without ID3.mp3") == {}
+
+
+def test_copy_file_reports_progress(temp_dir, test_audio_dir, monkeypatch) -> None:
+    """Test that written bytes are reported, both for small and chunked copies."""
+    mp3file = test_audio_dir / "01. Tester - Test Sound 01.mp3"
+    size = mp3file.stat().st_size
+    written: list[int] = []
+
+    _copy_file(mp3file, temp_dir / "001.mp3", advance=written.append)
+    assert written == [size]
+
+    # Force chunked copying of the file
+    written.clear()
+    monkeypatch.setattr(_helpers, "CHUNKED_COPY_THRESHOLD", 0)
+    monkeypatch.setattr(_helpers, "COPY_CHUNK_SIZE", 10000)
+    destpath = temp_dir / "002.mp3"
+    _copy_file(mp3file, destpath, advance=written.append)
+    assert sum(written) == size
+    assert len(written) == 6
+    assert destpath.read_bytes() == mp3file.read_bytes()
+    assert destpath.stat().st_mtime_ns == mp3file.stat().st_mtime_ns
+
+
+def test_copy_file_checksum(temp_dir, test_audio_dir) -> None:
+    """Test that the checksum is calculated while copying, only if copies are verified."""
+    mp3file = test_audio_dir / "01. Tester - Test Sound 01.mp3"
+    expected = hashlib.sha256(mp3file.read_bytes()).hexdigest()
+
+    assert _copy_file(mp3file, temp_dir / "none.mp3") is None
+    for mode in ("fast", "full"):
+        assert _copy_file(mp3file, temp_dir / f"{mode}.mp3", verify=mode) == expected
+        assert (temp_dir / f"{mode}.mp3").read_bytes() == mp3file.read_bytes()
+
+
+def test_verify_copy(temp_dir, test_audio_dir) -> None:
+    """Test detecting broken copies in the verification modes."""
+    mp3file = test_audio_dir / "01. Tester - Test Sound 01.mp3"
+    checksum = _copy_file(mp3file, temp_dir / "copy.mp3", verify="full")
+    assert checksum is not None
+
+    # Corrupt the copy, keeping size and mtime
+    stat = mp3file.stat()
+    (temp_dir / "copy.mp3").write_bytes(b"\x00" * stat.st_size)
+    os.utime(temp_dir / "copy.mp3", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    # The fast mode only reads the copy again if its size or mtime differ
+    verify_copy(mp3file, temp_dir / "copy.mp3", checksum, "fast")
+    with pytest.raises(OSError, match="does not match the checksum"):
+        verify_copy(mp3file, temp_dir / "copy.mp3", checksum, "full")
+
+    os.utime(temp_dir / "copy.mp3", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**10))
+    with pytest.raises(OSError, match="does not match the checksum"):
+        verify_copy(mp3file, temp_dir / "copy.mp3", checksum, "fast")
+
+
 def test_proper_dirname() -> None:
     """Test the proper_dirname function."""
     test_cases = [
@@ -127,6 +211,41 @@ def test_get_audio_length(test_audio_dir) -> None:
     assert get_audio_length(mp3file) == 3
 
 
+def test_get_audio_length_ogg(test_audio_dir) -> None:
+    """Test the get_audio_length function on Opus and Ogg Vorbis files."""
+    assert get_audio_length(test_audio_dir / "ogg" / "04. Tester - Opus Sound.opus") == 2
+    assert get_audio_length(test_audio_dir / "ogg" / "05. Vorbis Sound without tags.ogg") == 4
+
+
+def test_get_audio_length_no_audio(test_audio_dir, caplog) -> None:
+    """Test the get_audio_length function on a file which is not an audio file."""
+    with caplog.at_level(logging.ERROR):
+        assert get_audio_length(test_audio_dir / "00. not a music file.txt") == 0
+
+    assert "Could not detect the audio format" in caplog.text
+
+
+def test_probe_audio_file_ogg(test_audio_dir) -> None:
+    """Test reading length and tags of Opus and Ogg Vorbis files at once."""
+    assert probe_audio_file(test_audio_dir / "ogg" / "04. Tester - Opus Sound.opus") == (
+        2,
+        {"artist": "Tester", "title": "Opus Sound"},
+    )
+    assert probe_audio_file(test_audio_dir / "ogg" / "05. Vorbis Sound without tags.ogg") == (
+        4,
+        {},
+    )
+
+
+def test_get_destination_filename_keeps_extension(test_audio_dir) -> None:
+    """Test that non-MP3 files keep their extension on the SD card."""
+    opus = test_audio_dir / "ogg" / "04. Tester - Opus Sound.opus"
+    ogg = test_audio_dir / "ogg" / "05. Vorbis Sound without tags.ogg"
+
+    assert get_destination_filename(0, opus, "mp3tags") == "001-Tester-Opus_Sound.opus"
+    assert get_destination_filename(1, ogg, "tracknumber") == "002.ogg"
+
+
 def test_get_files_in_directory_all(test_audio_dir) -> None:
     """Test the get_files_in_directory function on files and directories."""
     expected_files = [
@@ -193,3 +312,85 @@ def test_table_of_contents_creates_file(test_config_dir) -> None:
     toc_list = [["No.", "Description", "Files", "Duration"], [1, "describtion1", 1, "0:00:01"]]
     table_of_contents(toc_list, test_config_dir / "ok_4cards.yaml")
     assert (test_config_dir / "TOC_ok_4cards.pdf").exists()
+
+
+def test_table_of_contents_one_table_per_card(temp_dir, monkeypatch) -> None:
+    """Test that the PDF has one table per card, whose rows are read while it is built."""
+    read = []
+
+    def rows() -> Iterator[list]:
+        yield ["No.", "Description", "Files", "Duration"]
+        for no in range(1, 4):
+            read.append(no)
+            yield [no, f"card {no}", 2, "0:00:02"]
+            yield ["", "001.mp3", "", "0:00:01"]
+            yield ["", "002.mp3", "", "0:00:01"]
+
+    tables = _toc_tables(itertools.islice(rows(), 1, None), None)
+    assert [table._nrows for table in tables] == [3, 3, 3]  # noqa: SLF001
+
+    build_from = _helpers._TocDocTemplate.build_from  # noqa: SLF001
+
+    def build_lazily(doc, flowables) -> None:
+        assert read == []
+        build_from(doc, flowables)
+
+    read.clear()
+    monkeypatch.setattr(_helpers._TocDocTemplate, "build_from", build_lazily)  # noqa: SLF001
+    table_of_contents(rows(), temp_dir / "box.yaml")
+    assert read == [1, 2, 3]
+    assert (temp_dir / "TOC_box.pdf").exists()
+
+
+def test_table_of_contents_header_on_every_page(temp_dir, monkeypatch) -> None:
+    """Test that the header row is repeated on every page after the first."""
+    pages = []
+    draw_header = _helpers._TocDocTemplate._draw_header  # noqa: SLF001
+
+    def record_page(doc, canvas, _doc) -> None:
+        pages.append(canvas.getPageNumber())
+        draw_header(doc, canvas, _doc)
+
+    monkeypatch.setattr(_helpers._TocDocTemplate, "_draw_header", record_page)  # noqa: SLF001
+    toc_list = [["No.", "Description", "Files", "Duration"]]
+    # A single card with more tracks than fit on a page
+    toc_list.append([1, "card", 100, "0:01:40"])
+    toc_list.extend(["", f"{no:03}.mp3", "", "0:00:01"] for no in range(1, 101))
+    table_of_contents(toc_list, temp_dir / "box.yaml")
+    assert len(pages) > 1
+    assert pages == list(range(2, len(pages) + 2))
+
+
+def test_table_of_contents_escapes_tags(temp_dir) -> None:
+    """Test that artists and titles looking like markup are shown as they are."""
+    toc_list = [
+        ["No.", "Description", "Files", "Duration"],
+        [1, "Tom & Jerry", 1, "0:00:01"],
+        ["", "001.mp3 (<b>Intro)", "", "0:00:01"],
+    ]
+    table_of_contents(toc_list, temp_dir / "box.yaml")
+    assert (temp_dir / "TOC_box.pdf").exists()
+
+
+def test_atomic_write(temp_dir) -> None:
+    """Test that files are only replaced once written completely."""
+    path = temp_dir / "store.json"
+    with atomic_write(path) as file:
+        file.write("first")
+
+    def interrupted() -> None:
+        with atomic_write(path) as file:
+            file.write("incomplete")
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        interrupted()
+    assert path.read_text(encoding="UTF-8") == "first"
+    assert [f.name for f in temp_dir.iterdir()] == ["store.json"]
+
+
+def test_process_pool_spawns() -> None:
+    """Test that worker processes are spawned, as forking copies locks held by other threads."""
+    with process_pool(1) as pool:
+        assert pool._mp_context.get_start_method() == "spawn"  # noqa: SLF001
+        assert pool.submit(decimal_to_hex, 255).result() == "ff"
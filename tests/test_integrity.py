@@ -0,0 +1,105 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _integrity.py."""
+
+import logging
+import shutil
+from pathlib import Path
+
+import pytest
+
+from tonuino_cards_manager import _integrity
+from tonuino_cards_manager._config import _load_config_dict
+from tonuino_cards_manager._integrity import check_cards, check_file, check_integrity
+from tonuino_cards_manager._metadata import MetadataCache
+
+MP3 = "01. Tester - Test Sound 01.mp3"
+OGG = "ogg/05. Vorbis Sound without tags.ogg"
+
+
+def damaged_copy(source: Path, target: Path, keep: float = 1.0) -> Path:
+    """Copy a file, keeping only the given share of it."""
+    data = source.read_bytes()
+    target.write_bytes(data[: int(len(data) * keep)])
+    return target
+
+
+def frame(bitrate_index: int) -> bytes:
+    """Create an MPEG-1 Layer III frame at 44.1 kHz, without audio data."""
+    bitrate = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160)[bitrate_index]
+    header = bytes((0xFF, 0xFB, bitrate_index << 4, 0x00))
+    return header + bytes(144 * bitrate * 1000 // 44100 - len(header))
+
+
+@pytest.mark.parametrize(
+    "name",
+    [MP3, "03. Tester - Test Sound 03 - without ID3.mp3", OGG, "ogg/04. Tester - Opus Sound.opus"],
+)
+def test_intact_files(test_audio_dir, name) -> None:
+    """Test that intact files have no problems."""
+    assert check_file(test_audio_dir / name) == []
+
+
+def test_truncated_files(temp_dir, test_audio_dir) -> None:
+    """Test that files cut off in the middle are detected."""
+    mp3 = damaged_copy(test_audio_dir / MP3, temp_dir / "cut.mp3", keep=0.5)
+    assert any(problem.startswith("truncated") for problem in check_file(mp3))
+    ogg = damaged_copy(test_audio_dir / OGG, temp_dir / "cut.ogg", keep=0.5)
+    assert check_file(ogg) == ["truncated, the last page is incomplete"]
+
+
+def test_corrupt_mp3(temp_dir, test_audio_dir) -> None:
+    """Test that data overwritten in the middle of an MP3 file is detected."""
+    data = bytearray((test_audio_dir / MP3).read_bytes())
+    data[len(data) // 2 : len(data) // 2 + 1000] = bytes(1000)
+    (temp_dir / "corrupt.mp3").write_bytes(data)
+    problems = check_file(temp_dir / "corrupt.mp3")
+    assert len(problems) == 2
+    assert problems[0].endswith("bytes between frames are not audio data")
+    assert problems[1].endswith("frames are missing")
+
+
+def test_vbr_without_header(temp_dir) -> None:
+    """Test that variable bitrates without a Xing header are detected."""
+    (temp_dir / "vbr.mp3").write_bytes((frame(9) + frame(10)) * 10)
+    assert check_file(temp_dir / "vbr.mp3") == [
+        "variable bitrate without Xing or VBRI header, durations are wrong"
+    ]
+    (temp_dir / "cbr.mp3").write_bytes(frame(9) * 20)
+    assert check_file(temp_dir / "cbr.mp3") == []
+    (temp_dir / "empty.mp3").write_bytes(b"")
+    assert check_file(temp_dir / "empty.mp3") == ["no MPEG audio frames"]
+
+
+def test_check_integrity_processes(temp_dir, test_audio_dir, monkeypatch) -> None:
+    """Test that many files are checked in batches by spawned processes."""
+    monkeypatch.setattr(_integrity, "MIN_CHUNK_SIZE", 2)
+    damaged = damaged_copy(test_audio_dir / MP3, temp_dir / "cut.mp3", keep=0.5)
+    files = [damaged, *sorted(test_audio_dir.glob("*.mp3"))]
+    cache = MetadataCache()
+    assert list(check_integrity(files, cache, jobs=2)) == [damaged]
+    assert all(cache.get_integrity(file) is not None for file in files)
+
+
+def test_check_integrity_cache(temp_dir, test_audio_dir, caplog) -> None:
+    """Test that results are cached until a file changes, and problems are logged per card."""
+    shutil.copytree(test_audio_dir, temp_dir / "audio")
+    damaged = damaged_copy(test_audio_dir / MP3, temp_dir / "audio" / MP3, keep=0.5)
+    intact = temp_dir / "audio" / "02. Tester - Test Sound 02.mp3"
+    cache = MetadataCache()
+    assert list(check_integrity([damaged, intact], cache)) == [damaged]
+    assert cache.get_integrity(intact) == []
+    assert cache.get_integrity(damaged)
+
+    shutil.copy(test_audio_dir / MP3, damaged)
+    assert cache.get_integrity(damaged) is None
+    assert check_integrity([damaged, intact], cache) == {}
+
+    damaged_copy(test_audio_dir / MP3, damaged, keep=0.5)
+    config = _load_config_dict({"cards": {1: {"source": "."}}})
+    config.cards[1].parse_sources(str(temp_dir / "audio"))
+    with caplog.at_level(logging.WARNING):
+        assert list(check_cards(config, cache)) == [damaged]
+    assert f"Card 1: {damaged} may not play correctly: truncated" in caplog.text
@@ -0,0 +1,140 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _loudness.py."""
+
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from tonuino_cards_manager import _loudness
+from tonuino_cards_manager._card import Card
+from tonuino_cards_manager._config import Config
+from tonuino_cards_manager._loudness import (
+    analyze_loudness,
+    card_gain,
+    normalize_cards,
+    parse_ebur128,
+)
+from tonuino_cards_manager._metadata import Loudness, MetadataCache
+from tonuino_cards_manager._strip import plan_copy
+
+EBUR128_OUTPUT = """
+[Parsed_ebur128_0 @ 0x5581] t: 2.9     TARGET:-23 LUFS    M: -20.1 S: -21.0     I: -20.5 LUFS
+[Parsed_ebur128_0 @ 0x5581] Summary:
+
+  Integrated loudness:
+    I:         -19.8 LUFS
+    Threshold: -30.0 LUFS
+
+  Loudness range:
+    LRA:         5.2 LU
+
+  True peak:
+    Peak:        -1.2 dBFS
+"""
+
+
+def test_parse_ebur128() -> None:
+    """Test reading the summary of ffmpeg's ebur128 filter."""
+    assert parse_ebur128(EBUR128_OUTPUT) == Loudness(-19.8, -1.2)
+    assert parse_ebur128(EBUR128_OUTPUT.replace("-1.2 dBFS", "-inf dBFS")) == Loudness(
+        -19.8, float("-inf")
+    )
+    assert parse_ebur128("Invalid data found when processing input") is None
+
+
+def test_card_gain() -> None:
+    """Test calculating the loudness and gain of a card from its tracks."""
+    integrated, gain = card_gain([(Loudness(-20, -6), 60), (Loudness(-20, -8), 120)])
+    assert integrated == pytest.approx(-20)
+    assert gain == pytest.approx(2)
+
+    # Longer tracks weigh more, and the gain is limited by the highest peak
+    integrated, gain = card_gain([(Loudness(-10, -0.5), 10), (Loudness(-30, -12), 1000)], -20)
+    assert -30 < integrated < -20
+    assert gain == pytest.approx(-0.5)
+
+    # Silent tracks are ignored
+    assert card_gain([(Loudness(-80, float("-inf")), 10)]) is None
+    assert card_gain([]) is None
+
+
+def test_analyze_loudness_cache(monkeypatch, temp_dir, test_audio_dir) -> None:
+    """Test that the loudness is only analysed for new or changed files."""
+    files = [Path(shutil.copy(f, temp_dir)) for f in test_audio_dir.glob("0*.mp3")]
+    cache = MetadataCache(temp_dir / "cache.sqlite")
+    cache.set_loudness(files[0], Loudness(-16, -1))
+
+    analysed = []
+
+    def fake_analyze(path: Path) -> Loudness:
+        analysed.append(path)
+        return Loudness(-23, -3)
+
+    monkeypatch.setattr(_loudness, "analyze_file", fake_analyze)
+    monkeypatch.setattr(shutil, "which", lambda _: "/usr/bin/ffmpeg")
+
+    results = analyze_loudness(files, cache)
+    assert results[files[0]] == Loudness(-16, -1)
+    assert sorted(analysed) == sorted(files[1:])
+
+    # Changed files are analysed again, the others come from the cache
+    analysed.clear()
+    os.utime(files[0], ns=(0, 0))
+    assert analyze_loudness(files, MetadataCache(temp_dir / "cache.sqlite")) == {
+        file: Loudness(-23, -3) for file in files
+    }
+    assert analysed == [files[0]]
+
+
+def test_normalize_cards_mp3_only(monkeypatch, temp_dir, test_audio_dir, caplog) -> None:
+    """Test that only MP3 files are analysed and get a gain, and the others are reported."""
+    mp3file = test_audio_dir / "01. Tester - Test Sound 01.mp3"
+    opusfile = test_audio_dir / "ogg" / "04. Tester - Opus Sound.opus"
+    analysed = []
+
+    def fake_analyze(path: Path) -> Loudness:
+        analysed.append(path)
+        return Loudness(-20, -5)
+
+    monkeypatch.setattr(_loudness, "analyze_file", fake_analyze)
+    monkeypatch.setattr(shutil, "which", lambda _: "/usr/bin/ffmpeg")
+    config = Config(
+        cards={
+            1: Card(no=1, sourcefiles=[opusfile]),
+            2: Card(no=2, sourcefiles=[mp3file, opusfile]),
+        }
+    )
+
+    with caplog.at_level(logging.WARNING):
+        normalize_cards(config, MetadataCache(temp_dir / "cache.sqlite"))
+    assert analysed == [mp3file]
+    assert config.cards[1].gain == 0.0
+    assert config.cards[2].gain == 2.0
+    assert "Card 1 has 1 files that are not MP3" in caplog.text
+    assert "Card 2 has 1 files that are not MP3" in caplog.text
+
+
+def test_copy_with_gain(temp_dir, test_audio_dir) -> None:
+    """Test that the gain of a card is applied to MP3 files, without changing their size."""
+    mp3file = test_audio_dir / "01. Tester - Test Sound 01.mp3"
+    plan = plan_copy(mp3file, gain=-3.2)
+    assert plan.gain_steps == -2
+    assert not plan.is_full_copy(mp3file.stat().st_size)
+    assert plan_copy(mp3file, gain=0.5).is_full_copy(mp3file.stat().st_size)
+
+    card = Card(no=1, source=[mp3file.name], gain=-3.0)
+    card.process_card(temp_dir, str(test_audio_dir), "tracknumber")
+    copy = temp_dir / "01" / "001.mp3"
+    assert copy.stat().st_size == mp3file.stat().st_size
+    assert copy.read_bytes() != mp3file.read_bytes()
+
+    # The change is lossless and can be reverted
+    with open(copy, "rb") as copyfile:
+        reverted = b"".join(plan_copy(copy, gain=3.0).chunks(copyfile, 4096))
+    assert reverted == mp3file.read_bytes()
@@ -0,0 +1,63 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _manifest.py."""
+
+import hashlib
+import logging
+from pathlib import Path
+
+from tonuino_cards_manager._destinations import Destinations
+from tonuino_cards_manager._manifest import MANIFEST_NAME, Manifest
+
+
+def test_manifest_roundtrip(temp_dir) -> None:
+    """Test recording, saving, loading and pruning files."""
+    for name in ("01/001.mp3", "01/002.mp3", "02/001.mp3"):
+        (temp_dir / name).parent.mkdir(exist_ok=True)
+        (temp_dir / name).write_bytes(b"abc")
+
+    manifest = Manifest.load(temp_dir)
+    assert not manifest.files
+    manifest.add(Path("01/001.mp3"), "checksum")
+    manifest.add(Path("01/002.mp3"), None)
+    manifest.add(Path("02/001.mp3"), None)
+    manifest.save()
+
+    loaded = Manifest.load(temp_dir)
+    assert loaded.files == manifest.files
+    assert loaded.files["01/001.mp3"].size == 3
+    assert loaded.files["01/001.mp3"].sha256 == "checksum"
+
+    loaded.remove_directory(Path("01"))
+    assert list(loaded.files) == ["02/001.mp3"]
+
+    (temp_dir / "02" / "001.mp3").unlink()
+    (temp_dir / "02").rmdir()
+    manifest.prune()
+    assert list(manifest.files) == ["01/001.mp3", "01/002.mp3"]
+
+
+def test_manifest_broken(temp_dir, caplog) -> None:
+    """Test that a broken manifest is ignored."""
+    (temp_dir / MANIFEST_NAME).write_text("{no json")
+    with caplog.at_level(logging.WARNING):
+        assert not Manifest.load(temp_dir).files
+    assert "Could not read manifest" in caplog.text
+
+
+def test_manifest_written_by_destinations(temp_dir, test_audio_dir, cards_ok) -> None:
+    """Test that copied files are recorded with their checksums on all destinations."""
+    destinations = Destinations([temp_dir / "a", temp_dir / "b"], verify="fast")
+    tracks = cards_ok[3].process_card(destinations, test_audio_dir, "mp3tags")
+    destinations.save_manifests()
+    destinations.close()
+
+    for dest in destinations.all:
+        manifest = Manifest.load(dest.path)
+        assert sorted(manifest.files) == [f"03/{track.file}" for track in tracks]
+        for name, entry in manifest.files.items():
+            content = (dest.path / name).read_bytes()
+            assert entry.size == len(content)
+            assert entry.sha256 == hashlib.sha256(content).hexdigest()
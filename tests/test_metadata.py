@@ -0,0 +1,82 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _metadata.py."""
+
+import os
+import shutil
+import sqlite3
+
+from tonuino_cards_manager._metadata import (
+    CACHE_VERSION,
+    MetadataCache,
+    TrackInfo,
+    default_cache_dir,
+    probe_track,
+)
+
+
+def test_probe_track(test_audio_dir) -> None:
+    """Test reading metadata of files with and without tags."""
+    info = probe_track(test_audio_dir / "01. Tester - Test Sound 01.mp3")
+    assert info.duration == 3
+    assert info.artist == "Tester"
+    assert info.title == "Test Sound 01"
+    assert info.tags == {"artist": "Tester", "title": "Test Sound 01"}
+    assert (info.disc, info.track) == (0, 1)
+
+    info = probe_track(test_audio_dir / "03. Tester - Test Sound 03 - without ID3.mp3")
+    assert info.duration == 3
+    assert info.tags == {}
+
+
+def test_default_cache_dir(monkeypatch, temp_dir) -> None:
+    """Test that the cache directory honours XDG_CACHE_HOME."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(temp_dir))
+    assert default_cache_dir() == temp_dir / "tonuino-cards-manager"
+
+
+def test_cache_hits_and_invalidation(temp_dir, test_audio_dir) -> None:
+    """Test that cached metadata is re-used and refreshed on file changes."""
+    mp3 = temp_dir / "song.mp3"
+    shutil.copy2(test_audio_dir / "01. Tester - Test Sound 01.mp3", mp3)
+    cache = MetadataCache(temp_dir / "cache" / "metadata.sqlite")
+
+    first = cache.get(mp3)
+    second = cache.get(mp3)
+    assert first == second
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # A changed modification time invalidates the entry
+    stat = mp3.stat()
+    os.utime(mp3, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.get(mp3).mtime_ns == stat.st_mtime_ns + 1_000_000_000
+    assert cache.misses == 2
+    cache.close()
+
+
+def test_cache_persistence(temp_dir, test_audio_dir) -> None:
+    """Test that the cache survives between instances, and outdated versions are dropped."""
+    dbpath = temp_dir / "metadata.sqlite"
+    mp3 = test_audio_dir / "02. Tester - Test Sound 02.mp3"
+
+    cache = MetadataCache(dbpath)
+    cache.get(mp3)
+    cache.close()
+
+    cache = MetadataCache(dbpath)
+    assert isinstance(cache.get(mp3), TrackInfo)
+    assert (cache.hits, cache.misses) == (1, 0)
+    cache.close()
+
+    # Simulate a cache written by another version of the tool
+    db = sqlite3.connect(dbpath)
+    db.execute(f"PRAGMA user_version = {CACHE_VERSION + 100}")
+    db.commit()
+    db.close()
+
+    cache = MetadataCache(dbpath)
+    cache.get(mp3)
+    assert (cache.hits, cache.misses) == (0, 1)
+    cache.close()
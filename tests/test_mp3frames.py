@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _mp3frames.py."""
+
+from benchmarks.pipeline import MP3_FRAME_HEADER, MP3_FRAME_SIZE
+from tonuino_cards_manager._mp3frames import (
+    _get_byte,
+    _global_gain_offsets,
+    adjust_frame_gain,
+    adjust_global_gain,
+    crc16,
+    parse_header,
+)
+from tonuino_cards_manager._strip import mp3_audio_range
+
+
+def global_gains(data: bytes) -> list[int]:
+    """Get the global_gain values of all frames in MP3 audio data."""
+    gains = []
+    pos = 0
+    while (header := parse_header(data, pos)) is not None:
+        side_start = pos + 4 + (2 if header.protected else 0)
+        side_info = bytearray(data[side_start : side_start + header.side_info_size])
+        gains.extend(_get_byte(side_info, offset) for offset in _global_gain_offsets(header))
+        pos += header.length
+    assert pos == len(data)
+    return gains
+
+
+def test_parse_header() -> None:
+    """Test parsing valid and invalid frame headers."""
+    header = parse_header(MP3_FRAME_HEADER)
+    assert header is not None
+    assert (header.version, header.bitrate, header.sample_rate) == (1, 128, 44100)
+    assert header.length == MP3_FRAME_SIZE
+    assert header.side_info_size == 32
+    assert parse_header(b"ID3\x04") is None
+    assert parse_header(b"\xff\xfb") is None
+    # Layer II
+    assert parse_header(b"\xff\xfd\x90\x00") is None
+
+
+def test_adjust_global_gain(test_audio_dir) -> None:
+    """Test changing the volume of real MP3 data in chunks, and reverting it."""
+    mp3file = test_audio_dir / "01. Tester - Test Sound 01.mp3"
+    start, end = mp3_audio_range(mp3file)
+    audio = mp3file.read_bytes()[start:end]
+    chunks = [audio[i : i + 1000] for i in range(0, len(audio), 1000)]
+
+    louder = b"".join(adjust_global_gain(chunks, 2))
+    assert len(louder) == len(audio)
+    # The Info frame at the start has no audio data and is left unchanged
+    before, after = global_gains(audio), global_gains(louder)
+    assert after[:4] == before[:4] == [0, 0, 0, 0]
+    assert [a - b for a, b in zip(after[4:], before[4:], strict=True)] == [2] * (len(after) - 4)
+
+    assert b"".join(adjust_global_gain([louder], -2)) == audio
+
+
+def test_adjust_frame_gain_crc() -> None:
+    """Test that the CRC of protected frames is updated."""
+    # MPEG-1 Layer III with CRC, 128 kbit/s, 44.1 kHz, mono
+    original = b"\xff\xfa\x90\xc0" + b"\x00\x00" + b"\x01" * (MP3_FRAME_SIZE - 6)
+    frame = bytearray(original)
+    header = parse_header(frame)
+    assert header is not None
+    assert header.protected
+    assert header.mono
+
+    adjust_frame_gain(frame, header, -3)
+    assert frame[4:6] == crc16(frame[2:4] + frame[6 : 6 + header.side_info_size]).to_bytes(2)
+    assert global_gains(bytes(frame)) == [gain - 3 for gain in global_gains(original)]
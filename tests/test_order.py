@@ -0,0 +1,108 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _order.py."""
+
+import logging
+import shutil
+from pathlib import Path
+
+from mutagen.easyid3 import EasyID3
+
+from tonuino_cards_manager._config import _load_config_dict
+from tonuino_cards_manager._metadata import MetadataCache
+from tonuino_cards_manager._order import ORDER_FILE, natural_key, natural_path_key, order_files
+
+
+def make_album(directory: Path, mp3: Path, tracks: dict[str, tuple[str, str]]) -> list[Path]:
+    """Create files with the given disc and track numbers, returned sorted by path."""
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, (disc, track) in tracks.items():
+        shutil.copy(mp3, directory / name)
+        tags = EasyID3(directory / name)
+        tags["discnumber"], tags["tracknumber"] = disc, track
+        tags.save()
+    return sorted(directory / name for name in tracks)
+
+
+def test_natural_order() -> None:
+    """Test that numbers are compared by their value."""
+    files = [Path(name) for name in ("10.mp3", "2.mp3", "CD 10/1.mp3", "CD 9/1.mp3", "a 1.mp3")]
+    assert [str(f) for f in sorted(files, key=natural_path_key)] == [
+        "2.mp3",
+        "10.mp3",
+        "a 1.mp3",
+        "CD 9/1.mp3",
+        "CD 10/1.mp3",
+    ]
+    assert order_files(sorted(files), "natural") == sorted(files, key=natural_path_key)
+    # The default keeps the order of the paths
+    assert order_files(sorted(files), "path") == sorted(files)
+
+
+def test_natural_order_other_digits() -> None:
+    """Test that digits which are no numbers, like superscripts, are compared as text."""
+    assert natural_key("1²2.mp3") == ["", 1, "²", 2, ".mp", 3, ""]
+    # Decimal digits of other scripts are numbers
+    assert natural_key("٣.ogg") == ["", 3, ".ogg"]
+    files = [Path(name) for name in ("m²10.mp3", "m²9.mp3", "m³.mp3")]
+    assert [str(f) for f in sorted(files, key=natural_path_key)] == [
+        "m²9.mp3",
+        "m²10.mp3",
+        "m³.mp3",
+    ]
+
+
+def test_tags_order(temp_dir, test_audio_dir) -> None:
+    """Test ordering a multi-disc album by its disc and track numbers."""
+    files = make_album(
+        temp_dir / "album",
+        test_audio_dir / "03. Tester - Test Sound 03 - without ID3.mp3",
+        {"a.mp3": ("2", "1/2"), "b.mp3": ("1", "2/2"), "c.mp3": ("1/2", "1"), "d.mp3": ("", "")},
+    )
+    cache = MetadataCache()
+    assert [f.name for f in order_files(files, "tags", cache)] == [
+        "d.mp3",
+        "c.mp3",
+        "b.mp3",
+        "a.mp3",
+    ]
+    assert cache.misses == 4
+
+    # Read from the cache the next time
+    order_files(files, "tags", cache)
+    assert cache.misses == 4
+
+
+def test_file_order(temp_dir, test_audio_dir, caplog) -> None:
+    """Test ordering files as listed in an order file."""
+    files = make_album(
+        temp_dir / "album",
+        test_audio_dir / "03. Tester - Test Sound 03 - without ID3.mp3",
+        {"10.mp3": ("", ""), "2.mp3": ("", ""), "intro.mp3": ("", "")},
+    )
+    (temp_dir / "album" / ORDER_FILE).write_text("# Intro first\nintro.mp3\n\nmissing.mp3\n")
+    with caplog.at_level(logging.WARNING):
+        assert [f.name for f in order_files(files, "file")] == ["intro.mp3", "2.mp3", "10.mp3"]
+    assert "missing.mp3" in caplog.text
+
+
+def test_card_order(temp_dir, test_audio_dir) -> None:
+    """Test that cards take the configured order, with a default for all cards."""
+    make_album(
+        temp_dir / "album",
+        test_audio_dir / "03. Tester - Test Sound 03 - without ID3.mp3",
+        {"10.mp3": ("", "1"), "2.mp3": ("", "2")},
+    )
+    config = _load_config_dict(
+        {
+            "sourcebasedir": str(temp_dir),
+            "track_order": "natural",
+            "cards": {1: {"source": "album"}, 2: {"source": "album", "order": "tags"}},
+        }
+    )
+    for card in config.cards.values():
+        card.parse_sources(config.sourcebasedir)
+    assert [f.name for f in config.cards[1].sourcefiles] == ["2.mp3", "10.mp3"]
+    assert [f.name for f in config.cards[2].sourcefiles] == ["10.mp3", "2.mp3"]
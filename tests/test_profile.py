@@ -0,0 +1,89 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _profile.py."""
+
+import io
+import json
+import pstats
+import threading
+import time
+
+import yaml
+
+from tonuino_cards_manager import api
+from tonuino_cards_manager._catalog import Catalog
+from tonuino_cards_manager._metadata import MetadataCache
+from tonuino_cards_manager._profile import SPEEDSCOPE_SCHEMA, profiling
+
+
+def busy_function(seconds: float) -> None:
+    """Keep the CPU busy for a while."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_profiling_disabled(temp_dir) -> None:
+    """Test that no profile is written without a path."""
+    with profiling(None):
+        busy_function(0.01)
+    assert not list(temp_dir.iterdir())
+
+
+def test_profiling_cprofile(temp_dir) -> None:
+    """Test that cProfile results can be loaded with pstats."""
+    path = temp_dir / "run.pstats"
+    with profiling(path, "cprofile"):
+        busy_function(0.01)
+
+    stats = pstats.Stats(str(path))
+    assert any(func[2] == "busy_function" for func in stats.stats)  # type: ignore[attr-defined]
+
+
+def test_profiling_sampling(temp_dir) -> None:
+    """Test that the sampling profiler writes a speedscope file."""
+    path = temp_dir / "run.speedscope.json"
+    with profiling(path, "sampling"):
+        busy_function(0.2)
+
+    data = json.loads(path.read_text(encoding="UTF-8"))
+    assert data["$schema"] == SPEEDSCOPE_SCHEMA
+    profile = data["profiles"][0]
+    assert profile["type"] == "sampled"
+    assert len(profile["samples"]) == len(profile["weights"]) > 0
+    names = [frame["name"] for frame in data["shared"]["frames"]]
+    assert "busy_function" in names
+    # The innermost frame is last in each sample
+    assert any(names[sample[-1]] == "busy_function" for sample in profile["samples"])
+
+
+def test_profiling_threads(temp_dir, test_audio_dir) -> None:
+    """Test that the work done in other threads during a sync is profiled as well."""
+    config_file = temp_dir / "box.yaml"
+    config_file.write_text(
+        yaml.safe_dump({"sourcebasedir": str(test_audio_dir), "cards": {1: {"source": "."}}}),
+        encoding="UTF-8",
+    )
+    path = temp_dir / "run.pstats"
+    options = api.SyncOptions(qrcodes=io.StringIO())
+    with profiling(path, "cprofile"):
+        api.sync(config_file, temp_dir / "sd", options, MetadataCache(), Catalog())
+
+    stats = pstats.Stats(str(path))
+    assert any(func[2] == "generate_qr_codes" for func in stats.stats)  # type: ignore[attr-defined]
+
+
+def test_profiling_sampling_threads(temp_dir) -> None:
+    """Test that the sampling profiler records other threads in profiles of their own."""
+    path = temp_dir / "run.speedscope.json"
+    with profiling(path, "sampling"):
+        worker = threading.Thread(target=busy_function, args=(0.2,), name="worker")
+        worker.start()
+        worker.join()
+
+    data = json.loads(path.read_text(encoding="UTF-8"))
+    names = [frame["name"] for frame in data["shared"]["frames"]]
+    (profile,) = (p for p in data["profiles"] if p["name"].endswith("(worker)"))
+    assert any(names[sample[-1]] == "busy_function" for sample in profile["samples"])
@@ -0,0 +1,71 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _progress.py."""
+
+import io
+import logging
+
+from tonuino_cards_manager._progress import Progress
+from tonuino_cards_manager._stats import MEGABYTE
+
+
+def test_progress_interactive() -> None:
+    """Test that the status line is updated in place on a terminal."""
+    stream = io.StringIO()
+    progress = Progress(4 * MEGABYTE, stream=stream, interactive=True)
+    progress.interval = 0
+    progress.start_card(1, 2 * MEGABYTE)
+    progress.advance(MEGABYTE)
+
+    output = stream.getvalue()
+    assert "\r\033[K" in output
+    assert "Card 1: 1.0/2.0 MB (50%)" in output
+    assert "Total: 1.0/4.0 MB (25%)" in output
+    assert "ETA 0:00:0" in output
+    assert progress.done == progress.card_done == MEGABYTE
+
+
+def test_progress_print() -> None:
+    """Test that output of other threads is printed above the status line."""
+    stream, out = io.StringIO(), io.StringIO()
+    progress = Progress(4 * MEGABYTE, stream=stream, interactive=True)
+    progress.start_card(1, 2 * MEGABYTE)
+
+    progress.print("QR code\n", out)
+    assert out.getvalue() == "QR code\n"
+    # The status line is cleared before and redrawn after the output
+    assert stream.getvalue().rsplit("\r\033[K", 1)[1].startswith("Card 1: 0.0/2.0 MB (0%)")
+
+
+def test_progress_throttled() -> None:
+    """Test that updates are throttled."""
+    stream = io.StringIO()
+    progress = Progress(100, stream=stream, interactive=True)
+    progress.start_card(1, 100)
+    for _ in range(100):
+        progress.advance(1)
+
+    assert "Card 1" not in stream.getvalue()
+    assert progress.done == 100
+
+
+def test_progress_log_lines(caplog) -> None:
+    """Test that progress is logged if not on a terminal."""
+    progress = Progress(2 * MEGABYTE, stream=io.StringIO(), interactive=False)
+    progress.interval = 0
+    progress.start_card(3, 2 * MEGABYTE)
+    with caplog.at_level(logging.INFO):
+        progress.advance(2 * MEGABYTE)
+        progress.close()
+
+    assert "Progress: Card 3: 2.0/2.0 MB (100%)" in caplog.text
+    assert "Copied 2.0 MB" in caplog.text
+
+
+def test_progress_eta_unknown() -> None:
+    """Test the status before anything has been written."""
+    progress = Progress(MEGABYTE, stream=io.StringIO(), interactive=False)
+    assert progress.eta is None
+    assert "ETA ?" in progress.status()
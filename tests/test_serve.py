@@ -0,0 +1,167 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _serve.py."""
+
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from tonuino_cards_manager import _serve, api
+from tonuino_cards_manager._catalog import Catalog
+from tonuino_cards_manager._metadata import MetadataCache
+from tonuino_cards_manager._serve import JobServer, Scheduler, create_token, validate_job
+
+from .test_api import write_config
+
+TOKEN = "test-token"  # noqa: S105
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Fixture running the daemon on a free port, with a cache in memory."""
+    monkeypatch.setattr(api, "_shared_cache", MetadataCache())
+    monkeypatch.setattr(api, "_shared_catalog", Catalog())
+    scheduler = Scheduler(workers=2)
+    with JobServer(("127.0.0.1", 0), scheduler, TOKEN) as job_server:
+        thread = threading.Thread(target=job_server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{job_server.server_port}"
+        job_server.shutdown()
+    scheduler.close()
+
+
+def request(url: str, data: dict | None = None, **headers: str) -> tuple[int, dict]:
+    """Send a request to the daemon, returning the status and the JSON response."""
+    body = json.dumps(data).encode() if data is not None else None
+    headers = {"Authorization": f"Bearer {TOKEN}", "Content-Type": "application/json"} | headers
+    req = urllib.request.Request(url, body, {k: v for k, v in headers.items() if v})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as exc:
+        return exc.code, json.loads(exc.read())
+
+
+def wait_for(url: str, job_id: int) -> dict:
+    """Wait until a job is finished, and return it."""
+    for _ in range(200):
+        _, job = request(f"{url}/jobs/{job_id}")
+        if job["state"] in {"done", "failed"}:
+            return job
+        time.sleep(0.05)
+    pytest.fail(f"Job {job_id} did not finish")
+
+
+def test_validate_job() -> None:
+    """Test the validation of submitted jobs."""
+    assert validate_job({"type": "qrcodes", "config": "box.yaml"}) is None
+    assert validate_job({"type": "sync", "config": "box.yaml", "destination": ["a", "b"]}) is None
+    assert "type" in validate_job({"type": "delete", "config": "box.yaml"})
+    assert "destination" in validate_job({"type": "verify", "config": "box.yaml"})
+    assert "verify" in validate_job(
+        {"type": "sync", "config": "x", "destination": "a", "verify": 1}
+    )
+    assert "object" in validate_job([])
+
+
+def test_scheduler(monkeypatch, temp_dir) -> None:
+    """Test that the queue is bounded and jobs on the same destination do not overlap."""
+    running: list[str] = []
+    overlaps: list[str] = []
+    release = threading.Event()
+
+    def job(params: dict) -> dict:
+        if params["destination"] in running:
+            overlaps.append(params["destination"])
+        running.append(params["destination"])
+        release.wait(5)
+        running.remove(params["destination"])
+        return {}
+
+    monkeypatch.setitem(_serve.JOB_TYPES, "sync", (job, True))
+    scheduler = Scheduler(workers=2, queue_size=1)
+    params = {"type": "sync", "config": "box.yaml", "destination": str(temp_dir)}
+    jobs = [scheduler.submit(dict(params))]
+    # Wait for a worker to take the first job, so the second one fits into the queue
+    while jobs[0].state == "queued":
+        time.sleep(0.01)
+    jobs.append(scheduler.submit(dict(params)))
+    # The second worker takes it and waits for the destination, so a third job can wait
+    while len(jobs) < 3:
+        try:
+            jobs.append(scheduler.submit(dict(params)))
+        except queue.Full:  # noqa: PERF203
+            time.sleep(0.01)
+    # But a fourth exceeds the queue
+    with pytest.raises(queue.Full):
+        scheduler.submit(dict(params))
+
+    release.set()
+    scheduler.close()
+    assert [job.state for job in jobs] == ["done", "done", "done"]
+    assert not overlaps
+    assert scheduler.list_jobs() == jobs
+    assert scheduler.get_job(jobs[1].id) is jobs[1]
+
+
+def test_serve(server, temp_dir, test_audio_dir) -> None:
+    """Test syncing, verifying and creating QR codes through the daemon."""
+    config_file = str(write_config(temp_dir, test_audio_dir))
+    sd = str(temp_dir / "sd")
+
+    status, job = request(
+        f"{server}/jobs", {"type": "sync", "config": config_file, "destination": sd}
+    )
+    assert status == 202
+    job = wait_for(server, job["id"])
+    assert job["state"] == "done", job["error"]
+    assert job["result"]["ok"]
+    assert len(job["result"]["qrdata"]) == 2
+
+    _, job = request(f"{server}/jobs", {"type": "verify", "config": config_file, "destination": sd})
+    job = wait_for(server, job["id"])
+    assert job["result"] == {"ok": True, "drift": {sd: []}}
+
+    _, job = request(f"{server}/jobs", {"type": "qrcodes", "config": config_file})
+    job = wait_for(server, job["id"])
+    assert "QR code for cards batch 1" in job["result"]["qrcodes"]
+
+    # Failing jobs are reported, invalid ones rejected
+    _, job = request(f"{server}/jobs", {"type": "toc", "config": str(temp_dir / "missing.yaml")})
+    job = wait_for(server, job["id"])
+    assert job["state"] == "failed"
+    assert "FileNotFoundError" in job["error"]
+    assert request(f"{server}/jobs", {"type": "toc"})[0] == 400
+    assert request(f"{server}/jobs/999")[0] == 404
+
+    status, jobs = request(f"{server}/jobs")
+    assert status == 200
+    assert [job["type"] for job in jobs] == ["sync", "verify", "qrcodes", "toc"]
+
+
+def test_reject_foreign_requests(server, temp_dir) -> None:
+    """Test that requests websites could send are rejected."""
+    job = {"type": "toc", "config": str(temp_dir / "box.yaml")}
+    form = "application/x-www-form-urlencoded"
+    assert request(f"{server}/jobs", job, **{"Content-Type": form})[0] == 415
+    assert request(f"{server}/jobs", job, Authorization="")[0] == 401
+    assert request(f"{server}/jobs", Authorization="Bearer wrong")[0] == 401
+    assert request(f"{server}/jobs", job, Host="attacker.example:8337")[0] == 403
+    assert request(f"{server}/jobs", Host="localhost:8337")[0] == 200
+    assert request(f"{server}/jobs")[1] == []
+
+
+def test_create_token(temp_dir) -> None:
+    """Test that the token is only readable by the user, and new for every start."""
+    path = temp_dir / "serve.token"
+    token = create_token(path)
+    assert path.read_text(encoding="UTF-8") == token
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert create_token(path) != token
@@ -0,0 +1,109 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _sources.py."""
+
+import logging
+import shutil
+
+import pytest
+from mutagen.easyid3 import EasyID3
+
+from tonuino_cards_manager._catalog import Catalog
+from tonuino_cards_manager._config import _load_config_dict
+from tonuino_cards_manager._helpers import ConfigError
+from tonuino_cards_manager._sources import glob_files, resolve_source
+
+
+@pytest.fixture
+def library(temp_dir, test_audio_dir):
+    """Fixture providing a copy of the test audio files, with albums on two of them."""
+    path = temp_dir / "library"
+    shutil.copytree(test_audio_dir, path)
+    for name, album in (
+        ("01. Tester - Test Sound 01.mp3", "One"),
+        ("02. Tester - Test Sound 02.mp3", "Two"),
+    ):
+        tags = EasyID3(path / name)
+        tags["album"] = album
+        tags.save()
+    return path
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    ["*.mp3", "*", "**", "**/*.mp3", "ogg/*", "[0-9][0-9]. *", "0?. Tester*", "sub*", "ogg/**"],
+)
+def test_glob(library, pattern) -> None:
+    """Test that globs resolve the same with and without the catalog."""
+    catalog = Catalog()
+    catalog.scan(library)
+    assert catalog.glob(library, pattern) == glob_files(library, pattern)
+
+
+def test_glob_files(library) -> None:
+    """Test resolving globs by walking the library."""
+    assert [f.name for f in glob_files(library, "**/*.o*")] == [
+        "04. Tester - Opus Sound.opus",
+        "05. Vorbis Sound without tags.ogg",
+    ]
+    # Matching directories contribute their audio files
+    assert [f.name for f in glob_files(library, "sub*")] == ["A different file.mp3"]
+
+
+def test_resolve_source(library, caplog) -> None:
+    """Test resolving paths, globs and tag queries."""
+    base = str(library.parent)
+    catalog = Catalog()
+
+    # Tag queries need a catalog
+    with caplog.at_level(logging.ERROR):
+        assert resolve_source({"artist": "tester"}, base, catalog) == []
+    assert "Run the scan command first" in caplog.text
+
+    catalog.scan(base)
+    assert len(resolve_source("library", base, catalog)) == 3
+    assert len(resolve_source({"glob": "library/**/*.mp3"}, base, catalog)) == 4
+    assert [f.name for f in resolve_source({"artist": "tester"}, base, catalog)] == [
+        "01. Tester - Test Sound 01.mp3",
+        "02. Tester - Test Sound 02.mp3",
+        "04. Tester - Opus Sound.opus",
+    ]
+    assert resolve_source({"artist": "Tester", "album": "two"}, base, catalog) == [
+        library / "02. Tester - Test Sound 02.mp3"
+    ]
+    # Globs do not need a catalog
+    assert len(resolve_source({"glob": "library/**/*.mp3"}, base)) == 4
+
+
+def test_query_cache(library) -> None:
+    """Test that query results are cached until the catalog changes."""
+    catalog = Catalog()
+    catalog.scan(library)
+    assert len(catalog.query(library, {"album": "One"})) == 1
+
+    # Tags changed, but not scanned yet, so the cached result stays
+    tags = EasyID3(library / "02. Tester - Test Sound 02.mp3")
+    tags["album"] = "One"
+    tags.save()
+    assert len(catalog.query(library, {"album": "One"})) == 1
+
+    catalog.scan(library)
+    assert len(catalog.query(library, {"album": "One"})) == 2
+
+    # A changed directory is listed again for globs
+    shutil.copy(library / "01. Tester - Test Sound 01.mp3", library / "ogg" / "new.mp3")
+    assert catalog.glob(library, "ogg/*") is None
+
+
+def test_source_schema() -> None:
+    """Test which sources the config accepts."""
+    sources = ["dir", {"glob": "**/*.mp3"}, {"artist": "Tester", "album": "One"}]
+    config = _load_config_dict({"cards": {1: {"source": sources}, 2: {"source": {"title": "x"}}}})
+    assert config.cards[1].source == sources
+    assert config.cards[2].source == [{"title": "x"}]
+
+    for source in ({"glob": "*", "artist": "x"}, {"genre": "Rock"}, {}):
+        with pytest.raises(ConfigError):
+            _load_config_dict({"cards": {1: {"source": source}}})
@@ -0,0 +1,127 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _split.py."""
+
+import logging
+import os
+import shutil
+import sqlite3
+
+from mutagen.id3 import CHAP, ID3, TIT2
+from mutagen.mp3 import MP3
+
+from benchmarks.pipeline import MP3_FRAME_SIZE, write_mp3
+from tonuino_cards_manager._card import Card
+from tonuino_cards_manager._config import Config
+from tonuino_cards_manager._metadata import MetadataCache
+from tonuino_cards_manager._split import plan_card_split, split_cards
+from tonuino_cards_manager._strip import mp3_audio_range
+
+# 26.1 ms per frame
+FRAMES_PER_MINUTE = 2297
+
+
+def audio_data(path) -> bytes:
+    """Get the audio data of an MP3 file without its tags."""
+    start, end = mp3_audio_range(path)
+    return path.read_bytes()[start:end]
+
+
+def test_split_fixed_length(temp_dir) -> None:
+    """Test splitting a file into parts of a fixed length, and reusing them."""
+    library = temp_dir / "library"
+    library.mkdir()
+    write_mp3(library / "book.mp3", FRAMES_PER_MINUTE * 2 + 100, {"artist": "Author"})
+    config = Config(sourcebasedir=str(library), cards={1: Card(no=1, source=["."], split=1)})
+    config.cards[1].parse_sources(config.sourcebasedir)
+
+    split_cards(config, MetadataCache(), temp_dir / "split", jobs=2)
+
+    parts = config.cards[1].sourcefiles
+    assert [part.name for part in parts] == ["part-001.mp3", "part-002.mp3", "part-003.mp3"]
+    assert b"".join(audio_data(part) for part in parts) == audio_data(library / "book.mp3")
+    assert len(audio_data(parts[0])) == FRAMES_PER_MINUTE * MP3_FRAME_SIZE
+    assert str(MP3(parts[2])["TIT2"]) == "book (3/3)"
+    assert str(MP3(parts[2])["TPE1"]) == "Author"
+
+    # Parts of earlier runs are reused
+    mtimes = [part.stat().st_mtime_ns for part in parts]
+    config.cards[1].parse_sources(config.sourcebasedir)
+    split_cards(config, MetadataCache(), temp_dir / "split")
+    assert config.cards[1].sourcefiles == parts
+    assert [part.stat().st_mtime_ns for part in parts] == mtimes
+
+
+def test_split_chapters(temp_dir, test_audio_dir) -> None:
+    """Test splitting a file into its ID3 chapters, leaving out its Info frame."""
+    library = temp_dir / "library"
+    library.mkdir()
+    book = shutil.copy(test_audio_dir / "01. Tester - Test Sound 01.mp3", library / "book.mp3")
+    shutil.copy(test_audio_dir / "02. Tester - Test Sound 02.mp3", library / "other.mp3")
+    id3 = ID3(book)
+    id3.add(CHAP(element_id="ch1", start_time=0, end_time=1000, sub_frames=[TIT2(text="One")]))
+    id3.add(CHAP(element_id="ch2", start_time=1000, end_time=3000, sub_frames=[TIT2(text="Two")]))
+    id3.save()
+    config = Config(
+        sourcebasedir=str(library), cards={1: Card(no=1, source=["."], split="chapters")}
+    )
+    config.cards[1].parse_sources(config.sourcebasedir)
+
+    split_cards(config, MetadataCache(), temp_dir / "split")
+
+    parts = config.cards[1].sourcefiles
+    assert [part.name for part in parts] == ["part-001.mp3", "part-002.mp3", "other.mp3"]
+    assert [str(MP3(part)["TIT2"]) for part in parts[:2]] == ["One", "Two"]
+    assert MP3(parts[0]).info.length < 1.1
+    assert b"Info" not in audio_data(parts[0])[:100]
+    assert audio_data(book).endswith(b"".join(audio_data(part) for part in parts[:2]))
+
+
+def test_split_shared_source(temp_dir) -> None:
+    """Test that cards with the same source share its parts, and unused parts are removed."""
+    library = temp_dir / "library"
+    library.mkdir()
+    write_mp3(library / "book.mp3", FRAMES_PER_MINUTE * 2 + 100)
+    split_dir = temp_dir / "split"
+    cards = {no: Card(no=no, source=["book.mp3"], split=1) for no in (1, 2)}
+    config = Config(sourcebasedir=str(library), cards=cards)
+    for card in config.cards.values():
+        card.parse_sources(config.sourcebasedir)
+
+    split_cards(config, MetadataCache(), split_dir, jobs=2)
+
+    assert len(config.cards[1].sourcefiles) == 3
+    assert config.cards[1].sourcefiles == config.cards[2].sourcefiles
+    assert len(list(split_dir.iterdir())) == 1
+
+    # Parts of other split points of the file, and parts unused for long, are removed
+    stale = split_dir / "0123456789abcdef-0123456789abcdef"
+    stale.mkdir()
+    os.utime(stale, (0, 0))
+    for card in config.cards.values():
+        card.split = 2
+        card.parse_sources(config.sourcebasedir)
+    split_cards(config, MetadataCache(), split_dir)
+    assert len(config.cards[1].sourcefiles) == 2
+    assert [outdir.name for outdir in split_dir.iterdir()] == [
+        config.cards[1].sourcefiles[0].parent.name
+    ]
+
+
+def test_split_too_many_files(temp_dir, caplog) -> None:
+    """Test that longer parts are used if the card would have too many files otherwise."""
+    write_mp3(temp_dir / "book.mp3", 100)
+    cache = MetadataCache(temp_dir / "cache.sqlite")
+    cache.get(temp_dir / "book.mp3")
+    cache.close()
+    # Pretend the book is 5.5 hours long
+    with sqlite3.connect(temp_dir / "cache.sqlite") as db:
+        db.execute("UPDATE tracks SET duration = 19800")
+
+    card = Card(no=1, split=1, sourcefiles=[temp_dir / "book.mp3"])
+    with caplog.at_level(logging.WARNING):
+        plans = plan_card_split(card, MetadataCache(temp_dir / "cache.sqlite"))
+    assert len(plans[temp_dir / "book.mp3"].titles) == 165
+    assert "Using parts of 2 minutes instead" in caplog.text
@@ -0,0 +1,54 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _stats.py."""
+
+import json
+
+from tonuino_cards_manager._stats import MEGABYTE, CardStats, RunStats
+
+
+def test_phase_accumulates() -> None:
+    """Test that repeated phases add up."""
+    stats = CardStats(no=1)
+    with stats.phase("copy"):
+        pass
+    first = stats.phases["copy"]
+    with stats.phase("copy"):
+        pass
+    assert stats.phases["copy"] >= first
+    assert list(stats.phases) == ["copy"]
+
+
+def test_copy_rate() -> None:
+    """Test the calculation of the copy throughput."""
+    stats = CardStats(no=1, bytes_copied=10 * MEGABYTE)
+    assert stats.copy_rate == 0.0
+    stats.phases["copy"] = 2.0
+    assert stats.copy_rate == 5.0
+
+
+def test_run_stats_summary_and_json(temp_dir) -> None:
+    """Test the totals, summary and JSON export of a run."""
+    stats = RunStats()
+    with stats.phase("config"):
+        pass
+    card = stats.add_card(1)
+    card.files = 3
+    card.bytes_copied = MEGABYTE
+    card.phases["copy"] = 0.5
+    stats.add_card(2).files = 2
+
+    assert stats.files == 5
+    assert stats.bytes_copied == MEGABYTE
+    assert stats.card_phase("copy") == 0.5
+
+    summary = stats.summary()
+    assert "config" in summary
+    assert "5 files, 1.0 MB copied" in summary
+
+    stats.write_json(temp_dir / "stats.json")
+    data = json.loads((temp_dir / "stats.json").read_text(encoding="UTF-8"))
+    assert data["files"] == 5
+    assert data["cards"][0]["copy_rate"] == 2.0
@@ -0,0 +1,73 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _strip.py."""
+
+from pathlib import Path
+
+import pytest
+from mutagen.apev2 import APENoHeaderError, APEv2
+from mutagen.id3 import APIC, COMM, ID3, TIT2, TPE1
+from mutagen.mp3 import MP3
+
+from benchmarks.pipeline import write_mp3
+from tonuino_cards_manager._helpers import _copy_file, get_audio_tags, get_destination_filename
+from tonuino_cards_manager._strip import mp3_audio_range, plan_copy
+
+FRAMES = 20
+FRAME_SIZE = 417
+
+
+def tagged_mp3(path: Path) -> Path:
+    """Write an MP3 file with artwork in ID3v2, plus ID3v1 and APEv2 tags."""
+    write_mp3(path, FRAMES)
+    id3 = ID3()
+    id3.add(TPE1(encoding=3, text="Tester"))
+    id3.add(TIT2(encoding=3, text="Big Sound"))
+    id3.add(COMM(encoding=3, lang="eng", desc="", text="x" * 5000))
+    id3.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="", data=b"\xff" * 50000))
+    id3.save(path, v1=2)
+    ape = APEv2()
+    ape["Title"] = "Big Sound"
+    ape.save(path)
+    return path
+
+
+def test_mp3_audio_range(temp_dir, test_audio_dir) -> None:
+    """Test finding the audio data between the tags."""
+    mp3file = tagged_mp3(temp_dir / "tagged.mp3")
+    start, end = mp3_audio_range(mp3file)
+    assert end - start == FRAMES * FRAME_SIZE
+    assert mp3file.read_bytes()[start : start + 2] == b"\xff\xfb"
+
+    write_mp3(temp_dir / "plain.mp3", FRAMES)
+    assert mp3_audio_range(temp_dir / "plain.mp3") == (0, FRAMES * FRAME_SIZE)
+
+    # Opus files are copied unchanged
+    opus = test_audio_dir / "ogg" / "04. Tester - Opus Sound.opus"
+    plan = plan_copy(opus, strip=True, tags={"title": "Opus Sound"})
+    assert plan.is_full_copy(opus.stat().st_size)
+
+
+def test_copy_stripped(temp_dir) -> None:
+    """Test that only the audio data and a minimal tag are written."""
+    mp3file = tagged_mp3(temp_dir / "tagged.mp3")
+    (temp_dir / "sdcard").mkdir()
+
+    tags = get_audio_tags(mp3file)
+    destpath = temp_dir / "sdcard" / get_destination_filename(0, mp3file, "mp3tags", tags)
+    _copy_file(mp3file, destpath, plan=plan_copy(mp3file, strip=True, tags=tags))
+
+    assert destpath.name == "001-Tester-Big_Sound.mp3"
+    plan = plan_copy(mp3file, strip=True, tags={"artist": "Tester", "title": "Big Sound"})
+    assert destpath.stat().st_size == plan.size < FRAMES * FRAME_SIZE + 100
+
+    # The audio data is unchanged, and only artist and title are left as tags
+    start, end = mp3_audio_range(mp3file)
+    assert destpath.read_bytes().endswith(mp3file.read_bytes()[start:end])
+    stripped = MP3(destpath)
+    assert set(stripped.tags.keys()) == {"TPE1", "TIT2"}
+    assert str(stripped.tags["TIT2"]) == "Big Sound"
+    with pytest.raises(APENoHeaderError):
+        APEv2(destpath)
@@ -0,0 +1,178 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _toc.py."""
+
+import logging
+import threading
+
+from tonuino_cards_manager._toc import (
+    TOC_HEADER,
+    StoredTocEntries,
+    TocEntry,
+    TocTrack,
+    compact_toc_store,
+    iter_toc_rows,
+    load_toc_entries,
+    save_toc_entry,
+    toc_path,
+    write_tables_of_contents,
+)
+
+
+def test_toc_entry_as_row() -> None:
+    """Test the conversion of a TocEntry to a table row."""
+    assert TocEntry(no=3, description="desc", files=2, duration=3725).as_row() == [
+        3,
+        "desc",
+        2,
+        "1:02:05",
+    ]
+
+
+def test_toc_path(temp_dir) -> None:
+    """Test the path of table of contents files next to the config file."""
+    assert toc_path(temp_dir / "mybox.yaml", ".pdf") == temp_dir / "TOC_mybox.pdf"
+
+
+def test_save_and_load_toc_entries(temp_dir, caplog) -> None:
+    """Test storing card metadata incrementally and loading it again."""
+    config_file = temp_dir / "mybox.yaml"
+    save_toc_entry(TocEntry(no=2, description="second", files=1, duration=3), config_file)
+    save_toc_entry(TocEntry(no=1, description="first", files=2, duration=6), config_file)
+    # Overwrite the entry of a card
+    save_toc_entry(TocEntry(no=2, description="second new", files=1, duration=3), config_file)
+
+    entries = load_toc_entries(config_file)
+    assert [e.no for e in entries] == [1, 2]
+    assert entries[1].description == "second new"
+
+    # Only request configured cards, and report missing ones
+    with caplog.at_level(logging.WARNING):
+        entries = load_toc_entries(config_file, [2, 3])
+    assert [e.no for e in entries] == [2]
+    assert "No stored metadata for card 3" in caplog.text
+
+
+def test_toc_store_is_appended(temp_dir, caplog) -> None:
+    """Test that entries are appended, broken records ignored, and the store compacted."""
+    config_file = temp_dir / "mybox.yaml"
+    store = toc_path(config_file, ".jsonl")
+    for description in ("old", "new"):
+        save_toc_entry(TocEntry(no=1, description=description), config_file)
+    save_toc_entry(TocEntry(no=2, description="second"), config_file)
+    # A record cut off by an interrupted run
+    with open(store, "a", encoding="UTF-8") as storefile:
+        storefile.write('{"no": 3, "desc')
+    assert len(store.read_text(encoding="UTF-8").splitlines()) == 4
+
+    with caplog.at_level(logging.WARNING):
+        entries = StoredTocEntries(config_file)
+    assert "Ignoring a broken record" in caplog.text
+    assert len(entries) == 2
+    # The entries can be iterated repeatedly
+    descriptions = ["new", "second"]
+    assert [e.description for e in entries] == [e.description for e in entries] == descriptions
+    # New records start on a new line
+    save_toc_entry(TocEntry(no=3, description="third"), config_file)
+
+    compact_toc_store(config_file)
+    assert len(store.read_text(encoding="UTF-8").splitlines()) == 3
+    assert [e.description for e in load_toc_entries(config_file)] == [*descriptions, "third"]
+
+
+def test_toc_store_concurrent_writers(temp_dir) -> None:
+    """Test that no entries are lost if jobs on the same config store and compact at once."""
+    config_file = temp_dir / "mybox.yaml"
+
+    def store(first: int) -> None:
+        for cardno in range(first, first + 20):
+            save_toc_entry(TocEntry(no=cardno, description=str(cardno)), config_file)
+            compact_toc_store(config_file)
+
+    threads = [threading.Thread(target=store, args=(first,)) for first in (1, 21, 41)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [e.no for e in load_toc_entries(config_file)] == list(range(1, 61))
+    assert [f.name for f in temp_dir.iterdir()] == ["TOC_mybox.jsonl"]
+
+
+def test_toc_store_compacted_while_reading(temp_dir) -> None:
+    """Test that stored entries can be read after another job compacted the store."""
+    config_file = temp_dir / "mybox.yaml"
+    for cardno in (1, 2, 3, 1, 2, 3):
+        save_toc_entry(TocEntry(no=cardno, description=str(cardno)), config_file)
+    entries = StoredTocEntries(config_file)
+    compact_toc_store(config_file)
+    assert [e.description for e in entries] == ["1", "2", "3"]
+
+
+def test_load_toc_entries_no_store(temp_dir) -> None:
+    """Test loading card metadata if no run has happened yet."""
+    assert load_toc_entries(temp_dir / "mybox.yaml") == []
+
+
+def test_iter_toc_rows_does_not_modify_header() -> None:
+    """Test that generating rows multiple times yields identical results."""
+    entries = [TocEntry(no=1, description="first", files=2, duration=6)]
+    rows_first = list(iter_toc_rows(entries))
+    rows_second = list(iter_toc_rows(entries))
+    assert rows_first == rows_second
+    assert rows_first[0] == TOC_HEADER
+
+
+def test_iter_toc_rows_detailed() -> None:
+    """Test the detailed table of contents listing every track."""
+    entries = [
+        TocEntry(
+            no=1,
+            description="first",
+            files=2,
+            duration=6,
+            tracks=[
+                TocTrack(file="001-Tester-Song.mp3", artist="Tester", title="Song", duration=3),
+                TocTrack(file="002-file.mp3", duration=3),
+            ],
+        )
+    ]
+    assert list(iter_toc_rows(entries, detailed=True))[1:] == [
+        [1, "first", 2, "0:00:06"],
+        ["", "001-Tester-Song.mp3 (Tester - Song)", "", "0:00:03"],
+        ["", "002-file.mp3", "", "0:00:03"],
+    ]
+    # Tracks are only shown in detailed mode
+    assert len(list(iter_toc_rows(entries))) == 2
+
+
+def test_load_toc_entries_with_tracks(temp_dir) -> None:
+    """Test that tracks survive storing and loading card metadata."""
+    config_file = temp_dir / "mybox.yaml"
+    track = TocTrack(file="001.mp3", artist="Tester", title="Song", duration=3)
+    save_toc_entry(
+        TocEntry(no=1, description="first", files=1, duration=3, tracks=[track]), config_file
+    )
+
+    assert load_toc_entries(config_file)[0].tracks == [track]
+
+
+def test_write_tables_of_contents(temp_dir) -> None:
+    """Test writing the table of contents in all formats."""
+    config_file = temp_dir / "mybox.yaml"
+    entries = [
+        TocEntry(no=1, description="first | pipe", files=2, duration=6),
+        TocEntry(no=2, description="<second>", files=1, duration=3),
+    ]
+    write_tables_of_contents(entries, config_file, ["pdf", "csv", "md", "html"])
+
+    assert (temp_dir / "TOC_mybox.pdf").exists()
+    assert (temp_dir / "TOC_mybox.csv").read_text(encoding="UTF-8").splitlines() == [
+        "No.,Description,Files,Duration",
+        "1,first | pipe,2,0:00:06",
+        "2,<second>,1,0:00:03",
+    ]
+    markdown = (temp_dir / "TOC_mybox.md").read_text(encoding="UTF-8")
+    assert "| 1 | first \\| pipe | 2 | 0:00:06 |" in markdown
+    assert "&lt;second&gt;" in (temp_dir / "TOC_mybox.html").read_text(encoding="UTF-8")
@@ -0,0 +1,76 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Tests for _verify.py."""
+
+import os
+
+from tonuino_cards_manager._destinations import Destinations
+from tonuino_cards_manager._metadata import MetadataCache
+from tonuino_cards_manager._verify import Drift, verify_destination
+
+
+def sync(config, destination, verify: str = "none") -> None:
+    """Copy all cards of the config to the destination."""
+    destinations = Destinations([destination], verify=verify)
+    for cardno, card in config.cards.items():
+        card.no = cardno
+        card.process_card(
+            destinations, config.sourcebasedir, config.filenametype, strip_tags=config.strip_tags
+        )
+    destinations.save_manifests()
+
+
+def test_verify_unchanged(temp_dir, test_audio_dir, config) -> None:
+    """Test that a freshly synced SD card has no drift, also in deep mode."""
+    config.sourcebasedir = str(test_audio_dir)
+    sync(config, temp_dir, verify="fast")
+
+    assert verify_destination(config, temp_dir, MetadataCache()) == []
+    assert verify_destination(config, temp_dir, MetadataCache(), deep=True) == []
+
+
+def test_verify_stripped(temp_dir, test_audio_dir, config) -> None:
+    """Test that files with stripped tags are expected in their stripped size."""
+    config.sourcebasedir = str(test_audio_dir)
+    config.strip_tags = True
+    sync(config, temp_dir)
+
+    assert verify_destination(config, temp_dir, MetadataCache(), deep=True) == []
+    config.strip_tags = False
+    assert verify_destination(config, temp_dir, MetadataCache())
+
+
+def test_verify_drift(temp_dir, test_audio_dir, config) -> None:
+    """Test detecting missing, additional and changed files."""
+    config.sourcebasedir = str(test_audio_dir)
+    sync(config, temp_dir)
+
+    (temp_dir / "01" / "001-Tester-Test_Sound_01.mp3").unlink()
+    (temp_dir / "02" / "003-additional.mp3").touch()
+    (temp_dir / "05").mkdir()
+    (temp_dir / "mp3").mkdir()
+    with open(temp_dir / "02" / "001-Tester-Test_Sound_01.mp3", "ab") as mp3file:
+        mp3file.write(b"garbage")
+
+    # Corrupt the content of a file, keeping its size and mtime
+    corrupted = temp_dir / "02" / "002-Tester-Test_Sound_02.mp3"
+    stat = corrupted.stat()
+    corrupted.write_bytes(b"\x00" * stat.st_size)
+    os.utime(corrupted, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    size = (test_audio_dir / "01. Tester - Test Sound 01.mp3").stat().st_size
+    expected = [
+        Drift("01/001-Tester-Test_Sound_01.mp3", "missing"),
+        Drift("02/001-Tester-Test_Sound_01.mp3", f"size is {size + 7} instead of {size}"),
+        Drift("02/003-additional.mp3", "not configured"),
+        Drift("05", "directory is not configured"),
+    ]
+    assert verify_destination(config, temp_dir, MetadataCache()) == expected
+
+    # Only the deep verification compares the content
+    assert verify_destination(config, temp_dir, MetadataCache(), deep=True) == sorted(
+        [*expected, Drift("02/002-Tester-Test_Sound_02.mp3", "content differs from the source")],
+        key=lambda d: d.path,
+    )
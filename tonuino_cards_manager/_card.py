@@ -5,16 +5,27 @@
 """Dataclass holding configuration for a single card and all its operations."""
 
 import logging
+from collections.abc import Callable
 from dataclasses import dataclass, field
 from pathlib import Path
 
+from ._catalog import Catalog
+from ._destinations import Destination, Destinations
 from ._helpers import (
-    copy_to_sdcard,
     decimal_to_hex,
-    get_audio_length,
+    get_destination_filename,
     get_files_in_directory,
     proper_dirname,
 )
+from ._metadata import MetadataCache
+from ._order import order_files
+from ._sources import resolve_source
+from ._stats import MEGABYTE, CardStats
+from ._strip import plan_copy
+from ._toc import TocTrack
+
+# Highest number of files in a directory that typical Tonuino MP3 players support
+MAX_FILES = 255
 
 MODES = {
     "play-random": 1,
@@ -36,20 +47,28 @@ class Card:  # pylint: disable=too-many-instance-attributes
     no: int = 0
     description: str = ""
     summary: str = ""
-    source: list[str] = field(default_factory=list)
+    source: list[str | dict[str, str]] = field(default_factory=list)
     mode: str = "play-random"
     from_song: int = 0
     to_song: int = 0
     extra1: int = 0
     extra2: int = 0
     sourcefiles: list[Path] = field(default_factory=list)
+    description_generic: str = ""
+    description_detailed: str | None = None
+    split: int | str = 0
+    order: str = "path"
+    gain: float = 0.0
+    # Folders on the SD card holding the files, the first one being the card number. Cards with
+    # more than MAX_FILES files get additional folders allocated
+    folders: list[int] = field(default_factory=list)
 
     def import_dict_to_card(self, data: dict) -> None:
         """Import the config dict for a card as DC."""
         for key, value in data.items():
-            # `source` can be a string or a list. Convert it to a list if it's a string
-            if key == "source" and isinstance(value, str):
-                logging.debug("Converting source string to list: %s", value)
+            # `source` can be a string, a query or a list. Convert it to a list if it's not
+            if key == "source" and isinstance(value, (str, dict)):
+                logging.debug("Converting source to list: %s", value)
                 setattr(self, key, [value])
             else:
                 logging.debug("Overriding default configuration for '%s' with '%s'", key, value)
@@ -91,26 +110,21 @@ class Card:  # pylint: disable=too-many-instance-attributes
                     "This card will not work as expected!"
                 )
 
-    def parse_sources(self, sourcebasepath: str) -> None:
-        """Parse sources, which can be one or multiple directories or single files."""
-        # Check for each source whether it's a directory or file
-        for source_str in self.source:
-            source = Path(sourcebasepath) / Path(source_str)
-
-            logging.debug("Parsing source %s", source)
-
-            if source.is_dir():
-                logging.debug("%s has been detected as a directory", source)
-                self.sourcefiles.extend(get_files_in_directory(source, audio_only=True))
-            elif source.is_file():
-                logging.debug("%s has been detected as a file", source)
-                self.sourcefiles.append(source)
-            else:
-                logging.warning(
-                    "%s seems to be neither a file nor a directory. Will not process",
-                    source,
-                )
-                continue
+    def parse_sources(
+        self,
+        sourcebasepath: str,
+        catalog: Catalog | None = None,
+        cache: MetadataCache | None = None,
+    ) -> None:
+        """
+        Parse sources, which can be one or multiple directories, single files, or queries by
+        glob patterns or tags. They are resolved with `catalog` if given and up to date. The
+        files of each source are sorted by the card's `order`, with tags taken from `cache`.
+        """
+        self.sourcefiles = []
+        for source in self.source:
+            files = resolve_source(source, sourcebasepath, catalog)
+            self.sourcefiles.extend(order_files(files, self.order, cache))
 
     def check_no_files_at_all(self) -> None:
         """Check whether sources contain any files at all."""
@@ -118,38 +132,136 @@ class Card:  # pylint: disable=too-many-instance-attributes
             logging.warning("Directory for this card does not seem to have any file at all!")
 
     def check_too_many_files(self) -> None:
-        """Check whether sources contain too many files (>255)."""
-        if len(self.sourcefiles) > 255:  # noqa: PLR2004
-            logging.warning(
-                "This card and therefore a directory on the SD card is handling "
-                "more than 255 files (%s). This will not work in typical Tonuino MP3 players!",
-                len(self.sourcefiles),
-            )
+        """Check whether a directory of the card gets too many files (>255)."""
+        for folder, files in self.folder_files():
+            if len(files) > MAX_FILES:
+                logging.warning(
+                    "The directory %s on the SD card is handling more than 255 files (%s). This "
+                    "will not work in typical Tonuino MP3 players!",
+                    proper_dirname(folder),
+                    len(files),
+                )
 
-    def process_card(self, destination: str, sourcebasepath: str, filenametype: str) -> list[int]:
-        """Process a card with its configuration, copying files and return audio lengths of card."""
-        # Convert card number to two-digit folder number (max. 99), and create destination path
-        dirpath = Path(destination) / Path(proper_dirname(self.no))
+    def folder_files(self) -> list[tuple[int, list[Path]]]:
+        """
+        Get the folders of the card with the files each of them holds. Each folder gets MAX_FILES
+        files, the last one all remaining files.
+        """
+        folders = self.folders or [self.no]
+        parts = []
+        for idx, folder in enumerate(folders):
+            start = idx * MAX_FILES
+            end = start + MAX_FILES if idx < len(folders) - 1 else len(self.sourcefiles)
+            parts.append((folder, self.sourcefiles[start:end]))
+        return parts
 
-        # create destination directory if not present, delete all files in it
-        dirpath.mkdir(parents=True, exist_ok=True)
-        for dirfile in get_files_in_directory(dirpath):
-            logging.debug("Delete %s from destination", dirfile)
-            dirfile.unlink(missing_ok=True)
+    def track_filename(self, folder: int, filename: str) -> str:
+        """The file name of a track as listed in tables of contents, with its folder if needed."""
+        if len(self.folders) > 1:
+            return f"{proper_dirname(folder)}/{filename}"
+        return filename
+
+    def plan_tracks(self, filenametype: str, cache: MetadataCache | None = None) -> list[TocTrack]:
+        """
+        Get the tracks that processing the card will write, from the metadata of its parsed
+        sources only, without copying anything.
+        """
+        if cache is None:
+            cache = MetadataCache()
+        tracks = []
+        for folder, files in self.folder_files():
+            for idx, sourcefile in enumerate(files):
+                info = cache.get(sourcefile)
+                filename = get_destination_filename(idx, sourcefile, filenametype, info.tags)
+                tracks.append(
+                    TocTrack(
+                        file=self.track_filename(folder, filename),
+                        artist=info.artist,
+                        title=info.title,
+                        duration=info.duration,
+                    )
+                )
+        return tracks
 
-        # Parse provided sources for this card, get list of all single MP3 files
-        self.parse_sources(sourcebasepath)
+    def process_card(  # noqa: PLR0913
+        self,
+        destination: str | Path | Destinations,
+        sourcebasepath: str,
+        filenametype: str,
+        cache: MetadataCache | None = None,
+        stats: CardStats | None = None,
+        advance: Callable[[int], None] | None = None,
+        strip_tags: bool = False,
+    ) -> list[TocTrack]:
+        """
+        Process a card with its configuration, copying files and return the tracks written to
+        the card. `destination` is a directory, or multiple ones that are written to at once.
+        Metadata of the source files is taken from `cache` if given. Timings and counters are
+        recorded in `stats` if given. `advance` is called with the number of bytes copied. With
+        `strip_tags`, artwork and other tags are left out of MP3 files.
+        """
+        if stats is None:
+            stats = CardStats(no=self.no)
+        if not isinstance(destination, Destinations):
+            destination = Destinations([destination])
+
+        # Parse provided sources for this card, get list of all single MP3 files. They may have
+        # been parsed before already to plan the run
+        if cache is None:
+            cache = MetadataCache()
+        if not self.sourcefiles:
+            with stats.phase("scan"):
+                self.parse_sources(sourcebasepath, cache=cache)
+        stats.files = len(self.sourcefiles)
 
         # Run checks
         self.check_no_files_at_all()
         self.check_too_many_files()
 
-        audiolength = []
-        # Iterate through all files
-        for idx, mp3 in enumerate(self.sourcefiles):
-            copy_to_sdcard(idx, mp3, dirpath, filenametype)
-            audiolength.append(get_audio_length(mp3))
-        return audiolength
+        tracks = []
+        for folder, files in self.folder_files():
+            # Convert folder number to two-digit directory name (max. 99)
+            dirname = Path(proper_dirname(folder))
+
+            # create destination directory if not present, delete all files in it
+            with stats.phase("clean"):
+                destination.run(self._clean_directory, dirname)
+
+            # Iterate through all files of the folder, numbered from 1 in each folder
+            for idx, mp3 in enumerate(files):
+                with stats.phase("metadata"):
+                    info = cache.get(mp3)
+                filename = get_destination_filename(idx, mp3, filenametype, info.tags)
+                with stats.phase("copy"):
+                    logging.debug("Copying %s to %s", mp3, dirname / filename)
+                    plan = plan_copy(mp3, strip_tags, info.tags, self.gain)
+                    destination.copy(mp3, dirname / filename, advance, plan)
+                stats.bytes_copied += plan.size
+                stats.bytes_saved += info.size - plan.size
+                tracks.append(
+                    TocTrack(
+                        file=self.track_filename(folder, filename),
+                        artist=info.artist,
+                        title=info.title,
+                        duration=info.duration,
+                    )
+                )
+
+        if strip_tags:
+            logging.info(
+                "Saved %.1f MB by stripping artwork and tags", stats.bytes_saved / MEGABYTE
+            )
+        return tracks
+
+    @staticmethod
+    def _clean_directory(destination: Destination, dirname: Path) -> None:
+        """Create the directory of the card in a destination, and delete all files in it."""
+        dirpath = destination.path / dirname
+        dirpath.mkdir(parents=True, exist_ok=True)
+        for dirfile in get_files_in_directory(dirpath):
+            logging.debug("Delete %s from destination", dirfile)
+            dirfile.unlink(missing_ok=True)
+        destination.manifest.remove_directory(dirname)
 
     def create_card_bytecode(  # noqa: PLR0913
         self,
@@ -166,3 +278,40 @@ class Card:  # pylint: disable=too-many-instance-attributes
             f"{cookie}{decimal_to_hex(version)}{decimal_to_hex(directory)}"
             f"{mode_hex}{decimal_to_hex(extra1)}{decimal_to_hex(extra2)}"
         )
+
+    def folder_bytecodes(self, cookie: str, version: int) -> list[tuple[int, str]]:
+        """
+        Create the bytecodes of the card, one per folder it plays, with the 1-based index of the
+        folder. Song numbers of the single and from-to modes, counted across all files of the
+        card, are translated to the folders that hold the songs.
+        """
+        parts = self.folder_files()
+        if len(parts) == 1:
+            return [
+                (
+                    1,
+                    self.create_card_bytecode(
+                        cookie, version, parts[0][0], self.mode, self.extra1, self.extra2
+                    ),
+                )
+            ]
+
+        bytecodes = []
+        offset = 0
+        for idx, (folder, files) in enumerate(parts, start=1):
+            first, last = offset + 1, offset + len(files)
+            offset = last
+            extra1, extra2 = self.extra1, self.extra2
+            if self.mode == "single":
+                if not first <= self.extra1 <= last:
+                    continue
+                extra1 = self.extra1 - first + 1
+            elif self.mode in ("play-from-to", "album-from-to", "party-from-to"):
+                if self.extra2 < first or self.extra1 > last:
+                    continue
+                extra1 = max(self.extra1, first) - first + 1
+                extra2 = min(self.extra2, last) - first + 1
+            bytecodes.append(
+                (idx, self.create_card_bytecode(cookie, version, folder, self.mode, extra1, extra2))
+            )
+        return bytecodes
@@ -0,0 +1,436 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Catalog of the audio files in a music library, to find sources without listing directories."""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+
+from ._helpers import AUDIO_EXTENSIONS, file_checksum
+from ._metadata import MetadataCache, TrackInfo, default_cache_dir
+
+# Increase whenever the layout of the tables or the meaning of a column changes. Catalogs with a
+# different version are discarded and have to be scanned again
+CATALOG_VERSION = 2
+# Rows read from or written to the database at once
+BATCH_SIZE = 1000
+# Reads of files that may wait for their results per thread while scanning
+PENDING_PER_THREAD = 4
+
+
+@dataclass
+class ScanResult:
+    """Number of files found by a scan, by what happened to them."""
+
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    failed: int = 0
+
+
+def default_catalog_path() -> Path:
+    """Get the path of the catalog used by default."""
+    return default_cache_dir() / "catalog.sqlite"
+
+
+def _segment_regex(segment: str) -> str:
+    """Translate a single path segment of a glob pattern to a regular expression."""
+    regex = ""
+    pos = 0
+    while pos < len(segment):
+        char = segment[pos]
+        end = segment.find("]", pos + 2)
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[" and end != -1:
+            content = segment[pos + 1 : end].replace("\\", "\\\\")
+            regex += f"[{'^' + content[1:] if content.startswith('!') else content}]"
+            pos = end
+        else:
+            regex += re.escape(char)
+        pos += 1
+    return regex
+
+
+def glob_regex(pattern: str) -> re.Pattern[str]:
+    """
+    Translate a glob pattern, as understood by Path.glob(), to a regular expression matching
+    relative paths followed by a slash, or an empty string for the root. `**` matches any number
+    of directories.
+    """
+    regex = ""
+    for segment in PurePosixPath(pattern).parts:
+        regex += "(?:[^/]+/)*" if segment == "**" else _segment_regex(segment) + "/"
+    return re.compile(regex)
+
+
+def _walk(root: Path) -> Iterator[tuple[Path, int, dict[str, os.stat_result]]]:
+    """
+    Yield all directories below `root` one after the other, with their modification time and the
+    audio files in them with their stat. Symlinked directories are not followed.
+    """
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        # Taken before listing, so changes during the scan make the directory appear changed
+        mtime_ns = directory.stat().st_mtime_ns
+        files: dict[str, os.stat_result] = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(Path(entry.path))
+                elif Path(entry.name).suffix in AUDIO_EXTENSIONS and entry.is_file():
+                    files[entry.path] = entry.stat()
+        yield directory, mtime_ns, files
+
+
+class Catalog:
+    """
+    Index of the audio files below scanned directories and their metadata, stored in a SQLite
+    database. The files of a directory are taken from the catalog as long as the modification
+    time of the directory is unchanged, i.e. no files have been added, removed or renamed in it.
+    Without a path, the catalog only lives in memory.
+    """
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = path
+        if path is None:
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # Scans share a temporary table, so they run one after the other
+        self._scan_lock = threading.Lock()
+        self._setup()
+
+    def _setup(self) -> None:
+        """Create the tables, discarding catalogs of an incompatible version."""
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version != CATALOG_VERSION:
+            if version:
+                logging.info("Catalog has an outdated format. Scan your library again")
+            self._db.execute("DROP TABLE IF EXISTS files")
+            self._db.execute("DROP TABLE IF EXISTS directories")
+            self._db.execute("DROP TABLE IF EXISTS queries")
+            self._db.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, directory TEXT, name TEXT, size INTEGER, mtime_ns INTEGER, "
+            "duration INTEGER, artist TEXT, album TEXT, title TEXT, sha256 TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_directory ON files (directory)")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS files_artist ON files (artist COLLATE NOCASE, album)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_album ON files (album COLLATE NOCASE)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime_ns INTEGER)"
+        )
+        # Results of source queries, until the files change
+        self._db.execute("CREATE TABLE IF NOT EXISTS queries (query TEXT PRIMARY KEY, paths TEXT)")
+        self._db.commit()
+
+    def _iter_below(self, table: str, root: Path, columns: str = "*") -> Iterator[tuple]:
+        """
+        Yield the rows of a table for `root` and everything below it, fetched in batches so they
+        are never all in memory. The database is only locked while fetching a batch, so it can
+        be used while the rows are consumed.
+        """
+        column = "directory" if table == "files" else "path"
+        prefix = os.path.join(root, "")  # noqa: PTH118
+        last = ""
+        while True:
+            # Continue after the last path, as other calls may change the table meanwhile
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT path, {columns} FROM {table} "  # noqa: S608
+                    f"WHERE ({column} = ? OR substr({column}, 1, ?) = ?) AND path > ? "
+                    "ORDER BY path LIMIT ?",
+                    (str(root), len(prefix), prefix, last, BATCH_SIZE),
+                ).fetchall()
+            for row in rows:
+                yield row[1:]
+            if len(rows) < BATCH_SIZE:
+                return
+            last = rows[-1][0]
+
+    def _scanned(self, directory: Path) -> int | None:
+        """Get the modification time of a directory at its last scan, None if never scanned."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT mtime_ns FROM directories WHERE path = ?", (str(directory),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _known(self, directory: Path) -> dict[str, tuple[int, int]]:
+        """Get the size and modification time of the files of a directory, by their paths."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, size, mtime_ns FROM files WHERE directory = ?", (str(directory),)
+            ).fetchall()
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    @staticmethod
+    def _read(file: Path, cache: MetadataCache) -> tuple:
+        """Read the metadata and checksum of a file, as a row of the catalog."""
+        info = cache.get(file)
+        return (
+            str(file),
+            str(file.parent),
+            file.name,
+            info.size,
+            info.mtime_ns,
+            info.duration,
+            info.artist,
+            info.album,
+            info.title,
+            file_checksum(file),
+        )
+
+    @staticmethod
+    def _collect(
+        read: tuple[Path, bool, Future[tuple]], rows: list[tuple], result: ScanResult
+    ) -> None:
+        """Wait for the read of a file, and add its row to `rows`."""
+        file, known, future = read
+        try:
+            rows.append(future.result())
+        except OSError as exc:
+            logging.warning("Could not read %s: %s", file, exc)
+            result.failed += 1
+            return
+        if known:
+            result.updated += 1
+        else:
+            result.added += 1
+
+    def _write(self, rows: list[tuple]) -> None:
+        """Write rows of files, and forget them."""
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?,?)", rows)
+        rows.clear()
+
+    def _remove_unseen(self, root: Path) -> int:
+        """
+        Remove the directories below `root` that have not been seen by the current scan, and the
+        files in them. Store the modification times of the directories seen. Return the number
+        of files removed.
+        """
+        prefix = os.path.join(root, "")  # noqa: PTH118
+        params = (str(root), len(prefix), prefix)
+        below = (
+            "(directory = ? OR substr(directory, 1, ?) = ?) "
+            "AND directory NOT IN (SELECT path FROM seen)"
+        )
+        with self._lock:
+            (removed,) = self._db.execute(
+                f"SELECT COUNT(*) FROM files WHERE {below}",  # noqa: S608
+                params,
+            ).fetchone()
+            self._db.execute(f"DELETE FROM files WHERE {below}", params)  # noqa: S608
+            self._db.execute(
+                "DELETE FROM directories WHERE (path = ? OR substr(path, 1, ?) = ?) "
+                "AND path NOT IN (SELECT path FROM seen)",
+                params,
+            )
+            self._db.execute("INSERT OR REPLACE INTO directories SELECT path, mtime_ns FROM seen")
+            self._db.execute("DELETE FROM seen")
+        return removed
+
+    def scan(
+        self, root: str | Path, cache: MetadataCache | None = None, jobs: int | None = None
+    ) -> ScanResult:
+        """
+        Add the audio files below `root` to the catalog, reading only new and changed files, in
+        `jobs` threads. Files that disappeared are removed. The metadata read is stored in
+        `cache` as well, so it does not have to be read again when syncing. The library is
+        walked one directory at a time, with a limited number of pending reads, so the memory
+        used does not grow with the size of the library.
+        """
+        if cache is None:
+            cache = MetadataCache()
+        root = Path(root).resolve()
+        result = ScanResult()
+        threads = jobs or min(32, (os.cpu_count() or 1) + 4)
+        pending: deque[tuple[Path, bool, Future[tuple]]] = deque()
+        rows: list[tuple] = []
+
+        with self._scan_lock, ThreadPoolExecutor(max_workers=threads) as pool:
+            with self._lock:
+                self._db.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS seen (path TEXT PRIMARY KEY, mtime_ns INTEGER)"
+                )
+                # Left over if an earlier scan failed
+                self._db.execute("DELETE FROM seen")
+            for directory, mtime_ns, files in _walk(root):
+                known = self._known(directory)
+                for path, stat in files.items():
+                    if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                        result.unchanged += 1
+                        continue
+                    pending.append(
+                        (Path(path), path in known, pool.submit(self._read, Path(path), cache))
+                    )
+                    while len(pending) > PENDING_PER_THREAD * threads:
+                        self._collect(pending.popleft(), rows, result)
+                removed = [(path,) for path in known if path not in files]
+                result.removed += len(removed)
+                with self._lock:
+                    self._db.executemany("DELETE FROM files WHERE path = ?", removed)
+                    self._db.execute("INSERT INTO seen VALUES (?, ?)", (str(directory), mtime_ns))
+                if len(rows) >= BATCH_SIZE:
+                    self._write(rows)
+            while pending:
+                self._collect(pending.popleft(), rows, result)
+            self._write(rows)
+
+            result.removed += self._remove_unseen(root)
+            with self._lock:
+                if result.added or result.updated or result.removed:
+                    self._db.execute("DELETE FROM queries")
+                self._db.commit()
+        cache.commit()
+        logging.info(
+            "Found %s audio files in %s, %s of them read",
+            result.added + result.updated + result.unchanged + result.failed,
+            root,
+            result.added + result.updated + result.failed,
+        )
+        return result
+
+    def files_in_directory(self, directory: Path) -> list[Path] | None:
+        """
+        Get the audio files in a directory, sorted, like get_files_in_directory(). Returns None if
+        the directory has not been scanned or changed since.
+        """
+        try:
+            key, mtime_ns = str(directory.resolve()), directory.stat().st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT mtime_ns FROM directories WHERE path = ?", (key,)
+            ).fetchone()
+            if row is None or row[0] != mtime_ns:
+                return None
+            names = self._db.execute("SELECT name FROM files WHERE directory = ?", (key,))
+            return sorted(directory / name for (name,) in names)
+
+    def find(
+        self,
+        artist: str | None = None,
+        album: str | None = None,
+        title: str | None = None,
+        root: Path | None = None,
+    ) -> list[TrackInfo]:
+        """Find files, below `root` if given, by their tags ignoring the case, sorted by path."""
+        conditions = {"artist": artist, "album": album, "title": title}
+        where = [f"{tag} = ? COLLATE NOCASE" for tag, value in conditions.items() if value]
+        params: list[str | int] = [value for value in conditions.values() if value]
+        if root is not None:
+            prefix = os.path.join(root, "")  # noqa: PTH118
+            where.append("(directory = ? OR substr(directory, 1, ?) = ?)")
+            params += [str(root), len(prefix), prefix]
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, size, mtime_ns, duration, artist, title, album FROM files "  # noqa: S608
+                f"WHERE {' AND '.join(where) or 'TRUE'}",
+                params,
+            ).fetchall()
+        return [TrackInfo(*row) for row in sorted(rows, key=lambda row: Path(row[0]))]
+
+    def _is_current(self, root: Path) -> bool:
+        """Whether `root` and all directories below it are unchanged since they were scanned."""
+        if self._scanned(root) is None:
+            return False
+        with closing(self._iter_below("directories", root, "path, mtime_ns")) as scanned:
+            try:
+                return all(Path(path).stat().st_mtime_ns == mtime_ns for path, mtime_ns in scanned)
+            except OSError:
+                return False
+
+    def _cached(self, query: list, resolve: Callable[[], list[Path]]) -> list[Path]:
+        """Get the result of a query from the cache, or resolve and store it."""
+        key = json.dumps(query)
+        with self._lock:
+            row = self._db.execute("SELECT paths FROM queries WHERE query = ?", (key,)).fetchone()
+        if row is not None:
+            return [Path(path) for path in json.loads(row[0])]
+        paths = resolve()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO queries VALUES (?, ?)",
+                (key, json.dumps([str(path) for path in paths])),
+            )
+            self._db.commit()
+        return paths
+
+    def glob(self, root: Path, pattern: str) -> list[Path] | None:
+        """
+        Get the audio files below `root` matching a glob pattern like glob_files(), sorted.
+        Returns None if `root` has not been scanned or changed since.
+        """
+        if not self._is_current(root):
+            return None
+
+        def resolve() -> list[Path]:
+            regex = glob_regex(pattern)
+            files = []
+            for (path,) in self._iter_below("files", root, "path"):
+                relative = Path(path).relative_to(root).as_posix()
+                parent = relative.rpartition("/")[0]
+                # Files in matching directories are taken as well
+                if regex.fullmatch(f"{relative}/") or regex.fullmatch(
+                    f"{parent}/" if parent else ""
+                ):
+                    files.append(Path(path))
+            return sorted(files)
+
+        return self._cached(["glob", str(root), pattern], resolve)
+
+    def query(self, root: Path, tags: dict[str, str]) -> list[Path] | None:
+        """
+        Get the audio files below `root` with the given tags, ignoring the case, sorted. Returns
+        None if `root` has not been scanned. The result is as of the last scan.
+        """
+        if self._scanned(root) is None:
+            return None
+        if not self._is_current(root):
+            logging.warning(
+                "%s changed since it has been scanned. Run the scan command to update the catalog",
+                root,
+            )
+        return self._cached(
+            ["tags", str(root), tags],
+            lambda: [Path(track.path) for track in self.find(**tags, root=root)],
+        )
+
+    def albums(self, artist: str) -> list[str]:
+        """Get all albums of an artist, ignoring the case, sorted."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT album FROM files WHERE artist = ? COLLATE NOCASE AND album != '' "
+                "ORDER BY album",
+                (artist,),
+            ).fetchall()
+        return [album for (album,) in rows]
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._db.close()
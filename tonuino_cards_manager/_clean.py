@@ -16,7 +16,11 @@ def clean_unconfigured_dirs(destination: str, cards: dict[int, Card]) -> None:
     """Delete directories that are not configured as cards."""
     dest = Path(destination)
     # Calculate which directories are handled by the configuration
-    handled_dirs = [proper_dirname(card) for card in cards]
+    handled_dirs = [
+        proper_dirname(folder)
+        for cardno, card in cards.items()
+        for folder in card.folders or [cardno]
+    ]
     # For each existing directory on the SD card, check whether it is concerned
     # by the configuration
     for dirpath in get_directories_in_directory(dest):
@@ -4,14 +4,27 @@
 
 """Dataclass holding general configuration."""
 
+import copy
+import hashlib
+import json
 import logging
-import sys
-from dataclasses import dataclass, field
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
 
 import yaml
 
+from . import __version__
 from ._card import Card
-from ._helpers import validate_config_schema
+from ._helpers import ConfigError, atomic_write, validate_config_schema
+from ._order import TRACK_ORDERS
+from ._sources import QUERY_TAGS
+from ._toc import TOC_FORMATS
+
+# The loader of libyaml is many times faster, but PyYAML may be built without it
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+# Increase if the stored form of parsed configurations changes
+PARSED_CONFIG_VERSION = 2
 
 CONFIG_SCHEMA = {
     "type": "object",
@@ -25,20 +38,50 @@ CONFIG_SCHEMA = {
             "enum": ["mp3tags", "tracknumber"],
         },
         "create_tableofcontents": {"type": "boolean"},
+        "tableofcontents_formats": {
+            "type": "array",
+            "items": {"type": "string", "enum": list(TOC_FORMATS)},
+            "minItems": 1,
+        },
+        "tableofcontents_detailed": {"type": "boolean"},
+        "strip_tags": {"type": "boolean"},
+        "normalize_loudness": {"type": "boolean"},
+        "check_integrity": {"type": "boolean"},
+        "loudness_target": {"type": "number", "minimum": -40, "maximum": 0},
+        "track_order": {"type": "string", "enum": list(TRACK_ORDERS)},
         "cards": {"type": "object", "minproperties": 1},
     },
     "required": ["cards"],
     "additionalProperties": False,
 }
 
+# A source is a path, a glob pattern, or a query for tags of files in the catalog
+SOURCE_SCHEMA = {
+    "oneOf": [
+        {"type": "string", "minLength": 1},
+        {
+            "type": "object",
+            "properties": {"glob": {"type": "string", "minLength": 1}},
+            "required": ["glob"],
+            "additionalProperties": False,
+        },
+        {
+            "type": "object",
+            "properties": {tag: {"type": "string", "minLength": 1} for tag in QUERY_TAGS},
+            "minProperties": 1,
+            "additionalProperties": False,
+        },
+    ],
+}
+
 CARD_SCHEMA = {
     "type": "object",
     "properties": {
         "description": {"type": "string"},
         "source": {
             "oneOf": [
-                {"type": "string", "minLength": 1},
-                {"type": "array", "items": {"type": "string", "minLength": 1}},
+                SOURCE_SCHEMA,
+                {"type": "array", "items": SOURCE_SCHEMA},
             ],
         },
         "mode": {
@@ -58,6 +101,13 @@ CARD_SCHEMA = {
         },
         "from_song": {"type": "integer", "minimum": 1},
         "to_song": {"type": "integer", "minimum": 1},
+        "order": {"type": "string", "enum": list(TRACK_ORDERS)},
+        "split": {
+            "oneOf": [
+                {"type": "integer", "minimum": 1},
+                {"type": "string", "enum": ["chapters"]},
+            ],
+        },
     },
     "required": ["source"],
     "additionalProperties": False,
@@ -74,6 +124,13 @@ class Config:
     maxcardsperqrcode: int = 4
     filenametype: str = "mp3tags"
     create_tableofcontents: bool = True
+    tableofcontents_formats: list[str] = field(default_factory=lambda: ["pdf"])
+    tableofcontents_detailed: bool = False
+    strip_tags: bool = False
+    normalize_loudness: bool = False
+    check_integrity: bool = True
+    loudness_target: float = -18.0
+    track_order: str = "path"
     cards: dict[int, Card] = field(default_factory=dict)
 
     def _import_and_check_cards(self, cards: dict[str | int, dict]) -> None:
@@ -88,12 +145,13 @@ class Config:
                 pass
             else:
                 logging.critical("Card identifiers must be numeric. Found '%s' instead", key)
-                sys.exit(1)
+                msg = f"Card identifier '{key}' is not numeric"
+                raise ConfigError(msg)
 
         # Import card data, add to dict with int identifier and card config DC
         for cardno, carddata in cards.items():
             validate_config_schema(carddata, CARD_SCHEMA)
-            carddc = Card()
+            carddc = Card(order=self.track_order)
             # Here, the cards are validated against the CARD_SCHEMA in _card.py
             carddc.import_dict_to_card(carddata)
             self.cards[int(cardno)] = carddc
@@ -108,7 +166,8 @@ class Config:
                 "or you used the same card identifier multiple times",
                 cardamount,
             )
-            sys.exit(1)
+            msg = "Cards are not numbered consecutively"
+            raise ConfigError(msg)
 
         # Check if more than 99 cards
         if len(self.cards) > 99:  # noqa: PLR2004
@@ -139,7 +198,7 @@ class Config:
 def _read_config_file(file: str) -> dict:
     """Read config file and detect if cards are defined."""
     with open(file, encoding="UTF-8") as yamlfile:
-        return yaml.safe_load(yamlfile)
+        return yaml.load(yamlfile, Loader=YAML_LOADER)  # noqa: S506
 
 
 def _load_config_dict(data: dict) -> Config:
@@ -155,3 +214,124 @@ def get_config(file: str) -> Config:
     """Read config and return Config object."""
     data = _read_config_file(file)
     return _load_config_dict(data)
+
+
+def _parsed_config_key(content: bytes) -> str:
+    """The key of a parsed config, changing with the file content and the version of this tool."""
+    digest = hashlib.sha256(f"{PARSED_CONFIG_VERSION}:{__version__}:".encode())
+    digest.update(content)
+    return digest.hexdigest()
+
+
+def _config_from_dict(data: dict) -> Config:
+    """Create a Config object from a parsed config as stored, without validating it again."""
+    cards = data.pop("cards")
+    config = Config(**data)
+    for cardno, carddata in cards.items():
+        card = Card(**carddata)
+        card.sourcefiles = [Path(file) for file in card.sourcefiles]
+        config.cards[int(cardno)] = card
+    return config
+
+
+class _WarningRecorder(logging.Handler):
+    """Record the warnings logged by the current thread, to repeat them if a config is reused."""
+
+    def __init__(self) -> None:
+        super().__init__(logging.WARNING)
+        self.thread = threading.get_ident()
+        self.warnings: list[tuple[int, str]] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.thread == self.thread:
+            self.warnings.append((record.levelno, record.getMessage()))
+
+
+def _parse_config(content: bytes) -> tuple[Config, list[tuple[int, str]]]:
+    """Parse and validate a config, and return it with the warnings logged meanwhile."""
+    recorder = _WarningRecorder()
+    logging.getLogger().addHandler(recorder)
+    try:
+        config = _load_config_dict(yaml.load(content, Loader=YAML_LOADER))  # noqa: S506
+    finally:
+        logging.getLogger().removeHandler(recorder)
+    return config, recorder.warnings
+
+
+def load_parsed_config(file: str | Path, directory: Path | None) -> Config:
+    """
+    Read a config file, and store the validated config in `directory`, so unchanged files do
+    not have to be parsed and validated again on the next run. The warnings of the validation
+    are stored with it and logged again. Stored configs of older versions of the file, and
+    those in another format, are removed. Without a directory, the file is parsed every time.
+    """
+    content = Path(file).read_bytes()
+    if directory is None:
+        return _load_config_dict(yaml.load(content, Loader=YAML_LOADER))  # noqa: S506
+
+    # Stored configs are named by their format, the config file, and its content
+    version = f"v{PARSED_CONFIG_VERSION}-"
+    prefix = version + hashlib.sha256(str(Path(file).resolve()).encode()).hexdigest()[:16]
+    parsed = directory / f"{prefix}-{_parsed_config_key(content)}.json"
+    try:
+        with open(parsed, encoding="UTF-8") as jsonfile:
+            data = json.load(jsonfile)
+        config = _config_from_dict(data["config"])
+        warnings = [(int(level), str(msg)) for level, msg in data["warnings"]]
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, TypeError, AttributeError, KeyError) as exc:
+        logging.debug("Ignoring the parsed config %s: %s", parsed, exc)
+    else:
+        logging.debug("Using the parsed config %s for %s", parsed, file)
+        for level, msg in warnings:
+            logging.log(level, "%s", msg)
+        return config
+
+    config, warnings = _parse_config(content)
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        with atomic_write(parsed) as jsonfile:
+            json.dump(
+                {"warnings": warnings, "config": asdict(config)},
+                jsonfile,
+                separators=(",", ":"),
+                default=str,
+            )
+        # Remove older versions of the file, and configs stored in another format
+        for superseded in directory.glob("*.json"):
+            if superseded != parsed and (
+                superseded.name.startswith(prefix) or not superseded.name.startswith(version)
+            ):
+                logging.debug("Removing the superseded parsed config %s", superseded)
+                superseded.unlink(missing_ok=True)
+    except OSError as exc:
+        logging.debug("Could not store the parsed config %s: %s", parsed, exc)
+    return config
+
+
+class ConfigCache:
+    """
+    Parsed configurations by file, which are only read again if the file changes. Copies are
+    returned, as a configuration is changed while syncing it. With a directory, the parsed
+    configurations are also stored there, to be reused by later runs.
+    """
+
+    def __init__(self, directory: Path | None = None) -> None:
+        self.directory = directory
+        self._configs: dict[str, tuple[int, int, Config]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, file: str | Path) -> Config:
+        """Get the configuration of a file."""
+        key = str(Path(file).resolve())
+        stat = Path(file).stat()
+        with self._lock:
+            entry = self._configs.get(key)
+        if entry is None or entry[:2] != (stat.st_size, stat.st_mtime_ns):
+            logging.debug("Reading configuration %s", file)
+            config = load_parsed_config(file, self.directory)
+            entry = (stat.st_size, stat.st_mtime_ns, config)
+            with self._lock:
+                self._configs[key] = entry
+        return copy.deepcopy(entry[2])
@@ -0,0 +1,113 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Extraction of cover images of cards from their audio files or source directories."""
+
+import base64
+import binascii
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from mutagen import File as MutagenFile
+from mutagen import MutagenError
+from mutagen.flac import Picture
+from mutagen.id3 import ID3
+
+from ._card import Card
+from ._catalog import Catalog
+from ._config import Config
+
+COVER_FILENAMES = (
+    "cover.jpg",
+    "cover.jpeg",
+    "cover.png",
+    "folder.jpg",
+    "folder.jpeg",
+    "folder.png",
+)
+MIME_EXTENSIONS = {"image/jpeg": ".jpg", "image/jpg": ".jpg", "image/png": ".png"}
+# Picture type of the front cover in ID3 and Vorbis comments
+FRONT_COVER = 3
+COVERS_INDEX = "covers.json"
+
+
+def embedded_picture(audiofile: Path) -> tuple[bytes, str] | None:
+    """
+    Get the embedded picture of an audio file, preferring the front cover, as image data and
+    file extension. Supports ID3 (MP3) and Vorbis comments (Opus, Ogg Vorbis).
+    """
+    try:
+        audio = MutagenFile(audiofile)
+    except (MutagenError, OSError) as exc:
+        logging.debug("Could not read audio file %s: %s", audiofile, exc)
+        return None
+    if audio is None or audio.tags is None:
+        return None
+
+    pictures: list[tuple[int, str, bytes]] = []
+    if isinstance(audio.tags, ID3):
+        pictures = [(apic.type, apic.mime, apic.data) for apic in audio.tags.getall("APIC")]
+    else:
+        for value in audio.tags.get("metadata_block_picture", []):
+            try:
+                picture = Picture(base64.b64decode(value))
+            except (binascii.Error, MutagenError) as exc:
+                logging.debug("Invalid picture in %s: %s", audiofile, exc)
+                continue
+            pictures.append((picture.type, picture.mime, picture.data))
+
+    # Front covers first, otherwise keep the order of the file
+    for _, mime, data in sorted(pictures, key=lambda p: p[0] != FRONT_COVER):
+        if extension := MIME_EXTENSIONS.get(mime.lower()):
+            return data, extension
+    return None
+
+
+def card_cover(card: Card) -> tuple[bytes, str] | None:
+    """
+    Find the cover of a card: the first picture embedded in its files, or a cover or folder
+    image in the directory of its files.
+    """
+    for sourcefile in card.sourcefiles:
+        if picture := embedded_picture(sourcefile):
+            return picture
+
+    for directory in dict.fromkeys(f.parent for f in card.sourcefiles):
+        for name in COVER_FILENAMES:
+            if (path := directory / name).is_file():
+                return path.read_bytes(), ".png" if path.suffix == ".png" else ".jpg"
+    return None
+
+
+def extract_covers(
+    config: Config, covers_dir: Path, catalog: Catalog | None = None
+) -> dict[int, Path]:
+    """
+    Store the cover of each card in `covers_dir`, named by its hash so cards with the same cover
+    share one file. An index of which card uses which file is written as well. Return the cover
+    file of each card that has one. Sources are resolved with `catalog` if given.
+    """
+    covers_dir.mkdir(parents=True, exist_ok=True)
+    covers: dict[int, Path] = {}
+    for cardno, card in config.cards.items():
+        if not card.sourcefiles:
+            card.parse_sources(config.sourcebasedir, catalog)
+        if (cover := card_cover(card)) is None:
+            logging.warning("No cover found for card %s", cardno)
+            continue
+
+        data, extension = cover
+        path = covers_dir / f"cover-{hashlib.sha256(data).hexdigest()[:16]}{extension}"
+        if not path.exists():
+            path.write_bytes(data)
+            logging.info("Extracted cover of card %s to %s", cardno, path)
+        else:
+            logging.info("Card %s has the same cover as another card: %s", cardno, path)
+        covers[cardno] = path
+
+    with open(covers_dir / COVERS_INDEX, "w", encoding="UTF-8") as indexfile:
+        json.dump({str(no): path.name for no, path in covers.items()}, indexfile, indent=2)
+    return covers
@@ -0,0 +1,169 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Writing the same content to one or multiple destinations, e.g. several SD cards at once."""
+
+import contextlib
+import hashlib
+import logging
+import shutil
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO
+
+from ._helpers import COPY_CHUNK_SIZE, _copy_file, verify_copy
+from ._manifest import Manifest
+from ._strip import CopyPlan, plan_copy
+
+
+def _call(func: Callable[..., object], dest: "Destination", *args: object) -> OSError | None:
+    """Call `func(dest, *args)`, and return the OSError it raised, if any."""
+    try:
+        func(dest, *args)
+    except OSError as exc:
+        return exc
+    return None
+
+
+@dataclass
+class Destination:
+    """A destination directory, e.g. the mount point of an SD card, and its state in a run."""
+
+    path: Path
+    bytes_written: int = 0
+    error: OSError | None = None
+    manifest: Manifest = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.manifest = Manifest.load(self.path)
+
+    @property
+    def name(self) -> str:
+        """Short name of the destination for status output."""
+        return self.path.name or str(self.path)
+
+
+class Destinations:
+    """
+    The destinations of a run. Each source file is read once and written to all destinations
+    concurrently, one thread per destination. A destination that fails is skipped for the rest
+    of the run, so one bad SD card does not abort the others. With a single destination, errors
+    are raised right away. Copies are verified according to `verify`, see `verify_copy`, and
+    recorded in the manifest of each destination.
+    """
+
+    def __init__(self, paths: Iterable[str | Path], verify: str = "none") -> None:
+        self.all = [Destination(Path(path)) for path in paths]
+        self.verify = verify
+        self._pool = (
+            ThreadPoolExecutor(max_workers=len(self.all), thread_name_prefix="destination")
+            if len(self.all) > 1
+            else None
+        )
+
+    @property
+    def active(self) -> list[Destination]:
+        """Destinations that have not failed."""
+        return [dest for dest in self.all if dest.error is None]
+
+    @property
+    def failed(self) -> list[Destination]:
+        """Destinations that have failed."""
+        return [dest for dest in self.all if dest.error is not None]
+
+    def run(self, func: Callable[..., object], *args: object) -> None:
+        """
+        Call `func(destination, *args)` for all active destinations concurrently. Destinations
+        raising an OSError are marked as failed. If none is left, the last error is raised.
+        """
+        if self._pool is None:
+            for dest in self.active:
+                func(dest, *args)
+            return
+
+        futures = [(dest, self._pool.submit(_call, func, dest, *args)) for dest in self.active]
+        for dest, future in futures:
+            if (exc := future.result()) is not None:
+                logging.error(
+                    "Writing to %s failed, skipping it for the rest of the run: %s", dest.path, exc
+                )
+                dest.error = exc
+        if not self.active:
+            raise self.all[-1].error  # type: ignore[misc]
+
+    def copy(
+        self,
+        source: Path,
+        relpath: Path,
+        advance: Callable[[int], None] | None = None,
+        plan: CopyPlan | None = None,
+    ) -> None:
+        """
+        Copy a file, or only the parts given by `plan`, to `relpath` in all active destinations.
+        `advance` is called with the number of bytes copied.
+        """
+        if plan is None:
+            plan = plan_copy(source)
+        if self._pool is None:
+            dest = self.all[0]
+            checksum = _copy_file(source, dest.path / relpath, advance, self.verify, plan)
+            dest.bytes_written += plan.size
+            dest.manifest.add(relpath, checksum)
+        else:
+            self._copy_concurrently(source, relpath, advance, plan)
+
+    def _copy_concurrently(
+        self,
+        source: Path,
+        relpath: Path,
+        advance: Callable[[int], None] | None,
+        plan: CopyPlan,
+    ) -> None:
+        """Read a file once, and write each chunk to all active destinations concurrently."""
+        handles: dict[int, BinaryIO] = {}
+        digest = hashlib.sha256() if self.verify != "none" else None
+
+        def open_file(dest: Destination) -> None:
+            handles[id(dest)] = open(dest.path / relpath, "wb")  # noqa: SIM115
+
+        def write(dest: Destination, chunk: bytes) -> None:
+            handles[id(dest)].write(chunk)
+            dest.bytes_written += len(chunk)
+
+        def finish(dest: Destination, checksum: str | None) -> None:
+            handles.pop(id(dest)).close()
+            shutil.copystat(source, dest.path / relpath)
+            if checksum is not None:
+                verify_copy(source, dest.path / relpath, checksum, self.verify, plan.size)
+            dest.manifest.add(relpath, checksum)
+
+        try:
+            self.run(open_file)
+            with open(source, "rb") as src:
+                for chunk in plan.chunks(src, COPY_CHUNK_SIZE):
+                    if digest is not None:
+                        digest.update(chunk)
+                    self.run(write, chunk)
+                    if advance is not None:
+                        advance(len(chunk))
+            # Account for the parts of the source that have been left out
+            if advance is not None and plan.size != (size := source.stat().st_size):
+                advance(size - plan.size)
+            self.run(finish, digest.hexdigest() if digest is not None else None)
+        finally:
+            # Handles of destinations that failed in between
+            for handle in handles.values():
+                with contextlib.suppress(OSError):
+                    handle.close()
+
+    def save_manifests(self) -> None:
+        """Write the manifests of all active destinations."""
+        self.run(lambda dest: dest.manifest.save())
+
+    def close(self) -> None:
+        """Stop the threads writing to the destinations."""
+        if self._pool is not None:
+            self._pool.shutdown()
@@ -0,0 +1,435 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""
+Build a FAT32 image of a directory tree, e.g. a local copy of the SD card, so it can be written
+to the SD card in one sequential stream.
+"""
+
+import logging
+import math
+import re
+import shutil
+import struct
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+
+SECTOR_SIZE = 512
+RESERVED_SECTORS = 32
+NUM_FATS = 2
+# The partition starts at 1 MiB, which is the usual alignment for SD cards
+PARTITION_START = 2048
+MIN_CLUSTERS = 65525
+MAX_CLUSTERS = 0x0FFFFFF5
+DIRENTRY_SIZE = 32
+FAT_EOC = 0x0FFFFFFF
+ATTR_VOLUME_ID = 0x08
+ATTR_DIRECTORY = 0x10
+ATTR_ARCHIVE = 0x20
+ATTR_LFN = 0x0F
+LFN_CHARS = 13
+# Directories get a fixed timestamp so images of the same content are identical
+DIRECTORY_TIMESTAMP = time.mktime((2000, 1, 1, 0, 0, 0, 0, 1, -1))
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+@dataclass
+class FatNode:
+    """A file or directory in the image."""
+
+    name: str
+    source: Path
+    is_dir: bool
+    size: int = 0
+    mtime: float = DIRECTORY_TIMESTAMP
+    children: list["FatNode"] = field(default_factory=list)
+    shortname: bytes = b""
+    lfn: list[bytes] = field(default_factory=list)
+    cluster: int = 0
+    clusters: int = 0
+    parent_cluster: int = 0
+
+
+def parse_size(size: str) -> int:
+    """Parse a size like '512M' or '32G' to bytes."""
+    if not (match := re.fullmatch(r"\s*(\d+)\s*([KMGT]?)(?:I?B)?\s*", size.upper())):
+        msg = f"Invalid size '{size}'. Use a number with an optional K, M, G or T"
+        raise ValueError(msg)
+    return int(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+def _sectors_per_cluster(volume_bytes: int) -> int:
+    """Get the cluster size recommended by Microsoft for FAT32 volumes of this size."""
+    for limit, sectors in ((260 * 1024**2, 1), (8 * 1024**3, 8), (16 * 1024**3, 16)):
+        if volume_bytes <= limit:
+            return sectors
+    if volume_bytes <= 32 * 1024**3:
+        return 32
+    return 64
+
+
+def _shortname(name: str, is_dir: bool, taken: set[bytes]) -> tuple[bytes, bool]:
+    """
+    Create the unique 8.3 short name for a file name. Return it, and whether a long file name is
+    needed because the short name does not represent the name exactly.
+    """
+    stem, dot, ext = name.rpartition(".")
+    if not dot or is_dir or not stem:
+        stem, ext = name, ""
+
+    def clean(part: str) -> str:
+        part = part.upper().replace(" ", "").encode("ascii", "replace").decode()
+        return re.sub(r"[^A-Z0-9!#$%&'()@^_`{}~-]", "_", part)
+
+    base, extension = clean(stem), clean(ext)
+
+    # Names that only differ in case from a valid short name keep it, e.g. 01 or 001.MP3
+    if base == stem.upper() and extension == ext.upper() and len(base) <= 8 and len(ext) <= 3:  # noqa: PLR2004
+        shortname = f"{base:<8}{extension:<3}".encode("ascii")
+        if shortname not in taken:
+            taken.add(shortname)
+            return shortname, base != stem or extension != ext
+
+    # Numbered short name like 001-TE~1.MP3, keeping the beginning of the name intact
+    for counter in range(1, 1000000):
+        suffix = f"~{counter}"
+        shortname = f"{base[: 8 - len(suffix)] + suffix:<8}{extension[:3]:<3}".encode("ascii")
+        if shortname not in taken:
+            taken.add(shortname)
+            return shortname, True
+    msg = f"Too many similar file names for {name}"
+    raise ValueError(msg)
+
+
+def _lfn_checksum(shortname: bytes) -> int:
+    """Calculate the checksum of a short name, as stored in long file name entries."""
+    checksum = 0
+    for char in shortname:
+        checksum = (((checksum & 1) << 7) + (checksum >> 1) + char) & 0xFF
+    return checksum
+
+
+def _fat_datetime(timestamp: float) -> tuple[int, int]:
+    """Convert a timestamp to FAT date and time values."""
+    tm = time.localtime(max(timestamp, DIRECTORY_TIMESTAMP))
+    date = ((tm.tm_year - 1980) << 9) | (tm.tm_mon << 5) | tm.tm_mday
+    return date, (tm.tm_hour << 11) | (tm.tm_min << 5) | (tm.tm_sec // 2)
+
+
+def _direntry(shortname: bytes, attr: int, cluster: int, size: int, mtime: float) -> bytes:
+    """Create a short name directory entry."""
+    date, wtime = _fat_datetime(mtime)
+    return struct.pack(
+        "<11sBBBHHHHHHHI",
+        shortname,
+        attr,
+        0,
+        0,
+        wtime,
+        date,
+        date,
+        cluster >> 16,
+        wtime,
+        date,
+        cluster & 0xFFFF,
+        size,
+    )
+
+
+def _lfn_entries(name: str, shortname: bytes) -> list[bytes]:
+    """Create the long file name entries for a name, in the order they are stored on disk."""
+    encoded = name.encode("utf-16-le")
+    chars = [encoded[i : i + 2] for i in range(0, len(encoded), 2)]
+    count = math.ceil(len(chars) / LFN_CHARS)
+    # Terminate the name with 0x0000 if there is space, and pad with 0xFFFF
+    chars += [b"\x00\x00"] if len(chars) % LFN_CHARS else []
+    chars += [b"\xff\xff"] * (count * LFN_CHARS - len(chars))
+    checksum = _lfn_checksum(shortname)
+
+    entries = []
+    for seq in range(1, count + 1):
+        part = chars[(seq - 1) * LFN_CHARS : seq * LFN_CHARS]
+        order = seq | 0x40 if seq == count else seq
+        entries.append(
+            bytes([order])
+            + b"".join(part[0:5])
+            + bytes([ATTR_LFN, 0, checksum])
+            + b"".join(part[5:11])
+            + b"\x00\x00"
+            + b"".join(part[11:13])
+        )
+    entries.reverse()
+    return entries
+
+
+def _scan_tree(directory: Path) -> FatNode:
+    """Read a directory tree, sorted by name like the directories Tonuino expects."""
+    node = FatNode(name="", source=directory, is_dir=True)
+    for path in sorted(directory.iterdir()):
+        if path.is_dir():
+            child = _scan_tree(path)
+            child.name = path.name
+            node.children.append(child)
+        elif path.is_file():
+            stat = path.stat()
+            node.children.append(
+                FatNode(
+                    name=path.name,
+                    source=path,
+                    is_dir=False,
+                    size=stat.st_size,
+                    mtime=stat.st_mtime,
+                )
+            )
+    return node
+
+
+def _directory_entries(node: FatNode, label: bytes | None) -> bytes:
+    """Create the content of a directory, including '.', '..' and long file names."""
+    entries = []
+    if label is not None:
+        entries.append(_direntry(label, ATTR_VOLUME_ID, 0, 0, DIRECTORY_TIMESTAMP))
+    else:
+        entries.append(_direntry(b".          ", ATTR_DIRECTORY, node.cluster, 0, node.mtime))
+        entries.append(
+            _direntry(b"..         ", ATTR_DIRECTORY, node.parent_cluster, 0, node.mtime)
+        )
+    for child in node.children:
+        entries.extend(child.lfn)
+        attr = ATTR_DIRECTORY if child.is_dir else ATTR_ARCHIVE
+        entries.append(_direntry(child.shortname, attr, child.cluster, child.size, child.mtime))
+    return b"".join(entries)
+
+
+class Fat32Layout:  # pylint: disable=too-many-instance-attributes
+    """Geometry of a FAT32 file system of a given size."""
+
+    def __init__(self, volume_bytes: int, sectors_per_cluster: int) -> None:
+        self.total_sectors = volume_bytes // SECTOR_SIZE
+        self.sectors_per_cluster = sectors_per_cluster
+        # The number of FAT sectors depends on the number of clusters and vice versa
+        self.fat_sectors = 1
+        while True:
+            data_sectors = self.total_sectors - RESERVED_SECTORS - NUM_FATS * self.fat_sectors
+            self.clusters = data_sectors // self.sectors_per_cluster
+            needed = math.ceil((self.clusters + 2) * 4 / SECTOR_SIZE)
+            if needed <= self.fat_sectors:
+                break
+            self.fat_sectors = needed
+        self.cluster_bytes = self.sectors_per_cluster * SECTOR_SIZE
+        self.data_start = (RESERVED_SECTORS + NUM_FATS * self.fat_sectors) * SECTOR_SIZE
+
+    @property
+    def valid(self) -> bool:
+        """Whether the number of clusters is valid for FAT32."""
+        return MIN_CLUSTERS <= self.clusters <= MAX_CLUSTERS
+
+    def cluster_offset(self, cluster: int) -> int:
+        """Byte offset of a cluster, relative to the start of the partition."""
+        return self.data_start + (cluster - 2) * self.cluster_bytes
+
+
+def _count_clusters(node: FatNode, layout: Fat32Layout, is_root: bool = False) -> int:
+    """Calculate the clusters needed by a node and all its children."""
+    if not node.is_dir:
+        node.clusters = math.ceil(node.size / layout.cluster_bytes)
+        return node.clusters
+
+    taken: set[bytes] = set()
+    entries = 1 if is_root else 2  # volume label, or '.' and '..'
+    for child in node.children:
+        child.shortname, needs_lfn = _shortname(child.name, child.is_dir, taken)
+        child.lfn = _lfn_entries(child.name, child.shortname) if needs_lfn else []
+        entries += 1 + len(child.lfn)
+    node.clusters = max(1, math.ceil(entries * DIRENTRY_SIZE / layout.cluster_bytes))
+    return node.clusters + sum(_count_clusters(child, layout) for child in node.children)
+
+
+def _assign_clusters(root: FatNode) -> list[FatNode]:
+    """
+    Assign contiguous clusters: first all directories, then all files in directory order, so
+    that files are written in one sequential stream. Return all nodes in allocation order.
+    """
+    directories: list[FatNode] = []
+    files: list[FatNode] = []
+
+    def walk(node: FatNode) -> None:
+        directories.append(node)
+        for child in node.children:
+            if child.is_dir:
+                walk(child)
+            elif child.clusters:
+                files.append(child)
+
+    walk(root)
+    cluster = 2
+    for node in directories + files:
+        node.cluster = cluster
+        cluster += node.clusters
+    # '..' entries point to the parent directory, or 0 for the root directory
+    for node in directories:
+        for child in node.children:
+            child.parent_cluster = 0 if node is root else node.cluster
+    return directories + files
+
+
+def _boot_sector(layout: Fat32Layout, label: bytes, volume_id: int) -> bytes:
+    """Create the boot sector with the BIOS parameter block."""
+    sector = bytearray(SECTOR_SIZE)
+    struct.pack_into(
+        "<3s8sHBHBHHBHHHII",
+        sector,
+        0,
+        b"\xeb\x58\x90",
+        b"MSWIN4.1",
+        SECTOR_SIZE,
+        layout.sectors_per_cluster,
+        RESERVED_SECTORS,
+        NUM_FATS,
+        0,
+        0,
+        0xF8,
+        0,
+        63,
+        255,
+        PARTITION_START,
+        layout.total_sectors,
+    )
+    struct.pack_into(
+        "<IHHIHH12sBBBI11s8s",
+        sector,
+        36,
+        layout.fat_sectors,
+        0,
+        0,
+        2,
+        1,
+        6,
+        b"",
+        0x80,
+        0,
+        0x29,
+        volume_id,
+        label,
+        b"FAT32   ",
+    )
+    sector[510:512] = b"\x55\xaa"
+    return bytes(sector)
+
+
+def _fsinfo_sector(free_clusters: int, next_free: int) -> bytes:
+    """Create the FSInfo sector."""
+    sector = bytearray(SECTOR_SIZE)
+    struct.pack_into("<I", sector, 0, 0x41615252)
+    struct.pack_into("<IIII", sector, 484, 0x61417272, free_clusters, next_free, 0)
+    struct.pack_into("<I", sector, 508, 0xAA550000)
+    return bytes(sector)
+
+
+def _mbr(total_sectors: int) -> bytes:
+    """Create a master boot record with a single FAT32 (LBA) partition."""
+    sector = bytearray(SECTOR_SIZE)
+    # Partition entry: not bootable, CHS values unused (LBA), type 0x0C
+    struct.pack_into(
+        "<B3sB3sII",
+        sector,
+        446,
+        0,
+        b"\xfe\xff\xff",
+        0x0C,
+        b"\xfe\xff\xff",
+        PARTITION_START,
+        total_sectors,
+    )
+    sector[510:512] = b"\x55\xaa"
+    return bytes(sector)
+
+
+def _tree_size(node: FatNode) -> int:
+    """Sum up the sizes of all files in a tree."""
+    return node.size + sum(_tree_size(child) for child in node.children)
+
+
+def _layout_for(root: FatNode, size: int | None) -> Fat32Layout:
+    """Find a file system layout in which the tree fits, growing the size if none is given."""
+    if size:
+        volume_bytes = size - PARTITION_START * SECTOR_SIZE
+    else:
+        volume_bytes = max(int(_tree_size(root) * 1.05) + 1024**2, 34 * 1024**2)
+
+    while True:
+        spc = _sectors_per_cluster(volume_bytes)
+        layout = Fat32Layout(volume_bytes, spc)
+        # Too few clusters for FAT32: use smaller clusters
+        while layout.clusters < MIN_CLUSTERS and spc > 1:
+            spc //= 2
+            layout = Fat32Layout(volume_bytes, spc)
+        if layout.valid and _count_clusters(root, layout, is_root=True) <= layout.clusters:
+            return layout
+        if size:
+            msg = f"The content does not fit into a FAT32 image of {size} bytes"
+            raise ValueError(msg)
+        volume_bytes = int(volume_bytes * 1.1)
+
+
+def _fat(nodes: list[FatNode]) -> bytes:
+    """Create the used part of the file allocation table, with one chain per node."""
+    entries = [0x0FFFFFF8, FAT_EOC]
+    for node in nodes:
+        entries.extend(range(node.cluster + 1, node.cluster + node.clusters))
+        entries.append(FAT_EOC)
+    return struct.pack(f"<{len(entries)}I", *entries)
+
+
+def build_fat32_image(
+    source_dir: Path, image: Path, size: int | None = None, label: str = "TONUINO"
+) -> None:
+    """
+    Build a partitioned FAT32 image with the content of `source_dir`. Directories and files are
+    sorted by name and stored contiguously in this order. Without `size`, the image is just
+    large enough for the content.
+    """
+    root = _scan_tree(source_dir)
+    layout = _layout_for(root, size)
+    nodes = _assign_clusters(root)
+    used = sum(node.clusters for node in nodes)
+    label_bytes = f"{label.upper()[:11]:<11}".encode("ascii", "replace")
+    # Derive the volume ID from the content so the same content results in the same image
+    volume_id = zlib.crc32(repr([(n.name, n.size, n.cluster) for n in nodes]).encode())
+    logging.info(
+        "Building FAT32 image %s (%.1f MB, %s clusters of %s bytes)",
+        image,
+        layout.total_sectors * SECTOR_SIZE / 1024**2,
+        layout.clusters,
+        layout.cluster_bytes,
+    )
+
+    partition = PARTITION_START * SECTOR_SIZE
+    with open(image, "wb") as img:
+        # Unwritten areas of the image are zero, without taking up space on most file systems
+        img.truncate(partition + layout.total_sectors * SECTOR_SIZE)
+        img.write(_mbr(layout.total_sectors))
+
+        # Boot sector and FSInfo, plus their backup copies at sector 6
+        boot = _boot_sector(layout, label_bytes, volume_id)
+        fsinfo = _fsinfo_sector(layout.clusters - used, used + 2)
+        for sector in (0, 6):
+            img.seek(partition + sector * SECTOR_SIZE)
+            img.write(boot + fsinfo)
+
+        fat = _fat(nodes)
+        for fatno in range(NUM_FATS):
+            img.seek(partition + (RESERVED_SECTORS + fatno * layout.fat_sectors) * SECTOR_SIZE)
+            img.write(fat)
+
+        # Directories and files, in the order of their clusters
+        for node in nodes:
+            img.seek(partition + layout.cluster_offset(node.cluster))
+            if node.is_dir:
+                img.write(_directory_entries(node, label_bytes if node is root else None))
+            else:
+                with open(node.source, "rb") as src:
+                    shutil.copyfileobj(src, img, 1024 * 1024)
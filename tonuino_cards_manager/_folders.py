@@ -0,0 +1,117 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Allocation of the folders on the SD card to cards with more files than a folder can hold."""
+
+import json
+import logging
+import math
+from pathlib import Path
+
+from ._card import MAX_FILES
+from ._config import Config
+from ._helpers import atomic_write, config_lock
+
+# Highest folder number that typical Tonuino MP3 players support
+MAX_FOLDERS = 99
+
+
+def folders_path(config_file: str | Path) -> Path:
+    """Get the path of the stored folder allocation next to the config file."""
+    path_config = Path(config_file)
+    return path_config.parent / f"FOLDERS_{path_config.stem}.json"
+
+
+def load_folders(config_file: str | Path) -> dict[int, list[int]]:
+    """Load the folder allocation of the last run. Return an empty dict if there is none."""
+    path = folders_path(config_file)
+    try:
+        with open(path, encoding="UTF-8") as storefile:
+            return {int(cardno): folders for cardno, folders in json.load(storefile).items()}
+    except FileNotFoundError:
+        return {}
+    except (json.JSONDecodeError, OSError, ValueError) as exc:
+        logging.warning("Could not read the folder allocation from %s: %s", path, exc)
+        return {}
+
+
+def save_folders(folders: dict[int, list[int]], config_file: str | Path) -> None:
+    """Store the folder allocation, if any card uses more than one folder or it was stored."""
+    path = folders_path(config_file)
+    if all(len(f) == 1 for f in folders.values()) and not path.exists():
+        return
+    with atomic_write(path) as storefile:
+        json.dump({str(cardno): f for cardno, f in folders.items()}, storefile, indent=2)
+
+
+def allocate_folders(
+    config: Config,
+    previous: dict[int, list[int]] | None = None,
+    counts: dict[int, int] | None = None,
+) -> dict[int, list[int]]:
+    """
+    Allocate the folders of all cards, whose sources have to be parsed already unless their
+    numbers of files are given in `counts`, and store them in the cards. Each card uses the
+    folder of its number, so programmed RFID cards stay valid, plus an extra folder per
+    MAX_FILES further files. Extra folders of the `previous` allocation are kept, so files do
+    not move between runs, and new ones take the lowest free numbers.
+    """
+    previous = previous or {}
+    if counts is None:
+        counts = {cardno: len(card.sourcefiles) for cardno, card in config.cards.items()}
+    needed = {cardno: max(math.ceil(counts[cardno] / MAX_FILES), 1) for cardno in config.cards}
+    used = set(config.cards)
+    folders: dict[int, list[int]] = {}
+    for cardno in sorted(config.cards):
+        folders[cardno] = [cardno]
+        for folder in previous.get(cardno, [])[1:]:
+            if len(folders[cardno]) < needed[cardno] and folder not in used:
+                folders[cardno].append(folder)
+                used.add(folder)
+
+    free = (folder for folder in range(1, MAX_FOLDERS + 1) if folder not in used)
+    for cardno in sorted(config.cards):
+        while len(folders[cardno]) < needed[cardno]:
+            if (folder := next(free, None)) is None:
+                logging.error(
+                    "Card %s needs %s folders for its %s files, but only %s are free. Its last "
+                    "folder will have more files than a player supports",
+                    cardno,
+                    needed[cardno],
+                    counts[cardno],
+                    len(folders[cardno]),
+                )
+                break
+            folders[cardno].append(folder)
+            used.add(folder)
+        if len(folders[cardno]) > 1:
+            logging.info(
+                "Card %s has %s files and is split across the folders %s",
+                cardno,
+                counts[cardno],
+                ", ".join(str(folder) for folder in folders[cardno]),
+            )
+        config.cards[cardno].folders = folders[cardno]
+    return folders
+
+
+def plan_folders(
+    config: Config,
+    config_file: str | Path | None,
+    save: bool = True,
+    counts: dict[int, int] | None = None,
+) -> None:
+    """
+    Allocate the folders of all cards, keeping the allocation stored next to the config file
+    stable. With `save`, the new allocation is stored.
+    """
+    if config_file is None:
+        allocate_folders(config, counts=counts)
+        return
+    # Other jobs on the same config must not allocate in between
+    with config_lock(config_file):
+        previous = load_folders(config_file)
+        folders = allocate_folders(config, previous, counts)
+        if save and folders != previous:
+            save_folders(folders, config_file)
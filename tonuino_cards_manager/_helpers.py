@@ -4,23 +4,62 @@
 
 """Helper functions for copy operations and conversions."""
 
+import contextlib
+import errno
+import hashlib
+import itertools
 import logging
+import multiprocessing
+import os
 import re
 import shutil
-import sys
+import tempfile
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import Any, TextIO
+from xml.sax.saxutils import escape
 
 from jsonschema import FormatChecker, validate
 from jsonschema.exceptions import ValidationError
-from mutagen.easyid3 import EasyID3
-from mutagen.id3._util import ID3NoHeaderError
-from mutagen.mp3 import MP3
+from mutagen import File as MutagenFile
+from mutagen import FileType, MutagenError
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import cm
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import (
+    BaseDocTemplate,
+    Flowable,
+    Frame,
+    PageTemplate,
+    Paragraph,
+    Table,
+    TableStyle,
+)
+
+from ._strip import CopyPlan, plan_copy
+
+# Files larger than this are copied in chunks so progress can be reported while copying them
+CHUNKED_COPY_THRESHOLD = 8 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+# none: no checksums. fast: re-read copies only if size or mtime differ. full: re-read all copies
+VERIFY_MODES = ("none", "fast", "full")
+# Files with these extensions are taken from source directories
+AUDIO_EXTENSIONS = (".mp3", ".opus", ".ogg")
+# Tags used for file names, the table of contents and minimal tags
+AUDIO_TAGS = ("artist", "title", "album")
+# FAT file systems store modification times with a resolution of 2 seconds
+MTIME_TOLERANCE_NS = 2_000_000_000
+
+_CONFIG_LOCKS: dict[str, threading.Lock] = {}
+_CONFIG_LOCKS_LOCK = threading.Lock()
+
+
+class ConfigError(ValueError):
+    """The configuration is invalid. The details have been logged already."""
 
 
 def _sanitize_filename(filename: str) -> str:
@@ -28,38 +67,186 @@ def _sanitize_filename(filename: str) -> str:
     return re.sub("[^A-Za-zÄÖÜäöü0-9-_]+", "", filename.replace(" ", "_"))
 
 
-def copy_to_sdcard(index: int, mp3file: Path, destination_dir: Path, filenametype: str) -> None:
-    """Copy a single file to the SD card in a suitable."""
-    logging.debug("Processing %s", mp3file)
+def _open_audio_file(audiofile: Path) -> FileType | None:
+    """
+    Open an audio file with the mutagen class matching its format (MP3, Opus, Ogg Vorbis...).
+    Only headers are read. Tags are exposed with common keys like 'artist' for all formats.
+    """
+    try:
+        audio = MutagenFile(audiofile, easy=True)
+    except (MutagenError, OSError) as exc:
+        logging.error("Could not read audio file %s: %s", audiofile, exc)  # noqa: TRY400
+        return None
+    if audio is None:
+        logging.error("Could not detect the audio format of file: %s", audiofile)
+    return audio
+
+
+def _audio_length(audio: FileType | None) -> float | None:
+    """Get the length in seconds of an opened audio file, if known."""
+    if audio is not None and audio.info is not None and hasattr(audio.info, "length"):
+        return audio.info.length
+    return None
+
+
+def _audio_tags(audio: FileType | None, keys: tuple[str, ...] = AUDIO_TAGS) -> dict[str, str]:
+    """
+    Get the tags of an opened audio file, by default artist, title and album. Missing tags are
+    left out.
+    """
+    if audio is None or not audio.tags:
+        return {}
+    return {key: audio.tags[key][0] for key in keys if audio.tags.get(key)}
+
+
+def get_audio_tags(audiofile: Path) -> dict[str, str]:
+    """Get the artist, title and album tags of an audio file. Missing tags are left out."""
+    tags = _audio_tags(_open_audio_file(audiofile))
+    if not tags:
+        logging.debug("File %s does not contain any tags", audiofile.name)
+    return tags
+
+
+def probe_audio_file(audiofile: Path) -> tuple[int, dict[str, str]]:
+    """
+    Get the rounded audio length and the tags of an audio file, parsing it only once. Besides
+    artist, title and album, the disc and track numbers are returned, e.g. as `1/12`.
+    """
+    audio = _open_audio_file(audiofile)
+    length = _audio_length(audio)
+    if length is None:
+        logging.error("Could not determine audio length for file: %s", audiofile)
+        length = 0
+    return round(length), _audio_tags(audio, (*AUDIO_TAGS, "discnumber", "tracknumber"))
+
+
+def get_destination_filename(
+    index: int, mp3file: Path, filenametype: str, tags: dict[str, str] | None = None
+) -> str:
+    """
+    Get the file name of a file on the SD card. `tags` can be passed if they are already known,
+    otherwise they are read from the file if needed.
+    """
+    # Track number, filled with leading zeros
+    track = str(index + 1).zfill(3)
     if filenametype == "mp3tags":
+        if tags is None:
+            tags = get_audio_tags(mp3file)
         # If no ID3 tags are present, use file name, otherwise $artist-$title
-        try:
-            meta = EasyID3(mp3file)
-            filename = _sanitize_filename(f"{meta['artist'][0]}-{meta['title'][0]}")
-        except (ID3NoHeaderError, KeyError):
+        if "artist" in tags and "title" in tags:
+            filename = _sanitize_filename(f"{tags['artist']}-{tags['title']}")
+        else:
             logging.debug(
-                "File %s does not contain any ID3 tags. Using its file name", mp3file.name
+                "File %s does not contain artist and title tags. Using its file name",
+                mp3file.name,
             )
             filename = _sanitize_filename(mp3file.stem)
 
-        # copy file to destination using a compatible name based on tags
-        # Track number, filled with leading zeros
-        track = str(index + 1).zfill(3)
-        destname = f"{track}-{filename}.mp3"
-    elif filenametype == "tracknumber":
-        # Track number, filled with leading zeros
-        track = str(index + 1).zfill(3)
-        destname = f"{track}.mp3"
-    else:
-        logging.critical(
-            "You did specify a wrong filenametype '%s'."
-            "Supported are: 'mp3tags' and 'tracknumber'. ",
-            filenametype,
-        )
-        sys.exit(1)
+        # copy file to destination using a compatible name based on tags, keeping the format
+        return f"{track}-{filename}{mp3file.suffix.lower()}"
+    if filenametype == "tracknumber":
+        return f"{track}{mp3file.suffix.lower()}"
+
+    logging.critical(
+        "You did specify a wrong filenametype '%s'.Supported are: 'mp3tags' and 'tracknumber'. ",
+        filenametype,
+    )
+    msg = f"Unknown filenametype '{filenametype}'"
+    raise ConfigError(msg)
+
+
+def _copy_file(
+    source: Path,
+    destination: Path,
+    advance: Callable[[int], None] | None = None,
+    verify: str = "none",
+    plan: CopyPlan | None = None,
+) -> str | None:
+    """
+    Copy the content and metadata of a file, or only the parts given by `plan`. Without
+    verification, small files are copied in one go by the fast copy of the operating system, and
+    large ones in chunks if progress is reported via `advance`. Otherwise, the SHA-256 checksum
+    is calculated while streaming the file, the copy is verified, and the checksum is returned.
+    """
+    size = source.stat().st_size
+    if plan is None:
+        plan = plan_copy(source)
+    if (
+        verify == "none"
+        and plan.is_full_copy(size)
+        and (advance is None or size < CHUNKED_COPY_THRESHOLD)
+    ):
+        shutil.copy2(source, destination)
+        if advance is not None:
+            advance(size)
+        return None
 
-    logging.debug("Copying %s to %s", mp3file, destination_dir / Path(destname))
-    shutil.copy2(mp3file, destination_dir / Path(destname))
+    digest = hashlib.sha256()
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        for chunk in plan.chunks(src, COPY_CHUNK_SIZE):
+            digest.update(chunk)
+            dst.write(chunk)
+            if advance is not None:
+                advance(len(chunk))
+    shutil.copystat(source, destination)
+    # Account for the parts of the source that have been left out, so the progress adds up
+    if advance is not None and plan.size != size:
+        advance(size - plan.size)
+
+    if verify == "none":
+        return None
+    checksum = digest.hexdigest()
+    verify_copy(source, destination, checksum, verify, plan.size)
+    return checksum
+
+
+def file_checksum(path: Path) -> str:
+    """Calculate the SHA-256 checksum of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fileobj:
+        while chunk := fileobj.read(COPY_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def same_size_and_mtime(
+    source: os.stat_result, copy: os.stat_result, size: int | None = None
+) -> bool:
+    """
+    Check whether a copy has the same size and, within the FAT resolution, mtime as its source.
+    `size` is the expected size of the copy if it differs from the source.
+    """
+    return (
+        copy.st_size == (source.st_size if size is None else size)
+        and abs(source.st_mtime_ns - copy.st_mtime_ns) < MTIME_TOLERANCE_NS
+    )
+
+
+def _drop_from_cache(path: Path) -> None:
+    """Write a file to disk and drop it from the page cache, so it is really read again."""
+    with open(path, "rb") as fileobj:
+        os.fsync(fileobj.fileno())
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fileobj.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def verify_copy(
+    source: Path, destination: Path, checksum: str, mode: str, size: int | None = None
+) -> None:
+    """
+    Verify a copied file against the checksum of the written content. In `fast` mode, the copy
+    is only read again if its size or mtime differ from the source, or from the expected `size`.
+    In `full` mode, it is always read again, bypassing the page cache if possible. Raise an
+    OSError if the copy is broken.
+    """
+    if mode == "none":
+        return
+    if mode == "fast" and same_size_and_mtime(source.stat(), destination.stat(), size):
+        return
+    if mode == "full":
+        _drop_from_cache(destination)
+    if file_checksum(destination) != checksum:
+        raise OSError(errno.EIO, "Copy does not match the checksum of its source", str(destination))
 
 
 def proper_dirname(dirno: int | str) -> str:
@@ -72,23 +259,21 @@ def decimal_to_hex(number: int | str) -> str:
     return f"{int(number):02x}"
 
 
-def get_audio_length(mp3file: Path) -> int:
-    """Get the audiolength of an audiofile."""
-    file = MP3(mp3file)
-    if file.info is not None and hasattr(file.info, "length"):
-        return round(file.info.length)
-    logging.error("Could not determine audio length for file: %s", mp3file)
+def get_audio_length(audiofile: Path) -> int:
+    """Get the audiolength of an audiofile, independent of its format."""
+    if (length := _audio_length(_open_audio_file(audiofile))) is not None:
+        return round(length)
+    logging.error("Could not determine audio length for file: %s", audiofile)
     return 0
 
 
 def get_files_in_directory(directory: Path, audio_only: bool = False) -> list[Path]:
     """Get all files in a directory, sorted. Optionally only display music files."""
-    audioexts = (".mp3", ".opus", ".ogg")
     allfiles = [f for f in directory.iterdir() if f.is_file()]
 
     # Only return files with audio file extension
     if audio_only:
-        return sorted([f for f in allfiles if f.suffix in audioexts])
+        return sorted([f for f in allfiles if f.suffix in AUDIO_EXTENSIONS])
 
     return sorted(allfiles)
 
@@ -104,51 +289,165 @@ def validate_config_schema(cfg: dict, schema: dict) -> None:
         validate(instance=cfg, schema=schema, format_checker=FormatChecker())
     except ValidationError as e:
         logging.critical("Config validation failed: %s", e.message)
-        raise ValueError(e) from None
+        raise ConfigError(e.message) from None
     logging.debug("Config validated successfully against schema.")
 
 
-def table_of_contents(toc_list: list[list[str | int]], config_file: str) -> None:
-    """Write a table of contents of the SD-Card to pdf."""
-    # create document
-    path_config = Path(config_file)
-    path_toc = Path(path_config.parent, "TOC_" + path_config.stem + ".pdf")
-    doc = SimpleDocTemplate(str(path_toc), pagesize=A4)
+def process_pool(jobs: int | None = None) -> ProcessPoolExecutor:
+    """
+    Create a pool of `jobs` worker processes, by default one per CPU. They are spawned instead
+    of forked, as a fork copies the locks other threads hold, e.g. those of daemon workers or of
+    the background publishing, which can then never be released.
+    """
+    return ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"))
+
+
+def config_lock(config_file: str | Path) -> threading.Lock:
+    """
+    Get the lock of the files stored next to a config file, so jobs on the same config in this
+    process do not update them at the same time.
+    """
+    key = str(Path(config_file).resolve())
+    with _CONFIG_LOCKS_LOCK:
+        return _CONFIG_LOCKS.setdefault(key, threading.Lock())
 
-    # container for the 'flowable' objects
-    elements = []
 
+@contextlib.contextmanager
+def atomic_write(path: Path) -> Iterator[TextIO]:
+    """
+    Write a text file through a temporary file of a unique name next to it, which replaces the
+    file once it is complete. Readers never see an incomplete file, and concurrent writers do
+    not share a temporary file.
+    """
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="UTF-8", dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False
+    ) as tmpfile:
+        try:
+            yield tmpfile
+        except BaseException:
+            tmpfile.close()
+            Path(tmpfile.name).unlink(missing_ok=True)
+            raise
+    Path(tmpfile.name).replace(path)
+
+
+class _TocDocTemplate(BaseDocTemplate):
+    """
+    PDF document of the table of contents. The rows of each card are a table of their own, so
+    the header row of the table is drawn at the top of every page after the first.
+    """
+
+    def __init__(self, filename: str, header: Table) -> None:
+        super().__init__(filename, pagesize=A4)
+        self._header = header
+        header_width, self._header_height = header.wrap(self.width, self.height)
+        # Tables are centered in the frame
+        self._header_x = self.leftMargin + (self.width - header_width) / 2
+        first = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id="first")
+        later = Frame(
+            self.leftMargin,
+            self.bottomMargin,
+            self.width,
+            self.height - self._header_height,
+            topPadding=0,
+            id="later",
+        )
+        self.addPageTemplates(
+            [
+                PageTemplate("First", [first], autoNextPageTemplate="Later"),
+                PageTemplate("Later", [later], onPage=self._draw_header),
+            ]
+        )
+
+    def _draw_header(self, canvas: Canvas, _doc: BaseDocTemplate) -> None:
+        """Draw the header row above the frame of a page."""
+        top = self.bottomMargin + self.height
+        self._header.drawOn(canvas, self._header_x, top - self._header_height)
+
+    def build_from(self, flowables: Iterable[Flowable], lookahead: int = 8) -> None:
+        """
+        Build the document from flowables taken from an iterator, which are handed to reportlab
+        a few at a time, so the flowables of large documents are never all in memory.
+        """
+        flowables = iter(flowables)
+        pending: list[Flowable] = []
+        self._startBuild()
+        self.canv._doctemplate = self  # noqa: SLF001
+        while True:
+            pending.extend(itertools.islice(flowables, max(lookahead - len(pending), 0)))
+            if not pending:
+                break
+            self.clean_hanging()
+            self.handle_flowable(pending)
+        del self.canv._doctemplate  # noqa: SLF001
+        self._endBuild()
+
+
+def _toc_table(rows: list[list[Any]], header: bool) -> Table:
+    """Create the table of the header, or of a single card and its tracks."""
+    style = [
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("FONTSIZE", (0, 0), (-1, -1), 12),
+        ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.black),
+        ("BOX", (0, 0), (-1, -1), 0.25, colors.black),
+    ]
+    if header:
+        style.append(("FONT", (0, 0), (-1, 0), "Helvetica-Bold"))
+    return Table(
+        rows,
+        colWidths=[1.2 * cm, 12 * cm, 1.5 * cm, 2.3 * cm],
+        spaceBefore=1 * cm if header else 0,
+        style=TableStyle(style),
+    )
+
+
+def _toc_row(row: list[str | int], toc_style: Any, header: bool = False) -> list[Any]:  # noqa: ANN401
+    """Format a row of the table of contents as table row."""
+    # Paragraphs are markup, so tags read from the files must not be taken for it. Only the
+    # header of the description column is made bold, like the others
+    description = escape(str(row[1]))
+    if header:
+        description = f" <b>{description}</b> "
+    return [row[0], Paragraph(description, toc_style), row[2], row[3]]
+
+
+def _toc_tables(toc_list: Iterable[list[str | int]], toc_style: Any) -> Iterator[Table]:  # noqa: ANN401
+    """
+    Yield one table for each card with its tracks, so only the rows of a single card are in
+    memory. Rows of tracks have no card number.
+    """
+    chunk: list[list[Any]] = []
+    for row in toc_list:
+        if chunk and row[0] != "":
+            yield _toc_table(chunk, header=False)
+            chunk = []
+        chunk.append(_toc_row(row, toc_style))
+    if chunk:
+        yield _toc_table(chunk, header=False)
+
+
+def table_of_contents(toc_list: Iterable[list[str | int]], config_file: str | Path) -> None:
+    """
+    Write a table of contents of the SD-Card to pdf. The first row is the header. The rows are
+    taken from `toc_list` while the document is built.
+    """
     # add formating
     styles = getSampleStyleSheet()
     toc_style = styles["Normal"]
     toc_style.fontSize = 12
     toc_style.fontName = "Helvetica"
     toc_style.leading = 14
-    toc_list[0][1] = " <b>" + str(toc_list[0][1]) + "</b> "  # type: ignore[index]
-    formatted_rows: list[list[Any]] = [
-        [row[0], Paragraph(str(row[1]), toc_style), row[2], row[3]] for row in toc_list
-    ]
 
-    # add flowables to container
-    elements.append(Paragraph("Table of Contents Tonuino", styles["Heading1"]))
-    t = Table(
-        formatted_rows,
-        colWidths=[1.2 * cm, 12 * cm, 1.5 * cm, 2.3 * cm],
-        repeatRows=1,
-        spaceBefore=1 * cm,
-    )
-    t.setStyle(
-        TableStyle(
-            [
-                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                ("FONT", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("FONTSIZE", (0, 0), (-1, -1), 12),
-                ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.black),
-                ("BOX", (0, 0), (-1, -1), 0.25, colors.black),
-            ]
-        )
+    # create document
+    rows = iter(toc_list)
+    header = next(rows)
+    path_config = Path(config_file)
+    path_toc = Path(path_config.parent, "TOC_" + path_config.stem + ".pdf")
+    doc = _TocDocTemplate(
+        str(path_toc), _toc_table([_toc_row(header, toc_style, header=True)], header=True)
     )
-    elements.append(t)
 
-    # write the document to disk
-    doc.build(elements)
+    # add flowables, and write the document to disk
+    title = Paragraph("Table of Contents Tonuino", styles["Heading1"])
+    first = _toc_table([_toc_row(header, toc_style, header=True)], header=True)
+    doc.build_from(itertools.chain([title, first], _toc_tables(rows, toc_style)))
@@ -0,0 +1,234 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Integrity check of audio files, so damaged files are noticed before they fail on the box."""
+
+import logging
+import math
+import mmap
+import os
+from collections.abc import Iterable
+from pathlib import Path
+
+from ._config import Config
+from ._helpers import process_pool
+from ._metadata import MetadataCache
+from ._mp3frames import (
+    CRC_SIZE,
+    HEADER_SIZE,
+    INFO_FRAME_TAGS,
+    VBRI_OFFSET,
+    is_info_frame,
+    iter_frames,
+)
+from ._mp3frames import parse_header as parse_frame_header
+from ._strip import mp3_audio_range
+
+OGG_EXTENSIONS = (".ogg", ".oga", ".opus")
+OGG_CAPTURE = b"OggS"
+OGG_HEADER_SIZE = 27
+OGG_END_OF_STREAM = 0x04
+XING_FRAMES_FLAG = 0x01
+# Files sent to a process at once, at least, and about how many batches each process gets
+MIN_CHUNK_SIZE = 16
+CHUNKS_PER_JOB = 4
+
+
+def _info_frame_count(data: mmap.mmap, pos: int, tag_start: int) -> int | None:
+    """The number of audio frames stated in a Xing, Info or VBRI frame, if it has one."""
+    if data[tag_start : tag_start + 4] in INFO_FRAME_TAGS:
+        flags = int.from_bytes(data[tag_start + 4 : tag_start + 8], "big")
+        if flags & XING_FRAMES_FLAG:
+            return int.from_bytes(data[tag_start + 8 : tag_start + 12], "big")
+        return None
+    if data[pos + VBRI_OFFSET : pos + VBRI_OFFSET + 4] == b"VBRI":
+        return int.from_bytes(data[pos + VBRI_OFFSET + 14 : pos + VBRI_OFFSET + 18], "big")
+    return None
+
+
+def check_mp3(path: Path) -> list[str]:
+    """
+    Walk the frame headers of an MP3 file and describe its problems: data between frames that
+    is not audio, a missing end, and variable bitrates without a Xing or VBRI header.
+    """
+    start, end = mp3_audio_range(path)
+    if end <= start:
+        return ["no MPEG audio frames"]
+    with open(path, "rb") as mp3, mmap.mmap(mp3.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        frames = 0
+        stated = None
+        bitrates = set()
+        skipped = 0
+        expected = None
+        for number, (pos, header) in enumerate(iter_frames(data, start, end)):
+            if number == 0 and is_info_frame(data, pos, header):
+                tag_start = pos + HEADER_SIZE + CRC_SIZE * header.protected + header.side_info_size
+                stated = _info_frame_count(data, pos, tag_start)
+                # An info frame without frame count still counts as a VBR header
+                stated = stated if stated is not None else -1
+                expected = pos + header.length
+                continue
+            if expected is not None and pos > expected:
+                skipped += pos - expected
+            frames += 1
+            bitrates.add(header.bitrate)
+            expected = pos + header.length
+
+        problems = []
+        if not frames:
+            return ["no MPEG audio frames"]
+        if skipped:
+            problems.append(f"{skipped} bytes between frames are not audio data")
+        if (
+            expected is not None
+            and (last := parse_frame_header(data, expected)) is not None
+            and expected + last.length > end
+        ):
+            problems.append("truncated, the last frame is incomplete")
+        elif stated is not None and 0 <= frames < stated:
+            # Frames are also lost where data between frames is damaged
+            problems.append(
+                f"{stated - frames} frames are missing"
+                if skipped
+                else f"truncated, {frames} of {stated} frames are present"
+            )
+        if len(bitrates) > 1 and stated is None:
+            problems.append("variable bitrate without Xing or VBRI header, durations are wrong")
+    return problems
+
+
+def _ogg_page(data: mmap.mmap, pos: int) -> tuple[int, int, int, int] | None:
+    """
+    Parse the Ogg page at `pos`, and return its end, serial number, sequence number and flags.
+    Return None if the page is incomplete.
+    """
+    if pos + OGG_HEADER_SIZE > len(data):
+        return None
+    segments_end = pos + OGG_HEADER_SIZE + data[pos + 26]
+    if segments_end > len(data):
+        return None
+    page_end = segments_end + sum(data[pos + OGG_HEADER_SIZE : segments_end])
+    if page_end > len(data):
+        return None
+    serial = int.from_bytes(data[pos + 14 : pos + 18], "little")
+    sequence = int.from_bytes(data[pos + 18 : pos + 22], "little")
+    return page_end, serial, sequence, data[pos + 5]
+
+
+def check_ogg(path: Path) -> list[str]:
+    """
+    Walk the pages of an Ogg file, containing Vorbis or Opus, and describe its problems: data
+    between pages, missing or incomplete pages, and streams without their last page.
+    """
+    if path.stat().st_size == 0:
+        return ["no Ogg pages"]
+    sequences: dict[int, int] = {}
+    ended: set[int] = set()
+    skipped = missing = 0
+    truncated = False
+    with open(path, "rb") as ogg, mmap.mmap(ogg.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        pos = 0
+        while pos < len(data):
+            if data[pos : pos + 4] != OGG_CAPTURE:
+                nxt = data.find(OGG_CAPTURE, pos + 1)
+                nxt = nxt if nxt != -1 else len(data)
+                skipped += nxt - pos
+                pos = nxt
+                continue
+            if (page := _ogg_page(data, pos)) is None:
+                truncated = True
+                break
+            pos, serial, sequence, flags = page
+            if serial in sequences and sequence != sequences[serial] + 1:
+                missing += max(sequence - sequences[serial] - 1, 1)
+            sequences[serial] = sequence
+            if flags & OGG_END_OF_STREAM:
+                ended.add(serial)
+
+    if not sequences:
+        return ["no Ogg pages"]
+    checks = (
+        (skipped, f"{skipped} bytes between pages are not Ogg data"),
+        (missing, f"{missing} pages are missing"),
+        (truncated, "truncated, the last page is incomplete"),
+        (not truncated and set(sequences) - ended, "truncated, the stream has no last page"),
+    )
+    return [problem for failed, problem in checks if failed]
+
+
+def check_file(path: Path) -> list[str]:
+    """Describe the problems of an MP3 or Ogg file. Other formats are not checked."""
+    try:
+        if path.suffix.lower() == ".mp3":
+            return check_mp3(path)
+        if path.suffix.lower() in OGG_EXTENSIONS:
+            return check_ogg(path)
+    except OSError as exc:
+        return [f"could not be read: {exc}"]
+    return []
+
+
+def _store_results(
+    files: list[Path],
+    results: Iterable[list[str]],
+    cache: MetadataCache,
+    problems: dict[Path, list[str]],
+) -> None:
+    """Cache the problems found in files, and add them to `problems`."""
+    for file, found in zip(files, results, strict=True):
+        cache.set_integrity(file, found)
+        if found:
+            problems[file] = found
+    cache.commit()
+
+
+def check_integrity(
+    files: list[Path], cache: MetadataCache, jobs: int | None = None
+) -> dict[Path, list[str]]:
+    """
+    Get the problems of audio files, from the cache if the files are unchanged, otherwise by
+    scanning them in parallel. Files without problems are left out.
+    """
+    problems: dict[Path, list[str]] = {}
+    missing = []
+    for file in dict.fromkeys(files):
+        if (cached := cache.get_integrity(file)) is None:
+            missing.append(file)
+        elif cached:
+            problems[file] = cached
+
+    if not missing:
+        return problems
+    logging.debug("Checking the integrity of %s files", len(missing))
+    if len(missing) <= MIN_CHUNK_SIZE:
+        # Starting a process takes longer than checking a few files
+        _store_results(missing, map(check_file, missing), cache, problems)
+        return problems
+
+    # Checking a file is quick, so each process gets a share of the files at once instead of
+    # one after the other
+    jobs = min(jobs or os.cpu_count() or 1, math.ceil(len(missing) / MIN_CHUNK_SIZE))
+    chunksize = max(MIN_CHUNK_SIZE, math.ceil(len(missing) / (jobs * CHUNKS_PER_JOB)))
+    with process_pool(jobs) as pool:
+        _store_results(missing, pool.map(check_file, missing, chunksize=chunksize), cache, problems)
+    return problems
+
+
+def check_cards(config: Config, cache: MetadataCache) -> dict[Path, list[str]]:
+    """
+    Check the integrity of the files of all cards, whose sources have to be parsed already, and
+    log the problems found. Damaged files are still copied.
+    """
+    files = [file for card in config.cards.values() for file in card.sourcefiles]
+    problems = check_integrity(files, cache)
+    for cardno, card in config.cards.items():
+        for file in card.sourcefiles:
+            if file in problems:
+                logging.warning(
+                    "Card %s: %s may not play correctly: %s",
+                    cardno,
+                    file,
+                    "; ".join(problems[file]),
+                )
+    return problems
@@ -0,0 +1,134 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Loudness analysis of audio files, so all cards play at a similar volume."""
+
+import logging
+import math
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from ._config import Config
+from ._metadata import Loudness, MetadataCache
+
+# Reference level of ReplayGain 2.0, in LUFS
+DEFAULT_TARGET = -18.0
+# Highest true peak after applying the gain, in dBTP, as recommended by EBU R128
+MAX_TRUE_PEAK = -1.0
+# Files quieter than this are considered silent and do not count for the loudness of a card
+SILENCE = -70.0
+FFMPEG = "ffmpeg"
+EBUR128_ARGS = ["-vn", "-filter:a", "ebur128=peak=true", "-f", "null", "-"]
+
+
+def parse_ebur128(output: str) -> Loudness | None:
+    """Get integrated loudness and true peak from the summary of ffmpeg's ebur128 filter."""
+    summary = output.rpartition("Summary:")[2]
+    integrated = re.search(r"I:\s+(-?[\d.]+|-inf) LUFS", summary)
+    peak = re.search(r"Peak:\s+(-?[\d.]+|-inf) dBFS", summary)
+    if not integrated or not peak:
+        return None
+    return Loudness(float(integrated.group(1)), float(peak.group(1)))
+
+
+def analyze_file(path: Path) -> Loudness | None:
+    """Measure the loudness of an audio file with ffmpeg."""
+    logging.debug("Analysing loudness of %s", path)
+    result = subprocess.run(  # noqa: S603
+        [FFMPEG, "-hide_banner", "-nostats", "-i", str(path), *EBUR128_ARGS],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        logging.error("Could not analyse loudness of %s: %s", path, result.stderr.strip())
+        return None
+    return parse_ebur128(result.stderr)
+
+
+def analyze_loudness(
+    files: list[Path], cache: MetadataCache, workers: int | None = None
+) -> dict[Path, Loudness]:
+    """
+    Get the loudness of audio files, from the cache if the files are unchanged, otherwise by
+    analysing them in parallel. Files that could not be analysed are left out.
+    """
+    results: dict[Path, Loudness] = {}
+    missing = []
+    for file in dict.fromkeys(files):
+        if (loudness := cache.get_loudness(file)) is not None:
+            results[file] = loudness
+        else:
+            missing.append(file)
+    if not missing:
+        return results
+
+    if shutil.which(FFMPEG) is None:
+        logging.warning(
+            "ffmpeg is not installed, cannot analyse the loudness of %s files", len(missing)
+        )
+        return results
+
+    # The decoding runs in one ffmpeg process per file, so threads suffice to use all cores
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for file, loudness in zip(missing, pool.map(analyze_file, missing), strict=True):
+            if loudness is not None:
+                cache.set_loudness(file, loudness)
+                results[file] = loudness
+    cache.commit()
+    return results
+
+
+def card_gain(
+    tracks: list[tuple[Loudness, float]], target: float = DEFAULT_TARGET
+) -> tuple[float, float] | None:
+    """
+    Calculate the loudness of a card from the loudness and duration of its tracks, and the gain
+    in dB to bring it to `target`. The gain is limited so no track peaks above MAX_TRUE_PEAK.
+    Like album gain in ReplayGain, the relative volume of the tracks is kept.
+    """
+    tracks = [
+        (loudness, max(duration, 1))
+        for loudness, duration in tracks
+        if loudness.integrated > SILENCE
+    ]
+    if not tracks:
+        return None
+    # Average the energy of the tracks, weighted by their duration
+    energy = sum(duration * 10 ** (loudness.integrated / 10) for loudness, duration in tracks)
+    integrated = 10 * math.log10(energy / sum(duration for _, duration in tracks))
+    peak = max(loudness.true_peak for loudness, _ in tracks)
+    return integrated, min(target - integrated, MAX_TRUE_PEAK - peak)
+
+
+def normalize_cards(config: Config, cache: MetadataCache) -> None:
+    """
+    Analyse the loudness of the files of all cards, whose sources have to be parsed already, and
+    set the gain of each card to reach the configured target. Only the volume of MP3 files can
+    be changed, so the other files are neither analysed nor changed.
+    """
+    mp3s = {}
+    for cardno, card in config.cards.items():
+        mp3s[cardno] = [file for file in card.sourcefiles if file.suffix.lower() == ".mp3"]
+        if others := len(card.sourcefiles) - len(mp3s[cardno]):
+            logging.warning(
+                "Card %s has %s files that are not MP3, whose volume cannot be changed. They are "
+                "copied unchanged",
+                cardno,
+                others,
+            )
+    loudness = analyze_loudness([file for files in mp3s.values() for file in files], cache)
+    for cardno, card in config.cards.items():
+        tracks = [(loudness[f], cache.get(f).duration) for f in mp3s[cardno] if f in loudness]
+        if (result := card_gain(tracks, config.loudness_target)) is None:
+            card.gain = 0.0
+            continue
+        integrated, card.gain = result
+        logging.info(
+            "Card %s has a loudness of %.1f LUFS, applying %+.1f dB", cardno, integrated, card.gain
+        )
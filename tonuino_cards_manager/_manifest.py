@@ -0,0 +1,84 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Manifest of the files written to an SD card, with their sizes and checksums."""
+
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+from pathlib import Path, PurePosixPath
+
+from ._helpers import atomic_write
+
+MANIFEST_NAME = ".tonuino-manifest.json"
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ManifestEntry:
+    """A file on the SD card as written by the last run."""
+
+    size: int
+    mtime_ns: int
+    sha256: str | None = None
+
+
+@dataclass
+class Manifest:
+    """The manifest of an SD card, stored in its root directory."""
+
+    root: Path
+    files: dict[str, ManifestEntry] = field(default_factory=dict)
+
+    @property
+    def path(self) -> Path:
+        """Path of the manifest file."""
+        return self.root / MANIFEST_NAME
+
+    @classmethod
+    def load(cls, root: Path) -> "Manifest":
+        """Load the manifest of an SD card. Return an empty one if there is none."""
+        manifest = cls(root=root)
+        try:
+            with open(manifest.path, encoding="UTF-8") as manifestfile:
+                data = json.load(manifestfile)
+        except FileNotFoundError:
+            return manifest
+        except (json.JSONDecodeError, OSError) as exc:
+            logging.warning("Could not read manifest %s: %s", manifest.path, exc)
+            return manifest
+
+        if data.get("version") != MANIFEST_VERSION:
+            logging.warning("Ignoring manifest %s of an unknown version", manifest.path)
+            return manifest
+        manifest.files = {name: ManifestEntry(**entry) for name, entry in data["files"].items()}
+        return manifest
+
+    def add(self, relpath: Path, checksum: str | None) -> None:
+        """Record a file that has just been written to the SD card."""
+        stat = (self.root / relpath).stat()
+        self.files[PurePosixPath(relpath).as_posix()] = ManifestEntry(
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha256=checksum
+        )
+
+    def remove_directory(self, dirname: Path) -> None:
+        """Forget all files in a directory, e.g. before it is written again."""
+        prefix = f"{PurePosixPath(dirname).as_posix()}/"
+        self.files = {name: e for name, e in self.files.items() if not name.startswith(prefix)}
+
+    def prune(self) -> None:
+        """Forget all files in directories that do not exist anymore."""
+        directories = {name.split("/")[0] for name in self.files}
+        gone = {dirname for dirname in directories if not (self.root / dirname).is_dir()}
+        self.files = {n: e for n, e in self.files.items() if n.split("/")[0] not in gone}
+
+    def save(self) -> None:
+        """Write the manifest to the SD card."""
+        data = {
+            "version": MANIFEST_VERSION,
+            "files": {name: asdict(entry) for name, entry in sorted(self.files.items())},
+        }
+        # An interrupted run never leaves a broken manifest
+        with atomic_write(self.path) as manifestfile:
+            json.dump(data, manifestfile, indent=1)
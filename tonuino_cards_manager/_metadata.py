@@ -0,0 +1,217 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Persistent cache for the metadata of audio files."""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from ._helpers import probe_audio_file
+
+# Increase whenever the layout of the table or the meaning of a column changes. Caches with a
+# different version are discarded and rebuilt
+CACHE_VERSION = 4
+
+
+@dataclass
+class TrackInfo:  # pylint: disable=too-many-instance-attributes
+    """Metadata of a single audio file."""
+
+    path: str
+    size: int
+    mtime_ns: int
+    duration: int = 0
+    artist: str = ""
+    title: str = ""
+    album: str = ""
+    # 0 if unknown
+    disc: int = 0
+    track: int = 0
+
+    @property
+    def tags(self) -> dict[str, str]:
+        """The tags of the file, leaving out empty ones."""
+        tags = {"artist": self.artist, "title": self.title, "album": self.album}
+        return {key: value for key, value in tags.items() if value}
+
+
+@dataclass
+class Loudness:
+    """Loudness of an audio file, as measured by EBU R128."""
+
+    integrated: float  # LUFS
+    true_peak: float  # dBTP
+
+
+def default_cache_dir() -> Path:
+    """Get the directory for persistent caches of this tool."""
+    if xdg_cache := os.environ.get("XDG_CACHE_HOME"):
+        return Path(xdg_cache) / "tonuino-cards-manager"
+    return Path.home() / ".cache" / "tonuino-cards-manager"
+
+
+def _number(value: str | None) -> int:
+    """Parse a disc or track number like `3` or `3/12`, returning 0 if it is missing or invalid."""
+    number = (value or "").partition("/")[0].strip()
+    return int(number) if number.isdigit() else 0
+
+
+def probe_track(file: Path) -> TrackInfo:
+    """Read the metadata of an audio file from disk, not using any cache."""
+    stat = file.stat()
+    duration, tags = probe_audio_file(file)
+    return TrackInfo(
+        path=str(file.resolve()),
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        duration=duration,
+        artist=tags.get("artist", ""),
+        title=tags.get("title", ""),
+        album=tags.get("album", ""),
+        disc=_number(tags.get("discnumber")),
+        track=_number(tags.get("tracknumber")),
+    )
+
+
+class MetadataCache:
+    """
+    Cache of audio file metadata, stored in a SQLite database. An entry is valid as long as the
+    size and modification time of the file are unchanged. Without a path, the cache only lives
+    in memory.
+    """
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = path
+        if path is None:
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._setup()
+
+    def _setup(self) -> None:
+        """Create the table, discarding caches of an incompatible version."""
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version != CACHE_VERSION:
+            if version:
+                logging.info("Metadata cache has an outdated format. Rebuilding it")
+            self._db.execute("DROP TABLE IF EXISTS tracks")
+            self._db.execute("DROP TABLE IF EXISTS loudness")
+            self._db.execute("DROP TABLE IF EXISTS integrity")
+            self._db.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, duration INTEGER, "
+            "artist TEXT, title TEXT, album TEXT, disc INTEGER, track INTEGER)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS loudness ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "integrated REAL, true_peak REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS integrity ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, problems TEXT)"
+        )
+        self._db.commit()
+
+    def get(self, file: Path) -> TrackInfo:
+        """Get the metadata of a file, from the cache if still valid, otherwise from disk."""
+        key = str(file.resolve())
+        stat = file.stat()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT path, size, mtime_ns, duration, artist, title, album, disc, track "
+                "FROM tracks WHERE path = ?",
+                (key,),
+            ).fetchone()
+        if row and row[1] == stat.st_size and row[2] == stat.st_mtime_ns:
+            self.hits += 1
+            return TrackInfo(*row)
+
+        self.misses += 1
+        logging.debug("Reading metadata of %s", file)
+        info = probe_track(file)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    info.path,
+                    info.size,
+                    info.mtime_ns,
+                    info.duration,
+                    info.artist,
+                    info.title,
+                    info.album,
+                    info.disc,
+                    info.track,
+                ),
+            )
+        return info
+
+    def get_loudness(self, file: Path) -> Loudness | None:
+        """Get the cached loudness of a file, if the file is unchanged since its analysis."""
+        stat = file.stat()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, integrated, true_peak FROM loudness WHERE path = ?",
+                (str(file.resolve()),),
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return Loudness(row[2], row[3])
+        return None
+
+    def set_loudness(self, file: Path, loudness: Loudness) -> None:
+        """Store the loudness of a file."""
+        stat = file.stat()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?, ?)",
+                (
+                    str(file.resolve()),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    loudness.integrated,
+                    loudness.true_peak,
+                ),
+            )
+
+    def get_integrity(self, file: Path) -> list[str] | None:
+        """Get the cached problems of a file, if the file is unchanged since its check."""
+        stat = file.stat()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, problems FROM integrity WHERE path = ?",
+                (str(file.resolve()),),
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return json.loads(row[2])
+        return None
+
+    def set_integrity(self, file: Path, problems: list[str]) -> None:
+        """Store the problems of a file, an empty list if it is fine."""
+        stat = file.stat()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO integrity VALUES (?, ?, ?, ?)",
+                (str(file.resolve()), stat.st_size, stat.st_mtime_ns, json.dumps(problems)),
+            )
+
+    def commit(self) -> None:
+        """Write pending changes to disk."""
+        with self._lock:
+            self._db.commit()
+
+    def close(self) -> None:
+        """Write pending changes and close the database."""
+        self.commit()
+        self._db.close()
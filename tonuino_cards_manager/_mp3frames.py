@@ -0,0 +1,198 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Parsing and lossless modification of MPEG audio Layer III frames."""
+
+import mmap
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+
+# Bitrates in kbit/s by bitrate index, for MPEG-1 and MPEG-2/2.5 Layer III
+BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Sample rates in Hz by sample rate index, for MPEG-1, MPEG-2 and MPEG-2.5
+SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 25: (11025, 12000, 8000)}
+VERSIONS = {3: 1, 2: 2, 0: 25}
+SYNC_BYTE = 0xFF
+SYNC_MASK = 0xE0
+HEADER_SIZE = 4
+CRC_SIZE = 2
+# Each global_gain step changes the volume by 1.5 dB
+GAIN_STEP_DB = 1.5
+MAX_GLOBAL_GAIN = 255
+# Tags of the frame at the start of a file that holds information instead of audio data
+INFO_FRAME_TAGS = (b"Xing", b"Info")
+VBRI_OFFSET = 36
+
+
+@dataclass
+class FrameHeader:
+    """The relevant fields of a Layer III frame header."""
+
+    version: int
+    protected: bool
+    bitrate: int
+    sample_rate: int
+    padding: bool
+    mono: bool
+
+    @property
+    def length(self) -> int:
+        """Length of the frame in bytes, including the header."""
+        factor = 144 if self.version == 1 else 72
+        return factor * self.bitrate * 1000 // self.sample_rate + self.padding
+
+    @property
+    def duration(self) -> float:
+        """Duration of the frame in seconds."""
+        return (1152 if self.version == 1 else 576) / self.sample_rate
+
+    @property
+    def side_info_size(self) -> int:
+        """Size of the side information following the header and optional CRC."""
+        if self.version == 1:
+            return 17 if self.mono else 32
+        return 9 if self.mono else 17
+
+
+def parse_header(data: bytes | bytearray, pos: int = 0) -> FrameHeader | None:
+    """Parse the Layer III frame header at `pos`. Return None if there is no valid one."""
+    if (
+        len(data) - pos < HEADER_SIZE
+        or data[pos] != SYNC_BYTE
+        or data[pos + 1] & SYNC_MASK != SYNC_MASK
+    ):
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = VERSIONS.get((b1 >> 3) & 0x03)
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    # Only Layer III, no free format, and no reserved values
+    if version is None or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:  # noqa: PLR2004
+        return None
+    return FrameHeader(
+        version=version,
+        protected=not b1 & 0x01,
+        bitrate=BITRATES[1 if version == 1 else 2][bitrate_index],
+        sample_rate=SAMPLE_RATES[version][rate_index],
+        padding=bool(b2 & 0x02),
+        mono=b3 >> 6 == 3,  # noqa: PLR2004
+    )
+
+
+def is_info_frame(data: bytes | bytearray | mmap.mmap, pos: int, header: FrameHeader) -> bool:
+    """Whether the frame at `pos` is a Xing, Info or VBRI frame, which holds no audio data."""
+    tag_start = pos + HEADER_SIZE + (CRC_SIZE if header.protected else 0) + header.side_info_size
+    return (
+        data[tag_start : tag_start + 4] in INFO_FRAME_TAGS
+        or data[pos + VBRI_OFFSET : pos + VBRI_OFFSET + 4] == b"VBRI"
+    )
+
+
+def iter_frames(
+    data: bytes | bytearray | mmap.mmap, start: int, end: int
+) -> Iterator[tuple[int, FrameHeader]]:
+    """Yield the positions and headers of the frames between `start` and `end`."""
+    pos = start
+    while pos + HEADER_SIZE <= end:
+        header = parse_header(data, pos)
+        if header is None or pos + header.length > end:
+            # Skip data between frames, and a truncated last frame
+            pos = data.find(b"\xff", pos + 1, end)
+            if pos == -1:
+                return
+            continue
+        yield pos, header
+        pos += header.length
+
+
+def _global_gain_offsets(header: FrameHeader) -> list[int]:
+    """Bit offsets of the global_gain fields in the side information."""
+    channels = 1 if header.mono else 2
+    if header.version == 1:
+        # main_data_begin, private bits and scfsi, then 2 granules of 59 bits per channel
+        start = 9 + (5 if header.mono else 3) + 4 * channels
+        return [start + 59 * block + 21 for block in range(2 * channels)]
+    # main_data_begin and private bits, then 1 granule of 63 bits per channel
+    start = 8 + (1 if header.mono else 2)
+    return [start + 63 * block + 21 for block in range(channels)]
+
+
+def _get_byte(data: bytearray, bitpos: int) -> int:
+    """Read 8 bits starting at a bit position."""
+    value = int.from_bytes(data[bitpos // 8 : bitpos // 8 + 2], "big")
+    return (value >> (8 - bitpos % 8)) & 0xFF
+
+
+def _set_byte(data: bytearray, bitpos: int, byte: int) -> None:
+    """Write 8 bits starting at a bit position."""
+    shift = 8 - bitpos % 8
+    value = int.from_bytes(data[bitpos // 8 : bitpos // 8 + 2], "big")
+    value = (value & ~(0xFF << shift)) | (byte << shift)
+    data[bitpos // 8 : bitpos // 8 + 2] = value.to_bytes(2, "big")
+
+
+def crc16(data: bytes | bytearray) -> int:
+    """Calculate the CRC-16 used by MPEG audio frames."""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005 if crc & 0x8000 else crc << 1) & 0xFFFF
+    return crc
+
+
+def adjust_frame_gain(frame: bytearray, header: FrameHeader, steps: int) -> None:
+    """
+    Change the global_gain of all granules and channels of a frame by `steps`, in place. Frames
+    without audio data, like the Xing/Info frame of VBR files, are left unchanged.
+    """
+    side_start = HEADER_SIZE + (CRC_SIZE if header.protected else 0)
+    side_info = frame[side_start : side_start + header.side_info_size]
+    if not any(side_info):
+        return
+    for offset in _global_gain_offsets(header):
+        gain = _get_byte(side_info, offset)
+        _set_byte(side_info, offset, min(max(gain + steps, 0), MAX_GLOBAL_GAIN))
+    frame[side_start : side_start + header.side_info_size] = side_info
+    if header.protected:
+        # The CRC covers the last two header bytes and the side information
+        crc = crc16(frame[2:HEADER_SIZE] + side_info)
+        frame[HEADER_SIZE : HEADER_SIZE + CRC_SIZE] = crc.to_bytes(2, "big")
+
+
+def adjust_global_gain(chunks: Iterable[bytes], steps: int) -> Iterator[bytes]:
+    """
+    Change the volume of a stream of MP3 audio data by `steps` of 1.5 dB, without decoding it.
+    Only the global_gain fields of the frames are changed, so the size stays the same and the
+    change can be reverted.
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        while pos < len(buffer):
+            header = parse_header(buffer, pos)
+            if header is None:
+                if len(buffer) - pos < HEADER_SIZE:
+                    # Possibly a header that continues in the next chunk
+                    break
+                # Data between frames is passed on unchanged
+                nxt = buffer.find(b"\xff", pos + 1)
+                pos = nxt if nxt != -1 else len(buffer)
+                continue
+            if pos + header.length > len(buffer):
+                break
+            frame = buffer[pos : pos + header.length]
+            adjust_frame_gain(frame, header, steps)
+            buffer[pos : pos + header.length] = frame
+            pos += header.length
+        if pos:
+            yield bytes(buffer[:pos])
+            del buffer[:pos]
+    if buffer:
+        yield bytes(buffer)
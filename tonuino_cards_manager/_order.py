@@ -0,0 +1,85 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Ordering of the files of a card source, which decides their track numbers on the SD card."""
+
+import logging
+import re
+import sys
+from pathlib import Path
+
+from ._metadata import MetadataCache
+
+# path: sorted by path, character by character. natural: numbers in paths are compared by their
+# value, so 2.mp3 comes before 10.mp3. tags: by disc and track number within each directory.
+# file: as listed in the ORDER_FILE of each directory
+TRACK_ORDERS = ("path", "natural", "tags", "file")
+ORDER_FILE = "order.txt"
+
+
+def natural_key(text: str) -> list[str | int]:
+    """Sort key comparing numbers in a text by their value, ignoring the case."""
+    # The numbers are every other part. Characters like ² are digits, but not numbers to int()
+    parts = re.split(r"(\d+)", text)
+    return [int(part) if idx % 2 else part.casefold() for idx, part in enumerate(parts)]
+
+
+def natural_path_key(path: Path) -> list[list[str | int]]:
+    """Sort key comparing each part of a path naturally."""
+    return [natural_key(part) for part in path.parts]
+
+
+def read_order_file(directory: Path) -> list[str]:
+    """Read the file names listed in the order file of a directory, skipping comments."""
+    try:
+        lines = (directory / ORDER_FILE).read_text(encoding="UTF-8").splitlines()
+    except FileNotFoundError:
+        logging.warning("%s has no %s, sorting its files naturally", directory, ORDER_FILE)
+        return []
+    return [line.strip() for line in lines if line.strip() and not line.startswith("#")]
+
+
+def _listed_order(files: list[Path]) -> list[Path]:
+    """Sort files as listed in the order files of their directories, the others after them."""
+    positions: dict[Path, dict[str, int]] = {}
+    for directory in dict.fromkeys(file.parent for file in files):
+        listed = read_order_file(directory)
+        positions[directory] = {name: pos for pos, name in enumerate(listed)}
+        if missing := set(listed) - {file.name for file in files if file.parent == directory}:
+            logging.warning(
+                "%s lists files that are not part of the card: %s",
+                directory / ORDER_FILE,
+                ", ".join(sorted(missing)),
+            )
+
+    def key(file: Path) -> tuple:
+        listed = positions[file.parent]
+        position = listed.get(file.name, len(listed))
+        return natural_path_key(file.parent), position, natural_key(file.name)
+
+    return sorted(files, key=key)
+
+
+def order_files(files: list[Path], order: str, cache: MetadataCache | None = None) -> list[Path]:
+    """
+    Sort the files of a source by one of the TRACK_ORDERS. Files of different directories are
+    kept apart, with the directories sorted naturally. Disc and track numbers are taken from
+    `cache`, so the files are only read if they are new or changed.
+    """
+    if order == "natural":
+        return sorted(files, key=natural_path_key)
+    if order == "file":
+        return _listed_order(files)
+    if order == "tags":
+        if cache is None:
+            cache = MetadataCache()
+
+        def key(file: Path) -> tuple:
+            info = cache.get(file)
+            # Files without a track number come last
+            track = info.track or sys.maxsize
+            return natural_path_key(file.parent), info.disc, track, natural_key(file.name)
+
+        return sorted(files, key=key)
+    return files
@@ -0,0 +1,190 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Profiling of whole runs, either deterministic via cProfile or by sampling the call stack."""
+
+import cProfile
+import io
+import json
+import logging
+import pstats
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from types import FrameType
+
+PROFILE_MODES = ("cprofile", "sampling")
+SAMPLING_INTERVAL = 0.005
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+class StackSampler:
+    """
+    Periodically records the call stacks of all threads, for export in the speedscope format
+    with one profile per thread.
+    """
+
+    def __init__(self, interval: float = SAMPLING_INTERVAL) -> None:
+        self.interval = interval
+        self.frames: list[dict[str, str | int]] = []
+        self._frame_index: dict[tuple[str, str, int], int] = {}
+        # Names, samples and their weights by thread, in the order the threads were first seen
+        self.threads: dict[int, tuple[str, list[list[int]], list[float]]] = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._start = 0.0
+        self.duration = 0.0
+
+    @property
+    def samples(self) -> int:
+        """The number of samples of all threads."""
+        return sum(len(samples) for _, samples, _ in self.threads.values())
+
+    def _stack(self, frame: FrameType | None) -> list[int]:
+        """Convert a frame and its callers to a list of frame indices, outermost first."""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            if (idx := self._frame_index.get(key)) is None:
+                idx = self._frame_index[key] = len(self.frames)
+                self.frames.append({"name": key[0], "file": key[1], "line": key[2]})
+            stack.append(idx)
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _run(self) -> None:
+        """Sample the stacks until stopped."""
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()  # noqa: SLF001
+            now = time.perf_counter()
+            for ident, frame in frames.items():
+                if ident == self._sampler.ident:
+                    continue
+                if ident not in self.threads:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    self.threads[ident] = (names.get(ident, str(ident)), [], [])
+                _, samples, weights = self.threads[ident]
+                samples.append(self._stack(frame))
+                weights.append(now - last)
+            last = now
+
+    def start(self) -> None:
+        """Start sampling, listing the calling thread first."""
+        self.threads[threading.get_ident()] = (threading.current_thread().name, [], [])
+        self._start = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self._start
+
+    def speedscope(self, name: str) -> dict:
+        """Return the samples as speedscope file, see https://www.speedscope.app."""
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "tonuino-cards-manager",
+            "shared": {"frames": self.frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"{name} ({thread})",
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self.duration,
+                    "samples": samples,
+                    "weights": weights,
+                }
+                for thread, samples, weights in self.threads.values()
+                if samples
+            ],
+        }
+
+
+class ThreadProfiles:
+    """
+    cProfile profiles of the calling thread and of all threads started while profiling, like
+    the ones creating the QR codes and the table of contents in the background. Since Python
+    3.12, a single profile already covers all threads.
+    """
+
+    def __init__(self) -> None:
+        self.profiles = [cProfile.Profile()]
+        self._per_thread = sys.version_info < (3, 12)
+        self._lock = threading.Lock()
+
+    def _profile_thread(self, *_args: object) -> None:
+        """Start profiling a new thread. Called for the first event in it."""
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def enable(self) -> None:
+        """Start profiling."""
+        if self._per_thread:
+            threading.setprofile(self._profile_thread)
+        self.profiles[0].enable()
+
+    def disable(self) -> pstats.Stats:
+        """Stop profiling, and return the statistics of all threads combined."""
+        self.profiles[0].disable()
+        if self._per_thread:
+            threading.setprofile(None)  # type: ignore[arg-type]
+        with self._lock:
+            return pstats.Stats(*self.profiles)
+
+
+def hotspots(stats: pstats.Stats, limit: int = 15) -> str:
+    """
+    Return the functions with the highest cumulative time of a profile as text, once overall and
+    once only for functions of this package, e.g. to tell tag parsing, copying and PDF rendering
+    apart.
+    """
+    output = io.StringIO()
+    stats.stream = output  # type: ignore[attr-defined]
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    stats.print_stats("tonuino_cards_manager", limit)
+    return output.getvalue()
+
+
+@contextmanager
+def profiling(path: str | Path | None, mode: str = "cprofile") -> Iterator[None]:
+    """
+    Profile the block if `path` is given. In `cprofile` mode, the result is written in the
+    pstats format (e.g. for `python -m pstats` or snakeviz), in `sampling` mode as speedscope
+    JSON file. Without `path`, the block runs unchanged.
+    """
+    if path is None:
+        yield
+        return
+
+    if mode == "sampling":
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            with open(path, "w", encoding="UTF-8") as profilefile:
+                json.dump(sampler.speedscope(Path(sys.argv[0]).name), profilefile)
+            logging.info("Sampling profile with %s samples written to %s", sampler.samples, path)
+        return
+
+    profiles = ThreadProfiles()
+    profiles.enable()
+    try:
+        yield
+    finally:
+        stats = profiles.disable()
+        stats.dump_stats(path)
+        logging.info("Profile written to %s. Hot spots:\n%s", path, hotspots(stats))
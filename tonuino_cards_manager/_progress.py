@@ -0,0 +1,135 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Progress display based on the bytes written to the SD card."""
+
+import logging
+import sys
+import threading
+import time
+from datetime import timedelta
+from typing import TextIO
+
+from ._destinations import Destination
+from ._stats import MEGABYTE
+
+# Minimum seconds between two updates on a terminal, and between two log lines otherwise
+TTY_INTERVAL = 0.2
+LOG_INTERVAL = 10.0
+
+
+class Progress:  # pylint: disable=too-many-instance-attributes
+    """
+    Tracks bytes written against bytes planned, per card and overall. On a terminal, a status
+    line with throughput and ETA is updated in place. Otherwise, a log line is emitted
+    periodically. Updates are throttled so that calling `advance` is cheap.
+    """
+
+    def __init__(
+        self,
+        total: int,
+        stream: TextIO | None = None,
+        interactive: bool | None = None,
+        destinations: list[Destination] | None = None,
+    ) -> None:
+        self.stream = stream or sys.stderr
+        self.interactive = self.stream.isatty() if interactive is None else interactive
+        self.interval = TTY_INTERVAL if self.interactive else LOG_INTERVAL
+        self.total = total
+        self.done = 0
+        self.card_no = 0
+        self.card_total = 0
+        self.card_done = 0
+        # With multiple destinations, their individual progress is shown as well
+        self.destinations = destinations if destinations and len(destinations) > 1 else []
+        self.started = time.monotonic()
+        self._last_update = self.started
+        # Other threads may print while the status line is shown
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        """Average throughput in bytes per second since the start."""
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> timedelta | None:
+        """Estimated remaining time, if a throughput is known already."""
+        if not (rate := self.rate):
+            return None
+        return timedelta(seconds=round(max(self.total - self.done, 0) / rate))
+
+    def start_card(self, no: int, total: int) -> None:
+        """Start tracking a new card with `total` planned bytes."""
+        self.clear()
+        self.card_no = no
+        self.card_total = total
+        self.card_done = 0
+
+    def advance(self, nbytes: int) -> None:
+        """Record that `nbytes` have been written, and update the display if due."""
+        self.done += nbytes
+        self.card_done += nbytes
+        now = time.monotonic()
+        if now - self._last_update >= self.interval:
+            self._last_update = now
+            self.update()
+
+    def status(self) -> str:
+        """Create the status text."""
+        card_pct = self.card_done / self.card_total * 100 if self.card_total else 100.0
+        total_pct = self.done / self.total * 100 if self.total else 100.0
+        eta = self.eta
+        per_destination = "".join(
+            f" | {dest.name}: "
+            + ("failed" if dest.error else f"{dest.bytes_written / MEGABYTE:.1f} MB")
+            for dest in self.destinations
+        )
+        return (
+            f"Card {self.card_no}: {self.card_done / MEGABYTE:.1f}/"
+            f"{self.card_total / MEGABYTE:.1f} MB ({card_pct:.0f}%) | "
+            f"Total: {self.done / MEGABYTE:.1f}/{self.total / MEGABYTE:.1f} MB "
+            f"({total_pct:.0f}%) | {self.rate / MEGABYTE:.1f} MB/s | "
+            f"ETA {eta if eta is not None else '?'}{per_destination}"
+        )
+
+    def update(self) -> None:
+        """Show the current status."""
+        if self.interactive:
+            with self._lock:
+                self.stream.write(f"\r\033[K{self.status()}")
+                self.stream.flush()
+        else:
+            logging.info("Progress: %s", self.status())
+
+    def clear(self) -> None:
+        """Remove the status line from the terminal, e.g. before other output."""
+        if self.interactive:
+            with self._lock:
+                self.stream.write("\r\033[K")
+                self.stream.flush()
+
+    def print(self, text: str, out: TextIO | None = None) -> None:
+        """
+        Print text to `out`, stdout by default, above the status line. It is safe to call this
+        from other threads while copying.
+        """
+        out = out or sys.stdout
+        with self._lock:
+            if self.interactive:
+                self.stream.write("\r\033[K")
+                self.stream.flush()
+            out.write(text)
+            out.flush()
+        if self.interactive:
+            self.update()
+
+    def close(self) -> None:
+        """Finish the progress display."""
+        self.clear()
+        elapsed = timedelta(seconds=round(time.monotonic() - self.started))
+        logging.info(
+            "Copied %.1f MB in %s (%.1f MB/s)", self.done / MEGABYTE, elapsed, self.rate / MEGABYTE
+        )
@@ -5,14 +5,15 @@
 """QR Code generation and handling."""
 
 import logging
+from typing import TextIO
 
 from qrcode.main import QRCode
 
 
-def generate_qr_codes(qrdata: list[str], maxcardsperqrcode: int) -> None:
-    """Generate QR codes."""
+def generate_qr_codes(qrdata: list[str], maxcardsperqrcode: int, out: TextIO | None = None) -> None:
+    """Generate QR codes, printing them to `out`, or stdout by default."""
     logging.debug("QRCode data: \n%s", "\n".join(qrdata))
-    print()
+    print(file=out)
     # Make each QR code contain max. configured elements
     for idx, qrlist in enumerate(
         [qrdata[x : x + maxcardsperqrcode] for x in range(0, len(qrdata), maxcardsperqrcode)]
@@ -21,6 +22,7 @@ def generate_qr_codes(qrdata: list[str], maxcardsperqrcode: int) -> None:
         qrc.add_data("\n".join(qrlist))
         print(
             f"QR code for cards batch {idx + 1} (cards {(idx * maxcardsperqrcode) + 1} - "
-            f"{min((idx + 1) * maxcardsperqrcode, len(qrdata))}):"
+            f"{min((idx + 1) * maxcardsperqrcode, len(qrdata))}):",
+            file=out,
         )
-        qrc.print_ascii()
+        qrc.print_ascii(out=out)
@@ -0,0 +1,360 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""
+Daemon accepting sync, verify, QR code and table of contents jobs on a local HTTP endpoint.
+
+The metadata cache and the parsed configurations stay in memory between jobs, so repeated jobs
+skip the startup and only read changed files. Jobs are queued and run by a fixed number of
+workers. Jobs writing to the same destination never run at the same time.
+
+As jobs can delete directories on their destination, only requests with the token of the
+daemon, a JSON body and a local Host header are accepted. Websites can therefore neither send
+jobs from the browser of the user, nor read their results through DNS rebinding.
+"""
+
+import hmac
+import io
+import itertools
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.parse
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+from . import api
+from ._helpers import VERIFY_MODES
+from ._metadata import default_cache_dir
+from ._qrcode import generate_qr_codes
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8337
+# Finished jobs that are kept to be queried
+JOB_HISTORY = 100
+# Host headers accepted in addition to the address the daemon listens on
+LOCAL_HOSTS = frozenset({"localhost", "127.0.0.1", "::1"})
+
+
+def token_path() -> Path:
+    """Get the file holding the token clients have to send to the daemon."""
+    return default_cache_dir() / "serve.token"
+
+
+def create_token(path: Path) -> str:
+    """Create a new random token, and store it in a file only the user can read."""
+    token = secrets.token_urlsafe(32)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as file:
+        file.write(token)
+    # The file may have existed with other permissions
+    path.chmod(0o600)
+    return token
+
+
+def _destinations(params: dict) -> list[str]:
+    """Get the destinations of a job, which may be a single one or a list."""
+    destination = params["destination"]
+    return destination if isinstance(destination, list) else [destination]
+
+
+def _sync(params: dict) -> dict:
+    """Sync a configuration to its destinations."""
+    options = api.SyncOptions(
+        force=bool(params.get("force", False)),
+        verify=params.get("verify", "fast"),
+        image=Path(params["image"]) if params.get("image") else None,
+        image_size=params.get("image_size"),
+        streaming=bool(params.get("streaming", False)),
+    )
+    report = api.sync(params["config"], _destinations(params), options)
+    return {
+        "ok": report.ok,
+        "failed": {str(path): str(error) for path, error in report.failed.items()},
+        "qrdata": report.qrdata,
+        "stats": report.stats.as_dict(),
+    }
+
+
+def _verify(params: dict) -> dict:
+    """Verify the destinations of a configuration."""
+    drift = {
+        destination: [
+            {"path": item.path, "problem": item.problem}
+            for item in api.verify(params["config"], destination, bool(params.get("deep")))
+        ]
+        for destination in _destinations(params)
+    }
+    return {"ok": not any(drift.values()), "drift": drift}
+
+
+def _qrcodes(params: dict) -> dict:
+    """Create the QR codes of a configuration, without copying anything."""
+    config = api.load_config(params["config"])
+    qrdata, _ = api.describe(config)
+    qrcodes = io.StringIO()
+    generate_qr_codes(qrdata, config.maxcardsperqrcode, qrcodes)
+    return {"qrdata": qrdata, "qrcodes": qrcodes.getvalue()}
+
+
+def _toc(params: dict) -> dict:
+    """Write the table of contents of a configuration, without copying anything."""
+    toc = api.table_of_contents(params["config"])
+    return {"cards": len(toc), "files": sum(entry.files for entry in toc)}
+
+
+# The function running each type of job, and whether it needs destinations
+JOB_TYPES: dict[str, tuple[Callable[[dict], dict], bool]] = {
+    "sync": (_sync, True),
+    "verify": (_verify, True),
+    "qrcodes": (_qrcodes, False),
+    "toc": (_toc, False),
+}
+
+
+def validate_job(params: Any) -> str | None:  # noqa: ANN401
+    """Check the parameters of a job. Return the problem, if any."""
+    if not isinstance(params, dict):
+        return "The job must be a JSON object"
+    if params.get("type") not in JOB_TYPES:
+        return f"The type of the job must be one of {', '.join(JOB_TYPES)}"
+    if not isinstance(params.get("config"), str):
+        return "The job needs the path of a config file in 'config'"
+    if JOB_TYPES[params["type"]][1] and not params.get("destination"):
+        return "The job needs a destination, or a list of them, in 'destination'"
+    if params.get("verify", "fast") not in VERIFY_MODES:
+        return f"'verify' must be one of {', '.join(VERIFY_MODES)}"
+    return None
+
+
+@dataclass
+class Job:  # pylint: disable=too-many-instance-attributes
+    """A job and its state."""
+
+    id: int
+    params: dict
+    state: str = "queued"
+    result: dict | None = None
+    error: str | None = None
+    created: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+
+    def as_dict(self) -> dict:
+        """Return the job as a dict suitable for JSON."""
+        return {
+            "id": self.id,
+            "type": self.params["type"],
+            "state": self.state,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class Scheduler:
+    """
+    Runs jobs with a fixed number of workers. At most `queue_size` jobs wait, further ones are
+    rejected. Jobs writing to the same destination wait for each other.
+    """
+
+    def __init__(self, workers: int = 1, queue_size: int = 16) -> None:
+        self.jobs: dict[int, Job] = {}
+        self._queue: queue.Queue[Job | None] = queue.Queue(maxsize=queue_size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._destination_locks: dict[str, threading.Lock] = {}
+        self._workers = [
+            threading.Thread(target=self._work, name=f"worker-{no}", daemon=True)
+            for no in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, params: dict) -> Job:
+        """Queue a job. Raises queue.Full if too many jobs are waiting."""
+        with self._lock:
+            job = Job(id=next(self._ids), params=params)
+            self._queue.put_nowait(job)
+            self.jobs[job.id] = job
+            self._forget_old_jobs()
+        logging.info("Queued job %s: %s", job.id, params["type"])
+        return job
+
+    def list_jobs(self) -> list[Job]:
+        """Get all known jobs."""
+        with self._lock:
+            return list(self.jobs.values())
+
+    def get_job(self, job_id: int) -> Job | None:
+        """Get a job by its id."""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _forget_old_jobs(self) -> None:
+        """Remove the oldest finished jobs beyond the history limit. Needs the lock."""
+        finished = [job.id for job in self.jobs.values() if job.finished is not None]
+        for job_id in finished[: max(len(finished) - JOB_HISTORY, 0)]:
+            del self.jobs[job_id]
+
+    def _locks(self, job: Job) -> list[threading.Lock]:
+        """The locks of the destinations of a job, in a fixed order to avoid deadlocks."""
+        if not JOB_TYPES[job.params["type"]][1]:
+            return []
+        paths = sorted({str(Path(d).resolve()) for d in _destinations(job.params)})
+        with self._lock:
+            return [self._destination_locks.setdefault(path, threading.Lock()) for path in paths]
+
+    def _work(self) -> None:
+        """Run queued jobs until None is received."""
+        while (job := self._queue.get()) is not None:
+            locks = self._locks(job)
+            for lock in locks:
+                lock.acquire()
+            try:
+                self.run(job)
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+
+    @staticmethod
+    def run(job: Job) -> None:
+        """Run a job, recording its result or error."""
+        job.state, job.started = "running", time.time()
+        logging.info("Running job %s: %s", job.id, job.params["type"])
+        try:
+            job.result = JOB_TYPES[job.params["type"]][0](job.params)
+            job.state = "done"
+        except Exception as exc:  # noqa: BLE001 # pylint: disable=broad-exception-caught
+            # The daemon keeps running, the error is reported with the job
+            logging.error("Job %s failed: %s", job.id, exc)  # noqa: TRY400
+            job.error, job.state = f"{type(exc).__name__}: {exc}", "failed"
+        job.finished = time.time()
+
+    def close(self) -> None:
+        """Let the workers finish the queued jobs, and stop them."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    """
+    HTTP interface of the scheduler.
+
+    - POST /jobs with a JSON job queues it, returning the job with its id
+    - GET /jobs lists all jobs, GET /jobs/<id> returns a single one
+
+    All requests need the header `Authorization: Bearer <token>`.
+    """
+
+    server: "JobServer"
+
+    def _allowed(self) -> bool:
+        """Check the Host header and the token of a request, responding if they are wrong."""
+        host = urllib.parse.urlsplit(f"//{self.headers.get('Host', '')}").hostname
+        if host not in self.server.allowed_hosts:
+            self._respond(HTTPStatus.FORBIDDEN, {"error": "Unknown host"})
+            return False
+        authorization = self.headers.get("Authorization", "").encode("UTF-8")
+        if not hmac.compare_digest(authorization, f"Bearer {self.server.token}".encode()):
+            self._respond(HTTPStatus.UNAUTHORIZED, {"error": "Missing or wrong token"})
+            return False
+        return True
+
+    def _respond(self, status: HTTPStatus, data: dict | list) -> None:
+        """Send a JSON response."""
+        body = json.dumps(data).encode("UTF-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        """Return all jobs, or a single one."""
+        if not self._allowed():
+            return
+        parts = self.path.strip("/").split("/")
+        if parts == ["jobs"]:
+            self._respond(
+                HTTPStatus.OK, [job.as_dict() for job in self.server.scheduler.list_jobs()]
+            )
+        elif len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():  # noqa: PLR2004
+            if job := self.server.scheduler.get_job(int(parts[1])):
+                self._respond(HTTPStatus.OK, job.as_dict())
+            else:
+                self._respond(HTTPStatus.NOT_FOUND, {"error": "No such job"})
+        else:
+            self._respond(HTTPStatus.NOT_FOUND, {"error": "Unknown path"})
+
+    def do_POST(self) -> None:
+        """Queue a job."""
+        if not self._allowed():
+            return
+        if self.path.strip("/") != "jobs":
+            self._respond(HTTPStatus.NOT_FOUND, {"error": "Unknown path"})
+            return
+        # Browsers send other types across sites without asking the daemon first
+        if self.headers.get_content_type() != "application/json":
+            self._respond(
+                HTTPStatus.UNSUPPORTED_MEDIA_TYPE, {"error": "The job must be application/json"}
+            )
+            return
+        try:
+            params = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self._respond(HTTPStatus.BAD_REQUEST, {"error": "The job is not valid JSON"})
+            return
+        if problem := validate_job(params):
+            self._respond(HTTPStatus.BAD_REQUEST, {"error": problem})
+            return
+        try:
+            job = self.server.scheduler.submit(params)
+        except queue.Full:
+            self._respond(HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Too many queued jobs"})
+            return
+        self._respond(HTTPStatus.ACCEPTED, job.as_dict())
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002, ANN401
+        """Log requests at debug level instead of printing them."""
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+class JobServer(ThreadingHTTPServer):
+    """HTTP server with a job scheduler, accepting requests with the given token."""
+
+    def __init__(self, address: tuple[str, int], scheduler: Scheduler, token: str) -> None:
+        super().__init__(address, JobHandler)
+        self.scheduler = scheduler
+        self.token = token
+        self.allowed_hosts = LOCAL_HOSTS | {address[0].lower()}
+
+
+def serve(
+    host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = 1, queue_size: int = 16
+) -> None:
+    """Run the daemon until it is interrupted."""
+    token = create_token(token_path())
+    scheduler = Scheduler(workers, queue_size)
+    with JobServer((host, port), scheduler, token) as server:
+        logging.info("Waiting for jobs on http://%s:%s/jobs", host, server.server_port)
+        logging.info("Clients have to send the token stored in %s", token_path())
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Stopping, finishing the queued jobs first")
+        finally:
+            scheduler.close()
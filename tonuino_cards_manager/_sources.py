@@ -0,0 +1,69 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Resolution of card sources: paths, glob patterns and tag queries."""
+
+import logging
+from pathlib import Path
+
+from ._catalog import Catalog
+from ._helpers import AUDIO_EXTENSIONS, get_files_in_directory
+
+# Tags that can be queried in sources
+QUERY_TAGS = ("artist", "album", "title")
+
+
+def glob_files(root: Path, pattern: str) -> list[Path]:
+    """
+    Get the audio files matching a glob pattern below `root`, sorted. Of matching directories,
+    the audio files in them are taken.
+    """
+    files: set[Path] = set()
+    for match in root.glob(pattern):
+        if match.is_dir():
+            files.update(get_files_in_directory(match, audio_only=True))
+        elif match.suffix in AUDIO_EXTENSIONS and match.is_file():
+            files.add(match)
+    return sorted(files)
+
+
+def resolve_source(
+    source: str | dict[str, str], sourcebasepath: str, catalog: Catalog | None = None
+) -> list[Path]:
+    """
+    Get the files of a single source of a card. A source is a file or directory path, or a
+    query with a glob pattern or tags. Queries are resolved with the catalog, if it is up to
+    date; tag queries need a catalog.
+    """
+    if isinstance(source, str):
+        path = Path(sourcebasepath) / Path(source)
+        logging.debug("Parsing source %s", path)
+        if path.is_dir():
+            logging.debug("%s has been detected as a directory", path)
+            files = catalog.files_in_directory(path) if catalog else None
+            return get_files_in_directory(path, audio_only=True) if files is None else files
+        if path.is_file():
+            logging.debug("%s has been detected as a file", path)
+            return [path]
+        logging.warning("%s seems to be neither a file nor a directory. Will not process", path)
+        return []
+
+    root = Path(sourcebasepath).resolve()
+    if pattern := source.get("glob"):
+        logging.debug("Resolving glob %s in %s", pattern, root)
+        files = catalog.glob(root, pattern) if catalog else None
+        return glob_files(root, pattern) if files is None else files
+
+    tags = {tag: value for tag, value in source.items() if tag in QUERY_TAGS}
+    files = catalog.query(root, tags) if catalog else None
+    if files is None:
+        logging.error(
+            "Cannot resolve the query %s without a catalog of %s. Run the scan command first",
+            tags,
+            root,
+        )
+        return []
+    if not files:
+        logging.warning("No files found for the query %s", tags)
+    return files
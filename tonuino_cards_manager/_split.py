@@ -0,0 +1,261 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Splitting of long MP3 files into parts at frame boundaries, so players can resume them."""
+
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from mutagen import MutagenError
+from mutagen.id3 import ID3
+
+from ._card import MAX_FILES, Card
+from ._config import Config
+from ._helpers import process_pool
+from ._metadata import MetadataCache, default_cache_dir
+from ._mp3frames import is_info_frame, iter_frames
+from ._strip import minimal_id3, mp3_audio_range
+
+PARTS_INDEX = "parts.json"
+# Parts not used by any run for this long are removed
+UNUSED_PARTS_DAYS = 30
+
+
+@dataclass
+class SplitPlan:
+    """Where to split a source file, and the tags of the resulting parts."""
+
+    source: Path
+    # Start of each part except the first one, in seconds
+    cuts: list[float]
+    titles: list[str]
+    tags: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        """
+        Identifier of the parts, changing with the source file and the split points. It starts
+        with an identifier of the source path, which stays the same.
+        """
+        path = str(self.source.resolve())
+        stat = self.source.stat()
+        data = [path, stat.st_size, stat.st_mtime_ns, self.cuts, self.titles, self.tags]
+        source = hashlib.sha256(path.encode()).hexdigest()[:16]
+        return f"{source}-{hashlib.sha256(json.dumps(data).encode()).hexdigest()[:16]}"
+
+
+def read_chapters(source: Path) -> list[tuple[float, str]]:
+    """Read the ID3 chapters of an MP3 file, as start time in seconds and title."""
+    try:
+        id3 = ID3(source)
+    except MutagenError:
+        return []
+    chapters = []
+    for number, chap in enumerate(sorted(id3.getall("CHAP"), key=lambda c: c.start_time), 1):
+        title = chap.sub_frames.get("TIT2")
+        chapters.append((chap.start_time / 1000, str(title) if title else f"Chapter {number}"))
+    return chapters
+
+
+def _fixed_cuts(duration: int, minutes: int) -> list[float]:
+    """Split points for parts of `minutes` length."""
+    length = minutes * 60
+    return [float(length * part) for part in range(1, math.ceil(duration / length))]
+
+
+def _chapter_plans(card: Card) -> dict[Path, SplitPlan]:
+    """Plan to split the MP3 files of a card with ID3 chapters into their chapters."""
+    plans: dict[Path, SplitPlan] = {}
+    for mp3 in dict.fromkeys(card.sourcefiles):
+        if mp3.suffix.lower() == ".mp3" and len(chapters := read_chapters(mp3)) > 1:
+            cuts = [start for start, _ in chapters[1:]]
+            plans[mp3] = SplitPlan(mp3, cuts, [title for _, title in chapters])
+
+    files = len(card.sourcefiles) - len(plans) + sum(len(p.titles) for p in plans.values())
+    if files > MAX_FILES:
+        logging.error(
+            "Splitting card %s into chapters would result in %s files, more than the %s a player "
+            "supports. Not splitting it",
+            card.no,
+            files,
+            MAX_FILES,
+        )
+        return {}
+    return plans
+
+
+def _fixed_length_plans(card: Card, cache: MetadataCache) -> dict[Path, SplitPlan]:
+    """
+    Plan to split the MP3 files of a card into parts of the configured length. The parts are
+    made longer if the card would have too many files otherwise.
+    """
+    durations = {
+        mp3: cache.get(mp3).duration
+        for mp3 in dict.fromkeys(card.sourcefiles)
+        if mp3.suffix.lower() == ".mp3"
+    }
+    unsplit = len(card.sourcefiles) - len(durations)
+
+    def files(minutes: int) -> int:
+        return unsplit + sum(len(_fixed_cuts(d, minutes)) + 1 for d in durations.values())
+
+    # Longer parts until the files fit on the card, or no file is split anymore
+    minutes = int(card.split)
+    while files(minutes) > max(MAX_FILES, len(card.sourcefiles)):
+        minutes += 1
+    if minutes != card.split:
+        logging.warning(
+            "Splitting card %s into parts of %s minutes would result in more than %s files. "
+            "Using parts of %s minutes instead",
+            card.no,
+            card.split,
+            MAX_FILES,
+            minutes,
+        )
+
+    plans: dict[Path, SplitPlan] = {}
+    for mp3, duration in durations.items():
+        if cuts := _fixed_cuts(duration, minutes):
+            title = cache.get(mp3).title or mp3.stem
+            titles = [f"{title} ({part}/{len(cuts) + 1})" for part in range(1, len(cuts) + 2)]
+            plans[mp3] = SplitPlan(mp3, cuts, titles)
+    return plans
+
+
+def plan_card_split(card: Card, cache: MetadataCache) -> dict[Path, SplitPlan]:
+    """Plan how to split the MP3 files of a card, into chapters or parts of a fixed length."""
+    plans = _chapter_plans(card) if card.split == "chapters" else _fixed_length_plans(card, cache)
+    # The parts keep the tags of their source, but get their own title
+    for mp3, plan in plans.items():
+        plan.tags = {key: value for key, value in cache.get(mp3).tags.items() if key != "title"}
+    return plans
+
+
+def _cut_offsets(data: mmap.mmap, start: int, end: int, cuts: list[float]) -> list[int]:
+    """Find the frames at which the parts start, plus the end of the audio data."""
+    offsets = [start]
+    elapsed = 0.0
+    for number, (pos, header) in enumerate(iter_frames(data, start, end)):
+        if number == 0 and is_info_frame(data, pos, header):
+            # The Info frame describes the whole file, and would be wrong for the first part
+            offsets[0] = pos + header.length
+            continue
+        while len(offsets) <= len(cuts) and elapsed >= cuts[len(offsets) - 1]:
+            offsets.append(pos)
+        elapsed += header.duration
+    offsets += [end] * (len(cuts) + 2 - len(offsets))
+    return offsets
+
+
+def split_file(plan: SplitPlan, outdir: Path) -> list[Path]:
+    """
+    Split an MP3 file into parts without re-encoding, cutting at the frame boundaries closest
+    to the split points. Parts from earlier runs in `outdir` are reused.
+    """
+    index = outdir / PARTS_INDEX
+    if index.is_file():
+        parts = [outdir / name for name in json.loads(index.read_text(encoding="UTF-8"))]
+        if all(part.is_file() for part in parts):
+            # Mark the parts as used
+            index.touch()
+            return parts
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+
+    start, end = mp3_audio_range(plan.source)
+    parts = []
+    with (
+        open(plan.source, "rb") as source,
+        mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data,
+    ):
+        offsets = _cut_offsets(data, start, end, plan.cuts)
+        for number, title in enumerate(plan.titles, 1):
+            part_start, part_end = offsets[number - 1], offsets[number]
+            if part_end <= part_start:
+                continue
+            part = outdir / f"part-{number:03d}.mp3"
+            with open(part, "wb") as partfile:
+                partfile.write(minimal_id3({**plan.tags, "title": title}))
+                partfile.write(data[part_start:part_end])
+            parts.append(part)
+
+    # Written last, so incomplete parts of aborted runs are not reused
+    index.write_text(json.dumps([part.name for part in parts]), encoding="UTF-8")
+    return parts
+
+
+def _remove_unused(split_dir: Path, keys: set[str]) -> None:
+    """
+    Remove the parts of the sources with the given keys that are no longer used, e.g. those of
+    an earlier version of a file or of other split points, and all parts that have not been
+    used for a long time, e.g. those of files no longer configured.
+    """
+    sources = {key.partition("-")[0] for key in keys}
+    expired = time.time() - UNUSED_PARTS_DAYS * 86400
+    for outdir in split_dir.iterdir():
+        if outdir.name in keys:
+            continue
+        index = outdir / PARTS_INDEX
+        try:
+            used = (index if index.is_file() else outdir).stat().st_mtime
+        except OSError:
+            continue
+        if outdir.name.partition("-")[0] in sources or used < expired:
+            logging.debug("Removing the unused parts in %s", outdir)
+            shutil.rmtree(outdir, ignore_errors=True)
+
+
+def split_cards(
+    config: Config,
+    cache: MetadataCache,
+    split_dir: Path | None = None,
+    jobs: int | None = None,
+) -> None:
+    """
+    Split the files of all cards with the `split` option, whose sources have to be parsed
+    already, and replace them by their parts. The parts are stored in `split_dir`, and files
+    are split in parallel. Cards splitting the same file the same way share its parts.
+    """
+    if split_dir is None:
+        split_dir = default_cache_dir() / "split"
+    plans: dict[str, SplitPlan] = {}
+    keys: dict[tuple[int, Path], str] = {}
+    for cardno, card in config.cards.items():
+        if card.split:
+            for source, plan in plan_card_split(card, cache).items():
+                keys[(cardno, source)] = plan.key
+                plans.setdefault(keys[(cardno, source)], plan)
+    if not plans:
+        return
+
+    # Each file is split once, as the same directory must not be written by two processes
+    parts: dict[str, list[Path]] = {}
+    with process_pool(min(jobs or os.cpu_count() or 1, len(plans))) as pool:
+        futures = {
+            key: pool.submit(split_file, plan, split_dir / key) for key, plan in plans.items()
+        }
+        for key, future in futures.items():
+            source = plans[key].source
+            try:
+                parts[key] = future.result()
+            except OSError as exc:
+                logging.error("Could not split %s, copying it as a whole: %s", source, exc)  # noqa: TRY400
+                continue
+            logging.info("Split %s into %s parts", source.name, len(parts[key]))
+    _remove_unused(split_dir, set(plans))
+
+    for cardno, card in config.cards.items():
+        card.sourcefiles = [
+            part
+            for source in card.sourcefiles
+            for part in parts.get(keys.get((cardno, source), ""), [source])
+        ]
@@ -0,0 +1,125 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Timing and throughput statistics of a run."""
+
+import json
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+MEGABYTE = 1024 * 1024
+
+
+@dataclass
+class PhaseTimer:
+    """Accumulates the wall-clock time spent in named phases."""
+
+    phases: dict[str, float] = field(default_factory=dict)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Measure the time spent in the block, adding it to the phase `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+
+@dataclass
+class CardStats(PhaseTimer):
+    """Statistics of processing a single card."""
+
+    no: int = 0
+    files: int = 0
+    bytes_copied: int = 0
+    bytes_saved: int = 0
+
+    @property
+    def copy_rate(self) -> float:
+        """Copy throughput in MB/s."""
+        if seconds := self.phases.get("copy"):
+            return self.bytes_copied / MEGABYTE / seconds
+        return 0.0
+
+
+@dataclass
+class RunStats(PhaseTimer):
+    """Statistics of a whole run."""
+
+    cards: list[CardStats] = field(default_factory=list)
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    def add_card(self, no: int) -> CardStats:
+        """Create and register the statistics for a card."""
+        card = CardStats(no=no)
+        self.cards.append(card)
+        return card
+
+    @property
+    def files(self) -> int:
+        """Number of files scanned over all cards."""
+        return sum(card.files for card in self.cards)
+
+    @property
+    def bytes_copied(self) -> int:
+        """Number of bytes copied over all cards."""
+        return sum(card.bytes_copied for card in self.cards)
+
+    @property
+    def bytes_saved(self) -> int:
+        """Number of bytes saved by stripping tags over all cards."""
+        return sum(card.bytes_saved for card in self.cards)
+
+    def card_phase(self, name: str) -> float:
+        """Time spent in phase `name` over all cards."""
+        return sum(card.phases.get(name, 0.0) for card in self.cards)
+
+    def as_dict(self) -> dict:
+        """Return the statistics as a dict suitable for JSON."""
+        data = asdict(self)
+        for card, carddata in zip(self.cards, data["cards"], strict=True):
+            carddata["copy_rate"] = card.copy_rate
+        data["files"] = self.files
+        data["bytes_copied"] = self.bytes_copied
+        data["bytes_saved"] = self.bytes_saved
+        return data
+
+    def write_json(self, path: str | Path) -> None:
+        """Write the statistics as JSON file."""
+        with open(path, "w", encoding="UTF-8") as jsonfile:
+            json.dump(self.as_dict(), jsonfile, indent=2)
+
+    def summary(self) -> str:
+        """Create a human-readable summary table of the run."""
+        lines = [f"{'Phase':<20} {'Time [s]':>10}"]
+        lines.extend(f"{name:<20} {seconds:>10.2f}" for name, seconds in self.phases.items())
+        lines.extend(
+            f"{'  cards: ' + name:<20} {self.card_phase(name):>10.2f}"
+            for name in ("scan", "metadata", "copy")
+        )
+
+        lines.append("")
+        lines.append(
+            f"{'Card':>4} {'Files':>6} {'Size [MB]':>10} {'Scan [s]':>9} {'Meta [s]':>9} "
+            f"{'Copy [s]':>9} {'MB/s':>8}"
+        )
+        lines.extend(
+            f"{card.no:>4} {card.files:>6} {card.bytes_copied / MEGABYTE:>10.1f} "
+            f"{card.phases.get('scan', 0.0):>9.2f} {card.phases.get('metadata', 0.0):>9.2f} "
+            f"{card.phases.get('copy', 0.0):>9.2f} {card.copy_rate:>8.1f}"
+            for card in self.cards
+        )
+
+        lines.append("")
+        lines.append(
+            f"{self.files} files, {self.bytes_copied / MEGABYTE:.1f} MB copied, "
+            f"{self.bytes_saved / MEGABYTE:.1f} MB saved by stripping tags. "
+            f"Metadata cache: {self.cache_hits} hits, {self.cache_misses} misses"
+        )
+        return "\n".join(lines)
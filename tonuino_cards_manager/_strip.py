@@ -0,0 +1,160 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Writing only the audio data of MP3 files plus a minimal tag, without artwork and bulky tags."""
+
+import hashlib
+import io
+import struct
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+from mutagen.id3 import ID3, TALB, TIT2, TPE1
+
+from ._mp3frames import GAIN_STEP_DB, adjust_global_gain
+
+ID3V1_SIZE = 128
+APE_FOOTER_SIZE = 32
+APE_HAS_HEADER = 0x80000000
+LYRICS3_END = b"LYRICS200"
+TAG_FRAMES = {"artist": TPE1, "title": TIT2, "album": TALB}
+
+
+@dataclass
+class CopyPlan:
+    """
+    What is written to the SD card for a source file: a new tag, and a range of the source. The
+    volume of the MP3 frames between `gain_start` and `gain_end` is changed by `gain_steps`.
+    """
+
+    prefix: bytes
+    start: int
+    end: int
+    gain_steps: int = 0
+    gain_start: int = 0
+    gain_end: int = 0
+
+    @property
+    def size(self) -> int:
+        """Size of the written file."""
+        return len(self.prefix) + self.end - self.start
+
+    def is_full_copy(self, source_size: int) -> bool:
+        """Whether the source is copied unchanged."""
+        return (
+            not self.prefix and not self.gain_steps and self.start == 0 and self.end == source_size
+        )
+
+    def chunks(self, fileobj: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+        """Yield the content to be written, reading the source range from `fileobj`."""
+        if self.prefix:
+            yield self.prefix
+        if not self.gain_steps:
+            yield from _read_range(fileobj, self.start, self.end, chunk_size)
+            return
+        gain_start = max(self.start, self.gain_start)
+        gain_end = min(self.end, self.gain_end)
+        yield from _read_range(fileobj, self.start, gain_start, chunk_size)
+        yield from adjust_global_gain(
+            _read_range(fileobj, gain_start, gain_end, chunk_size), self.gain_steps
+        )
+        yield from _read_range(fileobj, gain_end, self.end, chunk_size)
+
+    def checksum(self, source: Path, chunk_size: int = 1024 * 1024) -> str:
+        """Calculate the SHA-256 checksum of the content to be written."""
+        digest = hashlib.sha256()
+        with open(source, "rb") as src:
+            for chunk in self.chunks(src, chunk_size):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+def _read_range(fileobj: BinaryIO, start: int, end: int, chunk_size: int) -> Iterator[bytes]:
+    """Read a range of a file in chunks."""
+    fileobj.seek(start)
+    remaining = end - start
+    while remaining > 0 and (chunk := fileobj.read(min(chunk_size, remaining))):
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _syncsafe(data: bytes) -> int:
+    """Decode a 28 bit syncsafe integer of ID3v2."""
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def mp3_audio_range(mp3file: Path) -> tuple[int, int]:
+    """
+    Find the audio data of an MP3 file, skipping ID3v2 tags at the start, and APEv2, Lyrics3v2
+    and ID3v1 tags at the end. Only the headers and footers of the tags are read.
+    """
+    with open(mp3file, "rb") as mp3:
+        end = mp3.seek(0, io.SEEK_END)
+
+        # ID3v2 tags, possibly multiple ones, with an optional footer
+        start = 0
+        while start + 10 <= end:
+            mp3.seek(start)
+            header = mp3.read(10)
+            if header[:3] != b"ID3":
+                break
+            start += 10 + _syncsafe(header[6:10]) + (10 if header[5] & 0x10 else 0)
+
+        # ID3v1, APEv2 and Lyrics3v2 tags at the end. Usually, ID3v1 comes last, but some tools
+        # append APEv2 tags after it
+        while True:
+            if end - ID3V1_SIZE >= start:
+                mp3.seek(end - ID3V1_SIZE)
+                if mp3.read(3) == b"TAG":
+                    end -= ID3V1_SIZE
+                    continue
+            if end - APE_FOOTER_SIZE >= start:
+                mp3.seek(end - APE_FOOTER_SIZE)
+                footer = mp3.read(APE_FOOTER_SIZE)
+                if footer[:8] == b"APETAGEX":
+                    size, _, flags = struct.unpack_from("<III", footer, 12)
+                    end -= size + (APE_FOOTER_SIZE if flags & APE_HAS_HEADER else 0)
+                    continue
+            if end - 15 >= start:
+                mp3.seek(end - 15)
+                trailer = mp3.read(15)
+                if trailer[6:] == LYRICS3_END and trailer[:6].isdigit():
+                    end -= int(trailer[:6]) + 15
+                    continue
+            break
+
+    return start, max(start, end)
+
+
+def minimal_id3(tags: dict[str, str]) -> bytes:
+    """Create an ID3v2.4 tag with only artist, title and album, without padding."""
+    if not tags:
+        return b""
+    id3 = ID3()
+    for key, frame in TAG_FRAMES.items():
+        if value := tags.get(key):
+            id3.add(frame(encoding=3, text=value))
+    output = io.BytesIO()
+    id3.save(output, v2_version=4, padding=lambda _: 0)
+    return output.getvalue()
+
+
+def plan_copy(
+    source: Path, strip: bool = False, tags: dict[str, str] | None = None, gain: float = 0.0
+) -> CopyPlan:
+    """
+    Plan what is written for a source file. With `strip`, MP3 files are reduced to their audio
+    data plus a minimal tag with the known `tags`. The volume of MP3 files is changed by `gain`
+    dB, rounded to steps of 1.5 dB. All other files are copied unchanged.
+    """
+    steps = round(gain / GAIN_STEP_DB)
+    if source.suffix.lower() != ".mp3" or not (strip or steps):
+        return CopyPlan(b"", 0, source.stat().st_size)
+    start, end = mp3_audio_range(source)
+    plan = CopyPlan(b"", 0, source.stat().st_size, steps, start, end)
+    if strip:
+        plan.prefix, plan.start, plan.end = minimal_id3(tags or {}), start, end
+    return plan
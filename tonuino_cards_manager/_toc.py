@@ -0,0 +1,251 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Table of contents of the SD card, built from the stored metadata of each card."""
+
+import csv
+import html
+import json
+import logging
+import os
+from collections.abc import Collection, Iterable, Iterator
+from dataclasses import asdict, dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import BinaryIO
+
+from ._helpers import atomic_write, config_lock, table_of_contents
+
+TOC_HEADER: list[str | int] = ["No.", "Description", "Files", "Duration"]
+TOC_FORMATS = ("pdf", "csv", "md", "html")
+
+
+@dataclass
+class TocTrack:
+    """A single file of a card on the SD card, as shown in the detailed table of contents."""
+
+    file: str
+    artist: str = ""
+    title: str = ""
+    duration: int = 0
+
+    def as_row(self) -> list[str | int]:
+        """Return the track as a row of the table of contents."""
+        description = self.file
+        if self.artist and self.title:
+            description += f" ({self.artist} - {self.title})"
+        elif self.title:
+            description += f" ({self.title})"
+        return ["", description, "", str(timedelta(seconds=self.duration))]
+
+
+@dataclass
+class TocEntry:
+    """Metadata of a single card as shown in the table of contents."""
+
+    no: int
+    description: str
+    files: int = 0
+    duration: int = 0
+    tracks: list[TocTrack] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        # Tracks loaded from the JSON store are plain dicts
+        self.tracks = [TocTrack(**t) if isinstance(t, dict) else t for t in self.tracks]
+
+    def as_row(self) -> list[str | int]:
+        """Return the entry as a row of the table of contents."""
+        return [self.no, self.description, self.files, str(timedelta(seconds=self.duration))]
+
+
+def toc_path(config_file: str | Path, suffix: str) -> Path:
+    """Get the path of a table of contents file next to the config file."""
+    path_config = Path(config_file)
+    return path_config.parent / f"TOC_{path_config.stem}{suffix}"
+
+
+def _store_path(config_file: str | Path) -> Path:
+    """Get the path of the stored card metadata, one JSON record per line."""
+    return toc_path(config_file, ".jsonl")
+
+
+def _store_id(storefile: BinaryIO) -> tuple[int, int]:
+    """Identify an open store. Compacting the store replaces it by a new file."""
+    stat = os.fstat(storefile.fileno())
+    return stat.st_dev, stat.st_ino
+
+
+def _index_store(storefile: BinaryIO, path: Path) -> dict[int, int]:
+    """Get the offset of the latest record of each card in the store. Later records win."""
+    offsets: dict[int, int] = {}
+    offset = 0
+    for line in storefile:
+        try:
+            offsets[int(json.loads(line)["no"])] = offset
+        except (ValueError, KeyError, TypeError):
+            # E.g. the last record of an interrupted run
+            logging.warning("Ignoring a broken record of stored card metadata in %s", path)
+        offset += len(line)
+    return offsets
+
+
+def _record(entry: TocEntry) -> str:
+    """Get the line storing the metadata of a card."""
+    return json.dumps(asdict(entry), ensure_ascii=False) + "\n"
+
+
+def save_toc_entry(entry: TocEntry, config_file: str | Path) -> None:
+    """
+    Store the metadata of a single card right after it has been processed, by appending it to
+    the store. The store is never read or rewritten for this.
+    """
+    path = _store_path(config_file)
+    record = _record(entry).encode("UTF-8")
+    with config_lock(config_file), open(path, "a+b") as storefile:
+        # Start a new line if an interrupted run left an incomplete record
+        if storefile.tell():
+            storefile.seek(-1, os.SEEK_END)
+            if storefile.read(1) != b"\n":
+                record = b"\n" + record
+        storefile.write(record)
+    logging.debug("Stored table of contents entry for card %s in %s", entry.no, path)
+
+
+class StoredTocEntries:
+    """
+    The stored card metadata for a config file, sorted by card number. The entries are read
+    from disk one at a time whenever they are iterated, so the tracks of all cards are never in
+    memory at once. If the store is compacted meanwhile, it is indexed again. If `cardnos` is
+    given, only these cards are included, and missing ones are reported.
+    """
+
+    def __init__(self, config_file: str | Path, cardnos: Iterable[int] | None = None) -> None:
+        self.path = _store_path(config_file)
+        self._offsets: dict[int, int] = {}
+        self._store_id: tuple[int, int] | None = None
+        try:
+            with open(self.path, "rb") as storefile:
+                self._store_id = _store_id(storefile)
+                self._offsets = _index_store(storefile, self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logging.warning("Could not read stored card metadata from %s: %s", self.path, exc)
+        if cardnos is None:
+            cardnos = sorted(self._offsets)
+        self.cardnos: list[int] = []
+        for cardno in cardnos:
+            if cardno not in self._offsets:
+                logging.warning(
+                    "No stored metadata for card %s. Run without --toc-only to create it", cardno
+                )
+                continue
+            self.cardnos.append(cardno)
+
+    def __len__(self) -> int:
+        return len(self.cardnos)
+
+    def __iter__(self) -> Iterator[TocEntry]:
+        if not self.cardnos:
+            return
+        with open(self.path, "rb") as storefile:
+            # The store has been compacted by another job meanwhile, so the offsets are stale
+            if _store_id(storefile) != self._store_id:
+                self._store_id = _store_id(storefile)
+                self._offsets = _index_store(storefile, self.path)
+            for cardno in self.cardnos:
+                storefile.seek(self._offsets[cardno])
+                yield TocEntry(**json.loads(storefile.readline()))
+
+
+def load_toc_entries(
+    config_file: str | Path, cardnos: Iterable[int] | None = None
+) -> list[TocEntry]:
+    """
+    Load the stored card metadata for a config file, sorted by card number. If `cardnos` is
+    given, only these cards are returned, and missing ones are reported.
+    """
+    return list(StoredTocEntries(config_file, cardnos))
+
+
+def compact_toc_store(config_file: str | Path) -> None:
+    """Rewrite the store with only the latest record of each card, one card at a time."""
+    # Records appended meanwhile would be lost
+    with config_lock(config_file):
+        entries = StoredTocEntries(config_file)
+        if not entries:
+            return
+        with atomic_write(_store_path(config_file)) as storefile:
+            storefile.writelines(_record(entry) for entry in entries)
+
+
+def iter_toc_rows(entries: Iterable[TocEntry], detailed: bool = False) -> Iterator[list[str | int]]:
+    """
+    Yield the header and one row per card of the table of contents. In detailed mode, each card
+    is followed by one row per track.
+    """
+    yield TOC_HEADER
+    for entry in entries:
+        yield entry.as_row()
+        if detailed:
+            for track in entry.tracks:
+                yield track.as_row()
+
+
+def write_toc_csv(rows: Iterable[list[str | int]], path: Path) -> None:
+    """Write the table of contents as CSV file."""
+    with open(path, "w", encoding="UTF-8", newline="") as csvfile:
+        csv.writer(csvfile).writerows(rows)
+
+
+def write_toc_markdown(rows: Iterable[list[str | int]], path: Path) -> None:
+    """Write the table of contents as Markdown table."""
+    with open(path, "w", encoding="UTF-8") as mdfile:
+        mdfile.write("# Table of Contents Tonuino\n\n")
+        for idx, row in enumerate(rows):
+            cells = [str(cell).replace("|", "\\|") for cell in row]
+            mdfile.write("| " + " | ".join(cells) + " |\n")
+            if idx == 0:
+                mdfile.write("|" + "|".join("---" for _ in cells) + "|\n")
+
+
+def write_toc_html(rows: Iterable[list[str | int]], path: Path) -> None:
+    """Write the table of contents as simple HTML page."""
+    with open(path, "w", encoding="UTF-8") as htmlfile:
+        htmlfile.write(
+            '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+            "<title>Table of Contents Tonuino</title>\n</head>\n<body>\n"
+            "<h1>Table of Contents Tonuino</h1>\n<table>\n"
+        )
+        for idx, row in enumerate(rows):
+            tag = "th" if idx == 0 else "td"
+            cells = "".join(f"<{tag}>{html.escape(str(cell))}</{tag}>" for cell in row)
+            htmlfile.write(f"<tr>{cells}</tr>\n")
+        htmlfile.write("</table>\n</body>\n</html>\n")
+
+
+def write_tables_of_contents(
+    entries: Collection[TocEntry],
+    config_file: str | Path,
+    formats: Iterable[str],
+    detailed: bool = False,
+) -> None:
+    """
+    Write the table of contents in all requested formats next to the config file. The entries
+    are iterated once per format, and are not held in memory for this.
+    """
+    for fmt in formats:
+        rows = iter_toc_rows(entries, detailed)
+        if fmt == "pdf":
+            table_of_contents(rows, config_file)
+        elif fmt == "csv":
+            write_toc_csv(rows, toc_path(config_file, ".csv"))
+        elif fmt == "md":
+            write_toc_markdown(rows, toc_path(config_file, ".md"))
+        elif fmt == "html":
+            write_toc_html(rows, toc_path(config_file, ".html"))
+        else:
+            logging.error("Unknown table of contents format '%s'", fmt)
+            continue
+        logging.debug("Written table of contents as %s", fmt)
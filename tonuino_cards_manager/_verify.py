@@ -0,0 +1,145 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""Read-only verification of an SD card against the configuration."""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from ._catalog import Catalog
+from ._config import Config
+from ._folders import allocate_folders
+from ._helpers import (
+    file_checksum,
+    get_destination_filename,
+    get_directories_in_directory,
+    get_files_in_directory,
+    proper_dirname,
+    same_size_and_mtime,
+)
+from ._loudness import normalize_cards
+from ._manifest import Manifest
+from ._metadata import MetadataCache
+from ._split import split_cards
+from ._strip import CopyPlan, plan_copy
+
+
+@dataclass
+class Drift:
+    """A difference between the SD card and the configuration."""
+
+    path: str
+    problem: str
+
+
+@dataclass
+class ExpectedFile:
+    """A file expected on the SD card, and what is written for it from its source."""
+
+    source: Path
+    plan: CopyPlan
+
+
+def expected_files(
+    config: Config,
+    cache: MetadataCache,
+    catalog: Catalog | None = None,
+    folders: dict[int, list[int]] | None = None,
+) -> dict[str, ExpectedFile]:
+    """
+    Get the files expected on the SD card according to the configuration, by their paths
+    relative to the SD card. Sources are resolved with `catalog` if given. Additional folders
+    of cards with too many files are allocated as in the stored `folders` of the last sync.
+    """
+    for cardno, card in config.cards.items():
+        card.no = cardno
+        card.parse_sources(config.sourcebasedir, catalog, cache)
+    split_cards(config, cache)
+    allocate_folders(config, folders)
+    if config.normalize_loudness:
+        normalize_cards(config, cache)
+
+    expected = {}
+    for card in config.cards.values():
+        for folder, files in card.folder_files():
+            for idx, source in enumerate(files):
+                tags = cache.get(source).tags
+                filename = get_destination_filename(idx, source, config.filenametype, tags)
+                expected[f"{proper_dirname(folder)}/{filename}"] = ExpectedFile(
+                    source, plan_copy(source, config.strip_tags, tags, card.gain)
+                )
+    return expected
+
+
+def _content_drift(
+    relpath: str, expected_file: ExpectedFile, copy: Path, manifest: Manifest
+) -> Drift | None:
+    """
+    Compare the content of a copy with what is written from its source. The checksum recorded in
+    the manifest is used if there is one, so only the copy has to be read.
+    """
+    entry = manifest.files.get(relpath)
+    if entry is not None and entry.sha256 and entry.size == expected_file.plan.size:
+        expected = entry.sha256
+    else:
+        expected = expected_file.plan.checksum(expected_file.source)
+    if file_checksum(copy) != expected:
+        return Drift(relpath, "content differs from the source")
+    return None
+
+
+def verify_destination(  # noqa: PLR0913
+    config: Config,
+    destination: Path,
+    cache: MetadataCache,
+    deep: bool = False,
+    catalog: Catalog | None = None,
+    folders: dict[int, list[int]] | None = None,
+) -> list[Drift]:
+    """
+    Check that the card directories on the SD card contain exactly the expected files, with the
+    size and modification time of their sources. With `deep`, the content of all files is
+    compared by checksums, calculated in parallel. Nothing is written to the SD card.
+    """
+    expected = expected_files(config, cache, catalog, folders)
+    manifest = Manifest.load(destination)
+    configured = {
+        proper_dirname(folder) for card in config.cards.values() for folder in card.folders
+    }
+
+    actual: dict[str, Path] = {}
+    drift = []
+    for dirpath in get_directories_in_directory(destination):
+        if dirpath.name in ("mp3", "advert"):
+            continue
+        if dirpath.name not in configured:
+            drift.append(Drift(dirpath.name, "directory is not configured"))
+            continue
+        actual.update({f"{dirpath.name}/{f.name}": f for f in get_files_in_directory(dirpath)})
+
+    drift.extend(Drift(path, "missing") for path in expected if path not in actual)
+    drift.extend(Drift(path, "not configured") for path in actual if path not in expected)
+
+    # Metadata-only checks first, which are cheap even for full SD cards
+    to_compare = []
+    for relpath, expected_file in expected.items():
+        if (copy := actual.get(relpath)) is None:
+            continue
+        source_stat, copy_stat = expected_file.source.stat(), copy.stat()
+        if (size := expected_file.plan.size) != copy_stat.st_size:
+            drift.append(Drift(relpath, f"size is {copy_stat.st_size} instead of {size}"))
+        elif not same_size_and_mtime(source_stat, copy_stat, size):
+            drift.append(Drift(relpath, "modification time differs from the source"))
+        else:
+            to_compare.append((relpath, expected_file, copy))
+
+    if deep:
+        logging.info("Comparing the content of %s files", len(to_compare))
+        with ThreadPoolExecutor(thread_name_prefix="verify") as pool:
+            results = pool.map(lambda args: _content_drift(*args, manifest), to_compare)
+            drift.extend(result for result in results if result is not None)
+
+    return sorted(drift, key=lambda d: d.path)
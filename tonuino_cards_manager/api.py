@@ -0,0 +1,571 @@
+# SPDX-FileCopyrightText: 2026 Max Mehl <https://mehl.mx>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""
+Python API to sync SD cards, e.g. from a long-running service that provisions many boxes.
+
+Errors raise exceptions instead of exiting: ConfigError for invalid configurations, OSError if
+no destination could be written. The metadata cache stays open between calls, and config files
+are only parsed again if they change, so repeated calls skip most of the startup work.
+"""
+
+import dataclasses
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TextIO
+
+from ._card import Card
+from ._catalog import Catalog, ScanResult, default_catalog_path
+from ._clean import clean_unconfigured_dirs
+from ._config import Config, ConfigCache, get_config
+from ._destinations import Destinations
+from ._fatimage import build_fat32_image
+from ._folders import load_folders, plan_folders
+from ._helpers import ConfigError
+from ._integrity import check_cards
+from ._loudness import normalize_cards
+from ._metadata import MetadataCache, default_cache_dir
+from ._progress import Progress
+from ._qrcode import generate_qr_codes
+from ._split import split_cards
+from ._stats import CardStats, RunStats
+from ._toc import (
+    StoredTocEntries,
+    TocEntry,
+    compact_toc_store,
+    save_toc_entry,
+    write_tables_of_contents,
+)
+from ._verify import Drift, verify_destination
+
+__all__ = [
+    "Config",
+    "ConfigError",
+    "Drift",
+    "ScanResult",
+    "SyncOptions",
+    "SyncReport",
+    "TocEntry",
+    "describe",
+    "get_config",
+    "load_config",
+    "scan",
+    "shared_cache",
+    "shared_catalog",
+    "sync",
+    "table_of_contents",
+    "verify",
+]
+
+_shared_cache: MetadataCache | None = None
+_shared_catalog: Catalog | None = None
+_shared_cache_lock = threading.Lock()
+_config_cache: ConfigCache | None = None
+
+
+@dataclass
+class SyncOptions:
+    """Options of a sync, corresponding to the options of the command line."""
+
+    # Delete card directories on the destinations that are not configured
+    force: bool = False
+    # See VERIFY_MODES
+    verify: str = "fast"
+    # Build a FAT32 image of the destination in this file, of this size in bytes
+    image: Path | None = None
+    image_size: int | None = None
+    # Show the progress of copying on stderr
+    progress: bool = False
+    # Print the QR codes to this stream as soon as they are ready
+    qrcodes: TextIO | None = None
+    # Keep only the files of one card in memory at a time. The sources are parsed twice, and the
+    # QR codes and table of contents are only created after copying
+    streaming: bool = False
+
+
+@dataclass
+class SyncReport:
+    """Result of a sync."""
+
+    destinations: list[Path]
+    # Destinations that failed, while the others have been completed
+    failed: dict[Path, OSError]
+    # The QR data and table of contents entry of each card
+    qrdata: list[str]
+    toc: list[TocEntry]
+    stats: RunStats = field(default_factory=RunStats)
+
+    @property
+    def ok(self) -> bool:
+        """Whether all destinations have been written successfully."""
+        return not self.failed
+
+
+def shared_cache() -> MetadataCache:
+    """Get the metadata cache shared by all calls in this process."""
+    global _shared_cache  # noqa: PLW0603 # pylint: disable=global-statement
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = MetadataCache(default_cache_dir() / "metadata.sqlite")
+        return _shared_cache
+
+
+def shared_catalog() -> Catalog:
+    """
+    Get the catalog of the music library shared by all calls in this process. As long as no
+    library has been scanned, it is empty and sources are found by listing their directories.
+    """
+    global _shared_catalog  # noqa: PLW0603 # pylint: disable=global-statement
+    with _shared_cache_lock:
+        if _shared_catalog is None:
+            _shared_catalog = Catalog(default_catalog_path())
+        return _shared_catalog
+
+
+def write_toc(config: Config, config_file: str | Path) -> None:
+    """
+    Write the table of contents in all configured formats from the stored card metadata, which
+    is read one card at a time.
+    """
+    compact_toc_store(config_file)
+    entries = StoredTocEntries(config_file, config.cards)
+    write_tables_of_contents(
+        entries, config_file, config.tableofcontents_formats, config.tableofcontents_detailed
+    )
+
+
+def plan_cards(
+    config: Config,
+    stats: RunStats,
+    catalog: Catalog | None = None,
+    cache: MetadataCache | None = None,
+) -> dict[int, int]:
+    """
+    Prepare all cards and parse their sources, before anything is copied, using the catalog and
+    metadata cache if given. Return the number of bytes to be copied per card.
+    """
+    planned: dict[int, int] = {}
+    for cardno, card in config.cards.items():
+        # Add card number to card DC
+        card.no = cardno
+
+        # Card description, based on the configuration only
+        card.description_generic, card.description_detailed = card.create_carddesc()
+
+        # Parse configuration and detect possible mistakes
+        card.parse_card_config()
+
+        # Parse sources of the card, and sum up their size
+        card_stats = stats.add_card(cardno)
+        with card_stats.phase("scan"):
+            card.parse_sources(config.sourcebasedir, catalog, cache)
+            planned[cardno] = sum(f.stat().st_size for f in card.sourcefiles)
+    return planned
+
+
+def prepare_cards(
+    config: Config,
+    cache: MetadataCache,
+    stats: RunStats,
+    catalog: Catalog | None = None,
+    config_file: str | Path | None = None,
+) -> dict[int, int]:
+    """
+    Parse the sources of all cards, split long files, allocate folders to cards with too many
+    files, check the files for damage and analyse the loudness if configured. With a config
+    file, the folder allocation is stored next to it and kept in the next runs. Return the
+    number of bytes to be copied per card.
+    """
+    # Parse the sources of all cards first, to know how much data is to be copied
+    with stats.phase("plan"):
+        planned = plan_cards(config, stats, catalog, cache)
+    # Split long files of cards into parts, which are copied instead of them
+    if any(card.split for card in config.cards.values()):
+        with stats.phase("split"):
+            split_cards(config, cache)
+        planned = {
+            cardno: sum(f.stat().st_size for f in card.sourcefiles)
+            for cardno, card in config.cards.items()
+        }
+    # Cards with more files than a folder can hold get additional folders
+    plan_folders(config, config_file)
+    # Scan the files of all cards at once for damage, before they are copied
+    if config.check_integrity:
+        with stats.phase("integrity"):
+            check_cards(config, cache)
+    # Measure the loudness of all files at once, to use all cores
+    if config.normalize_loudness:
+        with stats.phase("loudness"):
+            normalize_cards(config, cache)
+    return planned
+
+
+def _prepare_card(
+    config: Config, card: Card, cache: MetadataCache, catalog: Catalog | None, check: bool
+) -> None:
+    """
+    Parse the sources of a single card and split its long files, like prepare_cards(). With
+    `check`, its files are also checked for damage and their loudness analysed if configured.
+    """
+    single = dataclasses.replace(config, cards={card.no: card})
+    card.parse_sources(config.sourcebasedir, catalog, cache)
+    if card.split:
+        split_cards(single, cache)
+    if check and config.check_integrity:
+        check_cards(single, cache)
+    if check and config.normalize_loudness:
+        normalize_cards(single, cache)
+
+
+def stream_cards(  # noqa: PLR0913
+    config: Config,
+    config_file: str | Path | None,
+    destinations: Destinations,
+    cache: MetadataCache,
+    stats: RunStats,
+    catalog: Catalog | None = None,
+    progress: bool = False,
+) -> tuple[list[str], list[TocEntry]]:
+    """
+    Copy the cards one after the other, keeping only the files of one card in memory. The
+    sources are parsed twice: first to count the files of all cards, then right before copying
+    each card. Return the QR data and the table of contents entries without their tracks, which
+    are only stored next to the config file.
+    """
+    counts: dict[int, int] = {}
+    planned: dict[int, int] = {}
+    with stats.phase("plan"):
+        for cardno, card in config.cards.items():
+            card.no = cardno
+            card.description_generic, card.description_detailed = card.create_carddesc()
+            card.parse_card_config()
+            with stats.add_card(cardno).phase("scan"):
+                _prepare_card(config, card, cache, catalog, check=False)
+            counts[cardno] = len(card.sourcefiles)
+            planned[cardno] = sum(f.stat().st_size for f in card.sourcefiles)
+            card.sourcefiles = []
+    plan_folders(config, config_file, counts=counts)
+    bar = Progress(sum(planned.values()), destinations=destinations.all) if progress else None
+
+    qrdata, toc = [], []
+    with stats.phase("cards"):
+        for card, card_stats in zip(config.cards.values(), stats.cards, strict=True):
+            with card_stats.phase("scan"):
+                _prepare_card(config, card, cache, catalog, check=True)
+            card_qrdata, entry = describe_card(card, config, cache)
+            if config.create_tableofcontents and config_file is not None:
+                save_toc_entry(entry, config_file)
+            if bar:
+                bar.start_card(card.no, planned[card.no])
+            copy_card(card, config, destinations, cache, card_stats, bar)
+            qrdata.extend(card_qrdata)
+            toc.append(dataclasses.replace(entry, tracks=[]))
+            card.sourcefiles = []
+    if bar:
+        bar.close()
+    return qrdata, toc
+
+
+def card_description(card: Card) -> str:
+    """The description of a card as shown in logs and QR codes."""
+    description = card.description_generic
+    if card.description_detailed:
+        description += f" ({card.description_detailed})"
+    return description
+
+
+def describe_card(card: Card, config: Config, cache: MetadataCache) -> tuple[list[str], TocEntry]:
+    """
+    Get the QR data and the table of contents entry of a card from the metadata of its sources.
+    Nothing has to be copied for this. Cards split across folders get one QR code per folder.
+    """
+    card_tracks = card.plan_tracks(config.filenametype, cache)
+
+    # Create card bytecodes for the directories of the card
+    qrdata = []
+    for part, card_bytecode in card.folder_bytecodes(config.cardcookie, config.version):
+        description = card_description(card)
+        if len(card.folders) > 1:
+            description += f" ({part}/{len(card.folders)})"
+        qrdata.append(f"{card_bytecode};{description}")
+    entry = TocEntry(
+        no=card.no,
+        description=card.description_detailed or card.description_generic,
+        files=len(card_tracks),
+        duration=sum(track.duration for track in card_tracks),
+        tracks=card_tracks,
+    )
+    return qrdata, entry
+
+
+def publish(  # noqa: PLR0913
+    config: Config,
+    config_file: str | Path | None,
+    qrdata: list[str],
+    stats: RunStats,
+    out: TextIO | None,
+    progress: Progress | None,
+) -> None:
+    """Create the QR codes and the table of contents. Runs in the background while copying."""
+    if out is not None:
+        with stats.phase("qrcodes"):
+            qrcodes = io.StringIO()
+            generate_qr_codes(qrdata, config.maxcardsperqrcode, qrcodes)
+            if progress:
+                progress.print(qrcodes.getvalue(), out)
+            else:
+                out.write(qrcodes.getvalue())
+
+    if config.create_tableofcontents and config_file is not None:
+        with stats.phase("toc"):
+            write_toc(config, config_file)
+
+
+def copy_card(  # noqa: PLR0913
+    card: Card,
+    config: Config,
+    destinations: Destinations,
+    cache: MetadataCache,
+    card_stats: CardStats,
+    progress: Progress | None,
+) -> None:
+    """Copy the files of a card."""
+    logging.info("Processing %s", card_description(card))
+
+    # Create dir for card, and copy the parsed sources accordingly
+    card.process_card(
+        destinations,
+        config.sourcebasedir,
+        config.filenametype,
+        cache,
+        card_stats,
+        progress.advance if progress else None,
+        config.strip_tags,
+    )
+    cache.commit()
+    destinations.save_manifests()
+
+
+def finish_destinations(
+    config: Config, options: SyncOptions, destinations: Destinations, stats: RunStats
+) -> None:
+    """Clean up the destinations after all cards are copied, and build an image of them."""
+    # Delete directories that have not been configured
+    if options.force:
+        with stats.phase("clean"):
+            destinations.run(lambda dest: clean_unconfigured_dirs(str(dest.path), config.cards))
+            destinations.run(lambda dest: dest.manifest.prune())
+            destinations.save_manifests()
+
+    # Build an image of the destination to be written to the SD card sequentially
+    if options.image:
+        with stats.phase("image"):
+            build_fat32_image(destinations.all[0].path, Path(options.image), options.image_size)
+
+
+def load_config(config_file: str | Path) -> Config:
+    """
+    Load a config file. It is only parsed again if it changed since the last call, and a copy
+    is returned that can be changed freely.
+    """
+    global _config_cache  # noqa: PLW0603 # pylint: disable=global-statement
+    with _shared_cache_lock:
+        if _config_cache is None:
+            _config_cache = ConfigCache(default_cache_dir() / "configs")
+    return _config_cache.get(config_file)
+
+
+def _load_config(config: str | Path | Config) -> tuple[Config, str | Path | None]:
+    """Load the configuration if a file is given. Return it and the file, if any."""
+    if isinstance(config, Config):
+        return config, None
+    return load_config(config), config
+
+
+def _describe_cards(
+    config: Config, config_file: str | Path | None, cache: MetadataCache, stats: RunStats
+) -> tuple[list[str], list[TocEntry]]:
+    """
+    Get the QR data and table of contents entries of all prepared cards. With a config file,
+    the entries are stored so the table of contents can be regenerated with --toc-only.
+    """
+    qrdata, toc = [], []
+    with stats.phase("metadata"):
+        for card in config.cards.values():
+            card_qrdata, entry = describe_card(card, config, cache)
+            qrdata.extend(card_qrdata)
+            toc.append(entry)
+            if config.create_tableofcontents and config_file is not None:
+                save_toc_entry(entry, config_file)
+    cache.commit()
+    return qrdata, toc
+
+
+def sync(
+    config: str | Path | Config,
+    destination: str | Path | list[str | Path],
+    options: SyncOptions | None = None,
+    cache: MetadataCache | None = None,
+    catalog: Catalog | None = None,
+) -> SyncReport:
+    """
+    Write the cards of a configuration to one or multiple destinations. `config` is a config
+    file, or an already loaded configuration, which is changed while syncing. Only with a config
+    file, the table of contents is written next to it. The metadata is taken from `cache`, and
+    the files of source directories from `catalog`, or the shared ones of this process. With
+    the `streaming` option, the table of contents in the report has no tracks.
+    """
+    options = options or SyncOptions()
+    paths = [Path(d) for d in (destination if isinstance(destination, list) else [destination])]
+    if options.image and len(paths) > 1:
+        msg = "An image can only be built for a single destination"
+        raise ValueError(msg)
+    cache = cache or shared_cache()
+    hits, misses = cache.hits, cache.misses
+    stats = RunStats()
+
+    with stats.phase("config"):
+        config, config_file = _load_config(config)
+    destinations = Destinations(paths, options.verify)
+
+    if options.streaming:
+        qrdata, toc = stream_cards(
+            config,
+            config_file,
+            destinations,
+            cache,
+            stats,
+            catalog or shared_catalog(),
+            options.progress,
+        )
+        stats.cache_hits, stats.cache_misses = cache.hits - hits, cache.misses - misses
+        cache.commit()
+        finish_destinations(config, options, destinations, stats)
+        destinations.close()
+        publish(config, config_file, qrdata, stats, options.qrcodes, None)
+        return SyncReport(
+            destinations=paths,
+            failed={dest.path: dest.error for dest in destinations.failed if dest.error},
+            qrdata=qrdata,
+            toc=toc,
+            stats=stats,
+        )
+
+    # Resolve the files and metadata of all cards before anything is copied
+    planned = prepare_cards(config, cache, stats, catalog or shared_catalog(), config_file)
+    qrdata, toc = _describe_cards(config, config_file, cache, stats)
+    progress = (
+        Progress(sum(planned.values()), destinations=destinations.all) if options.progress else None
+    )
+
+    # QR codes and the table of contents only need the metadata. Create them in the background
+    # while copying, so the RFID cards can be programmed in the meantime
+    with ThreadPoolExecutor(max_workers=1) as background:
+        published = background.submit(
+            publish, config, config_file, qrdata, stats, options.qrcodes, progress
+        )
+
+        with stats.phase("cards"):
+            for card, card_stats in zip(config.cards.values(), stats.cards, strict=True):
+                if progress:
+                    progress.start_card(card.no, planned[card.no])
+                copy_card(card, config, destinations, cache, card_stats, progress)
+
+        if progress:
+            progress.close()
+        stats.cache_hits, stats.cache_misses = cache.hits - hits, cache.misses - misses
+        cache.commit()
+
+        finish_destinations(config, options, destinations, stats)
+        destinations.close()
+        published.result()
+
+    return SyncReport(
+        destinations=paths,
+        failed={dest.path: dest.error for dest in destinations.failed if dest.error},
+        qrdata=qrdata,
+        toc=toc,
+        stats=stats,
+    )
+
+
+def scan(
+    library: str | Path | list[str | Path],
+    cache: MetadataCache | None = None,
+    catalog: Catalog | None = None,
+    jobs: int | None = None,
+) -> ScanResult:
+    """
+    Add the audio files of one or multiple library directories to the catalog, or update them.
+    Syncs then take the files of unchanged directories from the catalog instead of listing them.
+    """
+    cache = cache or shared_cache()
+    catalog = catalog or shared_catalog()
+    result = ScanResult()
+    for directory in library if isinstance(library, list) else [library]:
+        scanned = catalog.scan(directory, cache, jobs)
+        for key, value in vars(scanned).items():
+            setattr(result, key, getattr(result, key) + value)
+    return result
+
+
+def verify(
+    config: str | Path | Config,
+    destination: str | Path,
+    deep: bool = False,
+    cache: MetadataCache | None = None,
+    catalog: Catalog | None = None,
+) -> list[Drift]:
+    """
+    Check, read-only, that a destination contains exactly the files of the configuration, and
+    return the differences. With `deep`, the content of all files is compared as well.
+    """
+    cache = cache or shared_cache()
+    config, config_file = _load_config(config)
+    drift = verify_destination(
+        config,
+        Path(destination),
+        cache,
+        deep=deep,
+        catalog=catalog or shared_catalog(),
+        folders=load_folders(config_file) if config_file is not None else None,
+    )
+    cache.commit()
+    return drift
+
+
+def describe(
+    config: str | Path | Config,
+    cache: MetadataCache | None = None,
+    catalog: Catalog | None = None,
+) -> tuple[list[str], list[TocEntry]]:
+    """
+    Get the QR data and table of contents entries of all cards, without copying anything. With a
+    config file, the folder allocation is stored, so the QR codes stay valid for the next sync.
+    """
+    config, config_file = _load_config(config)
+    cache = cache or shared_cache()
+    stats = RunStats()
+    prepare_cards(config, cache, stats, catalog or shared_catalog(), config_file)
+    return _describe_cards(config, None, cache, stats)
+
+
+def table_of_contents(
+    config_file: str | Path, cache: MetadataCache | None = None, catalog: Catalog | None = None
+) -> list[TocEntry]:
+    """
+    Write the table of contents of a config file next to it in all configured formats, without
+    copying anything, and return its entries.
+    """
+    config, _ = _load_config(config_file)
+    cache = cache or shared_cache()
+    stats = RunStats()
+    prepare_cards(config, cache, stats, catalog or shared_catalog(), config_file)
+    _, toc = _describe_cards(config, config_file, cache, stats)
+    write_toc(config, config_file)
+    return toc
@@ -5,11 +5,19 @@
 """Convert cover images to many potentially working formats."""
 
 import argparse
+import logging
+import sys
 from pathlib import Path
 
 from wand.color import Color  # type: ignore[import-untyped]
 from wand.image import Image  # type: ignore[import-untyped]
 
+from . import api
+from ._catalog import Catalog, default_catalog_path
+from ._covers import extract_covers
+from ._helpers import ConfigError, process_pool
+from ._profile import PROFILE_MODES, profiling
+
 BORDERS = {"top": 5, "right": 0, "bottom": 5, "left": 0}
 DIMENSIONS_DICT = {
     "width": 838 - BORDERS["right"] - BORDERS["left"],
@@ -19,12 +27,44 @@ DIMENSIONS_STR = f"{DIMENSIONS_DICT['width']}x{DIMENSIONS_DICT['height']}"
 ROTATION = -90
 
 parser = argparse.ArgumentParser(description=__doc__)
-parser.add_argument(
+source_group = parser.add_mutually_exclusive_group(required=True)
+source_group.add_argument(
     "-f",
     "--file",
-    required=True,
     help="The source cover image file",
 )
+source_group.add_argument(
+    "-c",
+    "--config",
+    help=(
+        "Extract the covers of all cards in this config file from their audio files or source "
+        "directories, and convert all of them"
+    ),
+)
+parser.add_argument(
+    "--covers-dir",
+    help="Directory for the extracted covers. Default: 'covers' next to the config file",
+)
+parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    help="Number of covers converted in parallel. Default: number of CPUs",
+)
+parser.add_argument(
+    "--profile",
+    metavar="PATH",
+    help="Profile the whole run and write the result to this file",
+)
+parser.add_argument(
+    "--profile-mode",
+    choices=PROFILE_MODES,
+    default="cprofile",
+    help=(
+        "cprofile: deterministic profile in pstats format. sampling: low-overhead sampling "
+        "profile in speedscope format. Default: cprofile"
+    ),
+)
 
 
 def filename_extend(filename: str, *additions: str) -> str:
@@ -120,12 +160,8 @@ def get_dominant_color(image_path: str) -> str:
         return most_frequent_color.string
 
 
-def main() -> None:
-    """Main function."""
-    args = parser.parse_args()
-
-    filename = args.file
-
+def convert_file(filename: str) -> None:
+    """Convert a cover image to all formats, both normal and rotated."""
     with Image(filename=filename) as img:
         # Operations on normal image
         all_operations(img, filename)
@@ -134,3 +170,32 @@ def main() -> None:
         img.rotate(ROTATION)
 
         all_operations(img, filename, rotation=True)
+
+
+def convert_config_covers(config_file: str, covers_dir: str | None, jobs: int | None) -> None:
+    """Extract the covers of all cards of a config, and convert each distinct one in parallel."""
+    config = api.load_config(config_file)
+    directory = Path(covers_dir) if covers_dir else Path(config_file).parent / "covers"
+    catalog = Catalog(default_catalog_path())
+    covers = sorted({str(path) for path in extract_covers(config, directory, catalog).values()})
+
+    logging.info("Converting %s distinct covers", len(covers))
+    with process_pool(jobs) as pool:
+        for filename, _ in zip(covers, pool.map(convert_file, covers), strict=True):
+            logging.info("Converted %s", filename)
+
+
+def main() -> None:
+    """Main function."""
+    args = parser.parse_args()
+    logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
+
+    with profiling(args.profile, args.profile_mode):
+        try:
+            if args.config:
+                convert_config_covers(args.config, args.covers_dir, args.jobs)
+            else:
+                convert_file(args.file)
+        except ConfigError:
+            # The details have been logged already
+            sys.exit(1)
@@ -6,21 +6,38 @@
 
 import argparse
 import logging
-from datetime import timedelta
+import sys
+from pathlib import Path
 
-from . import __version__
-from ._clean import clean_unconfigured_dirs
-from ._config import get_config
-from ._helpers import table_of_contents
-from ._qrcode import generate_qr_codes
+from . import __version__, api
+from ._fatimage import parse_size
+from ._helpers import VERIFY_MODES, ConfigError
+from ._profile import PROFILE_MODES, profiling
+from ._serve import DEFAULT_HOST, DEFAULT_PORT, serve
 
 parser = argparse.ArgumentParser(description=__doc__)
-parser.add_argument("-c", "--config", required=True, help="The config file")
+parser.add_argument(
+    "command",
+    nargs="?",
+    choices=("sync", "verify", "scan", "serve"),
+    default="sync",
+    help=(
+        "sync: copy the configured files to the destination. verify: check, read-only, that the "
+        "destination contains exactly the configured files. scan: add the audio files of your "
+        "music library to a catalog, so that syncs do not have to list their directories. serve: "
+        "run a local daemon accepting sync, verify, QR code and table of contents jobs via HTTP. "
+        "Default: sync"
+    ),
+)
+parser.add_argument("-c", "--config", help="The config file. Required except for scan and serve")
 parser.add_argument(
     "-d",
     "--destination",
-    required=True,
-    help="The destination directory in which the data is written to",
+    nargs="+",
+    help=(
+        "The destination directory in which the data is written to. Multiple destinations, e.g. "
+        "several SD cards, are written to at the same time"
+    ),
 )
 parser.add_argument(
     "-f",
@@ -28,6 +45,111 @@ parser.add_argument(
     action="store_true",
     help="Delete all song folders on the destination which are not configured by you",
 )
+parser.add_argument(
+    "--verify",
+    choices=VERIFY_MODES,
+    default="fast",
+    help=(
+        "Verify copied files against a checksum calculated while copying. fast: only read copies "
+        "again if their size or modification time differ. full: read all copies again. "
+        "Default: fast"
+    ),
+)
+parser.add_argument(
+    "--deep",
+    action="store_true",
+    help="verify: also compare the content of all files by checksums, not only their metadata",
+)
+parser.add_argument(
+    "--toc-only",
+    action="store_true",
+    help=(
+        "Only regenerate the table of contents from the card metadata stored by the last run. "
+        "Neither the destination nor the audio files are touched"
+    ),
+)
+parser.add_argument(
+    "--image",
+    metavar="PATH",
+    help=(
+        "After syncing, build a FAT32 image of the destination directory in this file, which can "
+        "be written to the SD card in one go, e.g. with dd"
+    ),
+)
+parser.add_argument(
+    "--image-size",
+    type=parse_size,
+    metavar="SIZE",
+    help="Size of the image, e.g. 8G. Default: just large enough for the content",
+)
+parser.add_argument(
+    "--stats",
+    action="store_true",
+    help="Print a summary of timings and throughput of the single phases after the run",
+)
+parser.add_argument(
+    "--stats-json",
+    metavar="PATH",
+    help="Write timings and throughput of the single phases of the run as JSON to this file",
+)
+parser.add_argument(
+    "--profile",
+    metavar="PATH",
+    help="Profile the whole run and write the result to this file",
+)
+parser.add_argument(
+    "--profile-mode",
+    choices=PROFILE_MODES,
+    default="cprofile",
+    help=(
+        "cprofile: deterministic profile in pstats format. sampling: low-overhead sampling "
+        "profile in speedscope format. Default: cprofile"
+    ),
+)
+parser.add_argument(
+    "--no-progress",
+    action="store_true",
+    help="Do not show the progress of copying files",
+)
+parser.add_argument(
+    "--streaming",
+    action="store_true",
+    help=(
+        "Keep only the files of one card in memory, for very large cards and libraries. QR "
+        "codes and the table of contents are created after copying"
+    ),
+)
+parser.add_argument(
+    "--library",
+    nargs="+",
+    metavar="PATH",
+    help="scan: the directories of your music library. Default: sourcebasedir of the config",
+)
+parser.add_argument(
+    "--host",
+    default=DEFAULT_HOST,
+    help=f"serve: address to listen on. Default: {DEFAULT_HOST}",
+)
+parser.add_argument(
+    "--port",
+    type=int,
+    default=DEFAULT_PORT,
+    help=f"serve: port to listen on. Default: {DEFAULT_PORT}",
+)
+parser.add_argument(
+    "--jobs",
+    type=int,
+    help=(
+        "serve: number of jobs running at the same time. Default: 1. scan: number of files "
+        "read at the same time. Default: depending on the number of CPUs"
+    ),
+)
+parser.add_argument(
+    "--queue-size",
+    type=int,
+    default=16,
+    help="serve: number of waiting jobs, further jobs are rejected. Default: 16",
+)
 parser.add_argument("-v", "--verbose", action="store_true", help="Verbose output")
 parser.add_argument("--version", action="version", version="%(prog)s " + __version__)
 
@@ -50,63 +172,105 @@ def main() -> None:
     # Set logger
     configure_logger(args=args)
 
-    # Read YAML file
-    config = get_config(args.config)
-
-    qrdata = []
-    toc_list: list[list[str | int]] = [["No.", "Description", "Files", "Duration"]]
-
-    # Iterate through the cards and their configs
-    for cardno, card in config.cards.items():
-        # Add card number to card DC
-        card.no = cardno
-
-        # Card description and user info
-        card_description_generic, card_description_detailed = card.create_carddesc()
-        card_description = card_description_generic
-        if card_description_detailed:
-            card_description += f" ({card_description_detailed})"
-        logging.info("Processing %s", card_description)
-
-        # Parse configuration and detect possible mistakes
-        card.parse_card_config()
-
-        # Create dir for card, parse sources, and copy accordingly
-        card_audio_length = card.process_card(
-            args.destination, config.sourcebasedir, config.filenametype
-        )
-
-        # Create card bytecode for this directory
-        card_bytecode = card.create_card_bytecode(
-            cookie=config.cardcookie,
-            version=config.version,
-            directory=card.no,
-            mode=card.mode,
-            extra1=card.extra1,
-            extra2=card.extra2,
-        )
-
-        # Add card to QR code generation
-        qrdata.append(f"{card_bytecode};{card_description}")
-
-        # Extract content of card
-        card_description_qr = card_description_detailed or card_description_generic
-        card_total_audio_length_str = str(timedelta(seconds=sum(card_audio_length)))
-        # Add card to table of contents
-        toc_list.append(
-            [cardno, card_description_qr, len(card_audio_length), card_total_audio_length_str]
-        )
-
-    # Delete directories that have not been configured
-    if args.force:
-        clean_unconfigured_dirs(args.destination, config.cards)
-
-    # Create QR code
-    generate_qr_codes(qrdata, config.maxcardsperqrcode)
-
-    # Create table of contents
-    if config.create_tableofcontents:
-        table_of_contents(toc_list, args.config)
+    if args.command == "serve":
+        serve(args.host, args.port, args.jobs or 1, args.queue_size)
+        return
+    if not args.config and args.command != "scan":
+        parser.error("the following arguments are required: -c/--config")
+
+    with profiling(args.profile, args.profile_mode):
+        try:
+            if args.command == "scan":
+                scan(args)
+            elif args.command == "verify":
+                verify(args)
+            else:
+                run(args)
+        except ConfigError:
+            # The details have been logged already
+            sys.exit(1)
+
+
+def verify(args: argparse.Namespace) -> None:
+    """Check the destinations against the configuration without changing them."""
+    config = api.load_config(args.config)
+    if not args.destination:
+        parser.error("the following arguments are required: -d/--destination")
+
+    drifted = False
+    for destination in args.destination:
+        logging.info("Verifying %s", destination)
+        drift = api.verify(config, destination, deep=args.deep)
+        for item in drift:
+            logging.warning("%s: %s", Path(destination) / item.path, item.problem)
+        if drift:
+            logging.error("%s differs from the configuration in %s files", destination, len(drift))
+            drifted = True
+        else:
+            logging.info("%s matches the configuration", destination)
+
+    if drifted:
+        sys.exit(1)
+
+
+def scan(args: argparse.Namespace) -> None:
+    """Update the catalog of the music library."""
+    if args.library:
+        library = args.library
+    elif args.config:
+        library = api.load_config(args.config).sourcebasedir or "."
+    else:
+        parser.error("scan needs --library or a config file with a sourcebasedir")
+
+    result = api.scan(library, jobs=args.jobs)
+    logging.info(
+        "Catalog updated: %s files added, %s updated, %s removed, %s unchanged",
+        result.added,
+        result.updated,
+        result.removed,
+        result.unchanged,
+    )
+    if result.failed:
+        logging.warning("%s files could not be read", result.failed)
+
+
+def report(args: argparse.Namespace, result: api.SyncReport) -> None:
+    """Report statistics of the run, and the destinations that failed."""
+    if args.stats:
+        print()
+        print(result.stats.summary())
+    if args.stats_json:
+        result.stats.write_json(args.stats_json)
+
+    # The other destinations are complete, but report the ones that failed
+    if not result.ok:
+        for path, error in result.failed.items():
+            logging.critical("Destination %s failed: %s", path, error)
+        sys.exit(1)
+
+
+def run(args: argparse.Namespace) -> None:
+    """Process all cards according to the command line arguments."""
+    # Only regenerate the table of contents from the stored card metadata
+    if args.toc_only:
+        api.write_toc(api.load_config(args.config), args.config)
+        return
+
+    if not args.destination:
+        parser.error("the following arguments are required: -d/--destination")
+    if args.image and len(args.destination) > 1:
+        parser.error("--image can only be used with a single destination")
+
+    options = api.SyncOptions(
+        force=args.force,
+        verify=args.verify,
+        image=Path(args.image) if args.image else None,
+        image_size=args.image_size,
+        progress=not args.no_progress,
+        streaming=args.streaming,
+        qrcodes=sys.stdout,
+    )
+    report(args, api.sync(args.config, args.destination, options))
 
 
 if __name__ == "__main__":